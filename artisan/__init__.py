@@ -10,12 +10,15 @@ __email__ = 'mmcgill@caltech.edu'
 # definition only depends on those above it.
 
 from ._namespaces import (
-    Namespace) # A `SimpleNamespace` that prints readably.
+    Namespace, # A `SimpleNamespace` that prints readably.
+    Record) # A compact, namespace-like record with a fixed set of fields.
 
 from ._cbor_io import (
     PersistentArray, # A `numpy.memmap` backed by a CBOR file.
     PersistentList, # A `list` backed by a CBOR file.
     read_cbor_file, # Read a CBOR file.
+    read_cbor_columns, # Read a CBOR list of maps column-wise.
+    read_compact_cbor_file, # Read a CBOR file, with maps as compact records.
     write_object_as_cbor) # Write an object to a CBOR file.
 
 from ._misc_io import (
@@ -32,6 +35,7 @@ from ._artifacts import (
     Artifact, # A target that acts as a typed view into a directory.
     DynamicArtifact, # An artifact with dynamically named fields.
     ProxyArtifactField, # An artifact field that does not yet exist.
+    abuild, # Build a target without blocking the event loop.
     build, # Build a target based on a specification.
     recover) # Recover an existing artifact.
 
@@ -42,32 +46,44 @@ from ._context import (
     pop_context, # Revert to the previously active context.
     using_context) # Return a context manager that activates a context.
 
+from ._gc import (
+    gc) # Remove failed artifacts and unreferenced files from a root directory.
+
 from ._schemas import (
     get_spec_schema, # Return a JSON Schema for artifact specifications.
     get_spec_list_schema, # Return a schema for lists of artifact specs.
-    get_spec_dict_schema) # Return a schema for artifact spec dictionaries.
+    get_spec_dict_schema, # Return a schema for artifact spec dictionaries.
+    cache_spec_annotations) # Record literal annotations for source-free use.
 
 from ._http import (
-    API) # A WSGI server that provides access to an Artisan context.
+    API, # A WSGI server that provides access to an Artisan context.
+    AsyncAPI) # An ASGI server that provides access to an Artisan context.
 
 __all__ = [
     'API',
     'Artifact',
+    'AsyncAPI',
     'Context',
     'DynamicArtifact',
     'Namespace',
     'PersistentArray',
     'PersistentList',
     'ProxyArtifactField',
+    'Record',
     'Target',
+    'abuild',
     'build',
+    'cache_spec_annotations',
+    'gc',
     'get_context',
     'get_spec_dict_schema',
     'get_spec_list_schema',
     'get_spec_schema',
     'pop_context',
     'push_context',
+    'read_cbor_columns',
     'read_cbor_file',
+    'read_compact_cbor_file',
     'read_json_file',
     'read_numpy_file',
     'read_opaque_file',
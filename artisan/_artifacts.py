@@ -7,6 +7,8 @@ Exported definitions:
     DynamicArtifact (`Artifact` subclass): An artifact with dynamic fields.
     ProxyArtifactField (class): An artifact field that does not yet exist.
     build (function): Build a target from a specification.
+    abuild (coroutine function): Build a target without blocking the event
+        loop.
     recover (function): Recover an existing artifact.
 
 Internal definitions:
@@ -18,16 +20,18 @@ Internal definitions:
 
 from __future__ import annotations
 
-import json, re, shutil
-from contextvars import ContextVar
+import asyncio, json, os, re, shutil, socket
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
 from datetime import datetime
-from functools import reduce
+from functools import lru_cache, partial, reduce
 from itertools import count
 from os import PathLike
 from os.path import lexists
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from time import sleep
+from threading import Event, Thread
+from time import sleep, time
 from typing import (
     TYPE_CHECKING, Any, Callable, ClassVar, Iterable,
     Iterator, List, Literal, MutableMapping, Optional,
@@ -35,17 +39,20 @@ from typing import (
 
 import numpy as np
 
-from ._cbor_io import read_cbor_file, write_object_as_cbor
-from ._fs_index import DirIndex
+from ._blobs import BLOB_MIN_SIZE, get_blob_path, link_blob, store_blob
+from ._cbor_io import (
+    MAX_POLL_INTERVAL, get_ndarray_digest, read_cbor_file,
+    tags_by_dtype, write_object_as_cbor)
+from ._fs_index import DirIndex, TreeIndex
 from ._misc_io import (
     read_json_file, read_numpy_file, read_opaque_file,
     read_text_file, write_path)
 from ._namespaces import Namespace, dictify, namespacify
-from ._targets import Target, TargetType, active_scope
+from ._targets import Target, TargetType, active_scope, get_type_names
 
 __all__ = [
     'Artifact', 'DynamicArtifact', 'ProxyArtifactField',
-    'active_builder', 'active_root', 'build', 'recover']
+    'abuild', 'active_builder', 'active_root', 'build', 'recover']
 
 if not TYPE_CHECKING:
     # Redefine `MutableMapping` to make it
@@ -71,24 +78,77 @@ AccessMode = Literal['read-sync', 'read-async', 'write']
 
 #-- Context-local state --------------------------------------------------------
 
+LEASE_DURATION = 60.0; \
+    '''
+    The default duration, in seconds, of a builder's lease on an artifact. If an
+    artifact's lease file isn't refreshed within this duration, its build is
+    considered to have failed.
+    '''
+
+
+LEASE_FILE_NAME = '_lease_'; \
+    '''
+    The name of the file, in an artifact directory, whose modification time a
+    builder refreshes while it holds a lease on the artifact. It is separate
+    from the metadata file, so heartbeats don't register as metadata changes.
+    '''
+
+
 def default_builder(artifact: Artifact, spec: object) -> None:
     '''
     Call `artifact.__init__` in "write" mode, logging "Start", "Success", and/or
     "Failure" events to `{artifact._path_}/_meta_.json`.
+
+    "Start" events record the building process's ID and host name, so builds
+    abandoned by crashed processes can be detected, and the artifact type's
+    lease duration. While `__init__` runs, a background thread refreshes the
+    modification time of a `{artifact._path_}/_lease_` file four times per lease
+    duration. The lease is held until the final event has been logged, so the
+    build never appears to have expired in between.
     '''
     prev_mode = artifact._mode_
     artifact._mode_ = 'write'
-    log(artifact, 'Start')
+    lease_duration = artifact._lease_duration_
+    log(artifact, 'Start', pid=os.getpid(), host=socket.gethostname(),
+        lease_duration=lease_duration)
     try:
-        artifact.__init__(spec) # type: ignore
-        log(artifact, 'Success')
-    except Exception as e:
-        log(artifact, 'Failure', message=str(e))
-        raise e
+        with holding_lease(artifact / LEASE_FILE_NAME, lease_duration):
+            try:
+                artifact.__init__(spec) # type: ignore
+                log(artifact, 'Success')
+            except Exception as e:
+                log(artifact, 'Failure', message=str(e))
+                raise e
     finally:
         artifact._mode_ = prev_mode
 
 
+@contextmanager
+def holding_lease(lease_path: Path, lease_duration: float) -> Iterator[None]:
+    '''
+    Return a context manager that creates a lease file, periodically refreshes
+    its modification time within its body, and removes it afterward.
+    '''
+    done = Event()
+
+    def renew_lease() -> None:
+        while not done.wait(lease_duration / 4):
+            try:
+                os.utime(lease_path)
+            except OSError:
+                pass
+
+    lease_path.touch()
+    heartbeat = Thread(target=renew_lease, daemon=True)
+    heartbeat.start()
+    try:
+        yield
+    finally:
+        done.set()
+        heartbeat.join()
+        lease_path.unlink(missing_ok=True)
+
+
 active_root = ContextVar('artisan:root', default=Path('.')); \
     '''
     The default directory for artifact creation, and the directory that will be
@@ -181,6 +241,15 @@ class Artifact(Target, metaclass=ArtifactType):
     well), so it is generally only necessary to specify `_mode_` when
     "read-async" behavior is desired.
 
+    **Asynchronous access**
+
+    `await artifact._aget_(key)` reads a field like `getattr(artifact, key)`,
+    and `await artifact._wait_done_()` waits until the artifact has finished
+    building, without blocking the running event loop. Waiting is performed by
+    polling with exponential backoff, and file I/O is performed in the event
+    loop's default executor. `await abuild(cls, spec)` is the asynchronous
+    counterpart of `build`.
+
     Arguments:
         spec (Artifact.Spec): The artifact's specification.
 
@@ -190,6 +259,13 @@ class Artifact(Target, metaclass=ArtifactType):
     :var _writers_:
         The serialization functions artifacts of this type will
         try to use when their attributes are being assigned to.
+    :var _deduplicate_:
+        Whether to store large files in the artifact root
+        directory's content-addressed blob store.
+    :var _lease_duration_:
+        The number of seconds without a heartbeat from the
+        builder after which a build is considered to have
+        failed (`LEASE_DURATION`, by default).
     :var _path_:
         The artifact's path on the filesystem.
     :var _mode_:
@@ -197,6 +273,8 @@ class Artifact(Target, metaclass=ArtifactType):
 
     :vartype _writers_: ClassVar[List[Callable]]
     :vartype _readers_: ClassVar[List[Callable]]
+    :vartype _deduplicate_: ClassVar[bool]
+    :vartype _lease_duration_: ClassVar[float]
     :vartype _path_: Path
     :vartype _mode_: Literal['read-sync', 'read-async', 'write']
     '''
@@ -211,6 +289,10 @@ class Artifact(Target, metaclass=ArtifactType):
         write_path,
         write_object_as_cbor]
 
+    _deduplicate_: ClassVar[bool] = False
+
+    _lease_duration_: ClassVar[float] = LEASE_DURATION
+
     _path_: Path
     _mode_: AccessMode
     _index: DirIndex
@@ -220,8 +302,9 @@ class Artifact(Target, metaclass=ArtifactType):
         Find or build an artifact with the given specification.
         '''
         # Determine the artifact's path.
-        match_path = find_match(cls, spec)
-        path = match_path or make_stub(cls, spec)
+        spec_dict = get_spec_dict(cls, spec)
+        match_path = find_match(spec, spec_dict)
+        path = match_path or make_stub(spec, spec_dict)
 
         # Create an instance.
         instance = Target.__new__(cls, spec)
@@ -295,13 +378,30 @@ class Artifact(Target, metaclass=ArtifactType):
                 value._path_, target_is_directory=True)
             return
 
+        if self._deduplicate_:
+            blob_path = self._find_stored_array(value)
+            if blob_path is not None:
+                dst = (self._path_ / key).with_suffix('.cbor')
+                try:
+                    link_blob(blob_path, dst)
+                    self._index.set_entry_path(key, dst)
+                    return
+                except FileNotFoundError:
+                    pass # The blob was removed, so it's rewritten below.
+
         with TemporaryDirectory() as temp_root:
             temp_path = Path(temp_root, 'file')
             for writer in self._writers_:
                 try:
                     suffix = writer(temp_path, value)
                     dst = (self._path_ / key).with_suffix(suffix)
-                    temp_path.replace(dst)
+                    if (self._deduplicate_
+                        and not temp_path.is_symlink()
+                        and temp_path.stat().st_size >= BLOB_MIN_SIZE):
+                        root = active_root.get()
+                        link_blob(store_blob(root, temp_path), dst)
+                    else:
+                        temp_path.replace(dst)
                     self._index.set_entry_path(key, dst)
                     return
                 except TypeError:
@@ -309,6 +409,23 @@ class Artifact(Target, metaclass=ArtifactType):
 
         raise OSError(f'Unsupported content type: {type(value)}')
 
+    def _find_stored_array(self, value: object) -> Optional[Path]:
+        '''
+        Return the path to the blob `value` would be written to, if `value` is
+        an array that would be written by `write_object_as_cbor`, and the blob
+        already exists.
+        '''
+        if (not isinstance(value, np.ndarray)
+            or value.nbytes < BLOB_MIN_SIZE
+            or value.dtype not in tags_by_dtype
+            or write_object_as_cbor not in self._writers_):
+            return None
+        i = self._writers_.index(write_object_as_cbor)
+        if any(w is not write_path for w in self._writers_[:i]):
+            return None
+        blob_path = get_blob_path(active_root.get(), get_ndarray_digest(value))
+        return blob_path if blob_path.exists() else None
+
     def __delattr__(self, key: str) -> None:
         '''
         Delete all entries in `self._path_` with the given stem.
@@ -332,15 +449,43 @@ class Artifact(Target, metaclass=ArtifactType):
         '''
         return self._path_ / entry_name
 
+    async def _aget_(self, key: str) -> Any:
+        '''
+        Return `getattr(self, key)`, waiting without blocking the event loop.
+        '''
+        delay = 0.001
+        if self._mode_ == 'read-sync':
+            await self._wait_done_()
+        elif self._mode_ == 'read-async':
+            while (await run_in_thread(self._index.get_entry_path, key) is None
+                   and await run_in_thread(self._is_building)):
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, MAX_POLL_INTERVAL)
+        return await run_in_thread(getattr, self, key)
+
+    async def _wait_done_(self) -> None:
+        '''
+        Wait until this artifact has finished building, without blocking the
+        event loop.
+        '''
+        delay = 0.001
+        while await run_in_thread(self._is_building):
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, MAX_POLL_INTERVAL)
+
     def _is_building(self) -> bool:
         '''
         Return whether this artifact is currently being built.
+
+        Queued builds are considered to be in progress, and builds whose leases
+        have expired are considered to have failed.
         '''
         meta = self._index.get_meta()
         events = meta['events'] if isinstance(meta, dict) else []
-        started = any(e['type'] == 'Start' for e in events)
+        started = any(e['type'] in ('Queued', 'Start') for e in events)
         finished = any(e['type'] in ('Success', 'Failure') for e in events)
-        return started and not finished
+        return (started and not finished
+                and not is_lease_expired(self._path_, events))
 
 
 
@@ -453,6 +598,19 @@ def build(cls: Type[SomeTarget],
     return cls(namespacify(spec, decode_path), *args, **kwargs) # type: ignore
 
 
+async def abuild(cls: Type[SomeTarget],
+                 spec: object,
+                 *args: object,
+                 **kwargs: object) -> SomeTarget:
+    '''
+    Build a target from a specification, without blocking the event loop.
+
+    `build` is called in the event loop's default executor, in a copy of the
+    current context.
+    '''
+    return await run_in_thread(build, cls, spec, *args, **kwargs)
+
+
 def recover(cls: Type[SomeArtifact],
             path: Union[PathLike, str],
             mode: str = 'read-sync') -> SomeArtifact:
@@ -489,42 +647,111 @@ def recover(cls: Type[SomeArtifact],
 
 #-- Support functions ----------------------------------------------------------
 
-def find_match(cls: Type[Artifact], spec: object) -> Optional[Path]:
+def get_spec_dict(cls: Type[Artifact], spec: object) -> dict:
+    '''
+    Return the JSON-encodable form of an artifact's specification, as stored in
+    its `_meta_.json` file.
+    '''
+    return dictify(
+        {'type': cls, **vars(spec)},
+        path_encoder = encode_path,
+        type_encoder = get_type_name)
+
+
+def find_match(spec: object, spec_dict: dict) -> Optional[Path]:
     '''
     Return the path to an artifact matching the given specification, or `None`
     if no such artifact exists.
+
+    Artifacts whose builds have failed, or whose builders' leases have expired,
+    are not matched. If several artifacts match, the first one in path order is
+    returned.
+
+    `spec_dict` should be the specification's JSON-encodable form, as returned
+    by `get_spec_dict`.
     '''
     root = active_root.get()
     spec_path = getattr(spec, '_path_', None)
 
-    spec_dict = dictify(
-        {'type': cls, **vars(spec)},
-        path_encoder = encode_path,
-        type_encoder = get_type_name)
-
     candidates = (
         [DirIndex(resolve(spec_path))]
         if spec_path is not None
-        else DirIndex(root).get_artifacts())
+        else get_tree_index(root).root.get_artifacts())
 
     for dir_index in candidates:
         meta = dir_index.get_meta()
         if (isinstance(meta, dict)
             and meta['spec'] == spec_dict
-            and all(e['type'] != 'Failure' for e in meta['events'])):
+            and all(e['type'] != 'Failure' for e in meta['events'])
+            and not is_lease_expired(dir_index.path, meta['events'])):
             return dir_index.path
 
     return None
 
 
-def make_stub(cls: Type[Artifact], spec: object) -> Path:
+def is_lease_expired(path: Path, events: List[dict]) -> bool:
+    '''
+    Return whether an unfinished build's lease has expired, given the path to
+    the artifact and its event log.
+
+    Only builds whose latest "Queued" or "Start" events record a lease duration
+    hold leases. A lease expires when the artifact's lease file (or, if it
+    doesn't exist, its metadata file) hasn't been modified for the lease's
+    duration.
+    '''
+    starts = [e for e in events if e['type'] in ('Queued', 'Start')]
+    finished = any(e['type'] in ('Success', 'Failure') for e in events)
+    if finished or not starts:
+        return False
+    lease_duration = starts[-1].get('lease_duration')
+    if not isinstance(lease_duration, (int, float)):
+        return False
+    try:
+        mtime = (path / LEASE_FILE_NAME).stat().st_mtime
+    except FileNotFoundError:
+        try:
+            mtime = (path / '_meta_.json').stat().st_mtime
+        except FileNotFoundError:
+            return False
+    return time() - mtime > lease_duration
+
+
+async def run_in_thread(fn: Callable[..., T], *args: object, **kwargs: object
+                        ) -> T:
+    '''
+    Call a function in the running event loop's default executor, in a copy of
+    the current context, and return the result.
+    '''
+    call = partial(copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+def get_tree_index(root: Path) -> TreeIndex:
+    '''
+    Return a `TreeIndex` for the given root directory, keeping the most recently
+    requested one alive so that its directories are not re-read on every search.
+    '''
+    tree_index = TreeIndex(root)
+    recent_tree_indices[:] = [tree_index]
+    return tree_index
+
+
+recent_tree_indices: List[TreeIndex] = []; \
     '''
-    Create a new directory for an artifact with the given type and
-    specification, and initialize its `_meta_.json` file.
+    A list containing the most recently requested `TreeIndex`, if any.
+    '''
+
+
+def make_stub(spec: object, spec_dict: dict) -> Path:
+    '''
+    Create a new directory for an artifact with the given specification, and
+    initialize its `_meta_.json` file.
+
+    `spec_dict` should be the specification's JSON-encodable form, as returned
+    by `get_spec_dict`.
     '''
     root = active_root.get()
     spec_path = getattr(spec, '_path_', None)
-    spec_dict = dictify({'type': cls, **vars(spec)}, encode_path, get_type_name)
     generated_paths = (root / f'{spec_dict["type"]}_{i:04x}' for i in count())
     candidates = [resolve(spec_path)] if spec_path else generated_paths
 
@@ -543,12 +770,12 @@ def make_stub(cls: Type[Artifact], spec: object) -> Path:
 def resolve(path: Union[PathLike, str]) -> Path:
     '''
     Return an absolute path, dereferencing "~" (the home directory) and "@" (the
-    root artifact directory).
+    root artifact directory). Paths are resolved via `DirIndex`, which caches
+    resolutions.
     '''
     root = active_root.get()
     path = Path(re.sub('^@', str(root), str(Path(path))))
-    path = path.expanduser().resolve()
-    return path
+    return DirIndex(path).path
 
 
 def get_type_name(type_: type) -> str:
@@ -559,17 +786,16 @@ def get_type_name(type_: type) -> str:
     used. If it has no names, a `ValueError` is raised.
     '''
     try:
-        scope = active_scope.get()
-        return min(k for k, v in scope.items() if v is type_)
-    except ValueError:
+        return get_type_names(active_scope.get())[type_]
+    except (KeyError, TypeError):
         raise ValueError(f'{type_} is not in the current Artisan scope.')
 
 
 def log(artifact: Artifact, type: str, **kwargs: object) -> None:
     '''
-    Log a build event (*e.g.* "Start", "Success", or "Failure"). An entry in the
-    form `{"type": type, "timestamp": timestamp, **kwargs}` will be added to the
-    metadata file's event log.
+    Log a build event (*e.g.* "Queued", "Start", "Success", or "Failure"). An
+    entry in the form `{"type": type, "timestamp": timestamp, **kwargs}` will
+    be added to the metadata file's event log.
     '''
     timestamp = datetime.now().isoformat()
     meta = json.loads((artifact / '_meta_.json').read_text())
@@ -591,10 +817,28 @@ def encode_path(path: PathLike) -> str:
     '''
     Convert a path-like object to a artifact-root-directory-relative path
     string (a string starting with "@/").
+
+    Results are memoized per root directory, working directory, and path, since
+    resolving paths requires a system call per path component.
     '''
-    root = active_root.get().resolve()
+    return encode_path_from(active_root.get(), Path(path), os.getcwd())
+
+
+ENCODED_PATH_CACHE_SIZE = 2**12; \
+    '''
+    The maximum number of path encodings to memoize.
+    '''
+
+
+@lru_cache(maxsize=ENCODED_PATH_CACHE_SIZE)
+def encode_path_from(root: Path, path: Path, cwd: str) -> str:
+    '''
+    Convert a path to a `root`-relative path string (a string starting with
+    "@/"), given the current working directory.
+    '''
+    root = root.resolve()
     dots: List[str] = []
-    path = Path(path).resolve()
+    path = path.resolve()
 
     while root not in (*path.parents, path):
         root = root.parent
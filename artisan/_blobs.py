@@ -0,0 +1,194 @@
+'''
+Content-addressed storage for artifact fields.
+
+Artifact types with `_deduplicate_ = True` store large field files once per
+distinct content, in a `_blobs_` directory under the artifact root directory,
+and link them into artifact directories.
+
+Internal definitions:
+    BLOB_DIR_NAME (constant): The name of blob store directories.
+    BLOB_MIN_SIZE (constant): The minimum size of a file to deduplicate.
+    LINK_DIR_NAME (constant): The name of blob stores' link manifest
+        directories.
+    TEMP_NAME_PATTERN (constant): The pattern matched by the names of
+        temporary files written by artisan.
+    get_blob_path (function): Return the path at which a blob is stored.
+    get_link_manifest_path (function): Return the path of a blob's link
+        manifest.
+    get_temp_path (function): Return the path of the temporary file used to
+        replace a file.
+    get_file_digest (function): Return a file's SHA-256 digest.
+    locking_blob_store (function): Return a context manager that locks a blob
+        store.
+    store_blob (function): Move a file into a blob store.
+    link_blob (function): Link a stored blob into an artifact directory.
+'''
+
+from __future__ import annotations
+
+import errno, hashlib, os, re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    from fcntl import LOCK_EX, LOCK_SH, LOCK_UN, lockf
+    locking_is_supported = True
+except ImportError:
+    LOCK_EX, LOCK_SH = 2, 1 # type: ignore
+    locking_is_supported = False
+
+__all__ = [
+    'BLOB_DIR_NAME', 'BLOB_MIN_SIZE', 'LINK_DIR_NAME', 'TEMP_NAME_PATTERN',
+    'get_blob_path', 'get_link_manifest_path', 'get_temp_path',
+    'get_file_digest', 'locking_blob_store', 'store_blob', 'link_blob']
+
+
+
+#-- Constants ------------------------------------------------------------------
+
+BLOB_DIR_NAME = '_blobs_'; \
+    '''
+    The name of the directory, under the artifact root directory, in which
+    blobs are stored.
+    '''
+
+BLOB_MIN_SIZE = 2**16; \
+    '''
+    The minimum size of a field file, in bytes, for it to be stored as a blob.
+    Smaller files are written directly into artifact directories.
+    '''
+
+LINK_DIR_NAME = '_links_'; \
+    '''
+    The name of the directory, in a blob store, containing blobs' link
+    manifests. A blob's manifest lists the paths of the symbolic links to it
+    created by `link_blob`, so links outside the artifact root directory keep
+    the blob alive.
+    '''
+
+TEMP_NAME_PATTERN = re.compile(r'\..+\.[0-9]+\.tmp'); \
+    '''
+    The pattern matched by the names of temporary files returned by
+    `get_temp_path`.
+    '''
+
+LOCK_FILE_NAME = '_lock_'; \
+    '''
+    The name of the file, in a blob store, that writers lock in shared mode
+    while storing and linking blobs, and that `gc` locks in exclusive mode while
+    removing them.
+    '''
+
+LINK_FALLBACK_ERRORS = {
+    errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP}; \
+    '''
+    The `os.link` error numbers indicating that a hard link can't be created
+    (but the blob exists), in which case a symbolic link is created instead.
+    '''
+
+HASH_CHUNK_SIZE = 2**20; \
+    '''
+    The number of bytes read at a time when hashing files.
+    '''
+
+
+
+#-- Blob storage ---------------------------------------------------------------
+
+def get_blob_path(root: Path, digest: str) -> Path:
+    '''
+    Return the path at which a blob with the given hexadecimal SHA-256 digest is
+    stored.
+    '''
+    return root / BLOB_DIR_NAME / digest
+
+
+def get_link_manifest_path(blob_path: Path) -> Path:
+    '''
+    Return the path of the file listing the symbolic links to a blob.
+    '''
+    return blob_path.parent / LINK_DIR_NAME / blob_path.name
+
+
+def get_temp_path(path: Path) -> Path:
+    '''
+    Return the path of the temporary file to write before replacing `path`.
+
+    The name includes the process ID, so concurrent writers don't collide, and
+    matches `TEMP_NAME_PATTERN`, so `gc` can recognize orphaned temporary files.
+    '''
+    return path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+
+
+def get_file_digest(path: Path) -> str:
+    '''
+    Return a file's hexadecimal SHA-256 digest.
+    '''
+    hash_ = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hash_.update(chunk)
+    return hash_.hexdigest()
+
+
+@contextmanager
+def locking_blob_store(blob_dir: Path, mode: int) -> Iterator[None]:
+    '''
+    Return a context manager that holds a lock (`LOCK_SH` or `LOCK_EX`) on a
+    blob store, creating the blob store if it doesn't exist.
+    '''
+    blob_dir.mkdir(parents=True, exist_ok=True)
+    with open(blob_dir / LOCK_FILE_NAME, 'a+') as lock_file:
+        if locking_is_supported: lockf(lock_file, mode)
+        try:
+            yield
+        finally:
+            if locking_is_supported: lockf(lock_file, LOCK_UN)
+
+
+def store_blob(root: Path, path: Path) -> Path:
+    '''
+    Move a file into the blob store under `root`, unless a blob with the same
+    content is already stored, and return the blob's path.
+
+    Blobs are made read-only, so they can't be modified via hard links. A
+    reused blob's modification time is refreshed, so `gc` doesn't consider it
+    old enough to remove before it's linked.
+    '''
+    blob_path = get_blob_path(root, get_file_digest(path))
+    with locking_blob_store(blob_path.parent, LOCK_SH):
+        try:
+            os.utime(blob_path)
+            path.unlink()
+        except FileNotFoundError:
+            path.chmod(0o444)
+            path.replace(blob_path)
+    return blob_path
+
+
+def link_blob(blob_path: Path, dst: Path) -> None:
+    '''
+    Replace `dst` with a hard link to a blob, or a symbolic link, if hard links
+    are not supported (see `LINK_FALLBACK_ERRORS`). Symbolic links are recorded
+    in the blob's link manifest.
+
+    The blob's modification time is refreshed while the blob store is locked,
+    so `gc` can't remove it while it's being linked. A `FileNotFoundError` is
+    raised if the blob no longer exists.
+    '''
+    temp_path = get_temp_path(dst)
+    temp_path.unlink(missing_ok=True)
+    with locking_blob_store(blob_path.parent, LOCK_SH):
+        os.utime(blob_path)
+        try:
+            os.link(blob_path, temp_path)
+        except OSError as e:
+            if e.errno not in LINK_FALLBACK_ERRORS:
+                raise
+            temp_path.symlink_to(blob_path.resolve())
+            manifest_path = get_link_manifest_path(blob_path)
+            manifest_path.parent.mkdir(exist_ok=True)
+            with open(manifest_path, 'a') as f:
+                f.write(f'{dst.absolute()}\n')
+        temp_path.replace(dst)
@@ -5,18 +5,24 @@ Exported definitions:
     PersistentArray (`numpy.memmap` subclass): A `memmap` backed by a CBOR file.
     PersistentList (`list` subclass): A `list` backed by a CBOR file.
     read_cbor_file (function): Read a CBOR file.
+    read_cbor_columns (function): Read a CBOR file containing a list of maps
+        column-wise.
+    read_compact_cbor_file (function): Read a CBOR file, representing maps as
+        compact records.
     write_object_as_cbor (function): Write an object to a CBOR file.
 '''
 
 from __future__ import annotations
 
-import sys
+import asyncio, hashlib, json, os, shutil, sys
 from contextlib import contextmanager
-from io import BufferedRandom
+from io import BufferedRandom, BytesIO
 from itertools import chain
 from os import SEEK_END, SEEK_SET
 from pathlib import Path
-from typing import Any, Iterable, Iterator, Sequence, Tuple, cast
+from typing import (
+    Any, AsyncIterator, Dict, Iterable, Iterator,
+    List, Optional, Sequence, Tuple, cast)
 from typing_extensions import Annotated
 
 try:
@@ -28,11 +34,12 @@ except ImportError:
 import cbor2
 import numpy as np
 
+from ._blobs import get_temp_path
 from ._namespaces import dictify, namespacify
 
 __all__ = [
-    'PersistentArray', 'PersistentList',
-    'read_cbor_file', 'write_object_as_cbor']
+    'PersistentArray', 'PersistentList', 'read_cbor_columns',
+    'read_cbor_file', 'read_compact_cbor_file', 'write_object_as_cbor']
 
 
 
@@ -82,6 +89,13 @@ tags_by_dtype = {
 
 #-- Persistent collections -----------------------------------------------------
 
+MAX_POLL_INTERVAL = 0.1; \
+    '''
+    The maximum time, in seconds, between checks for new items when
+    asynchronously iterating over a `PersistentList`.
+    '''
+
+
 class PersistentList(list):
     '''
     A `list` backed by a CBOR file.
@@ -90,8 +104,17 @@ class PersistentList(list):
     including another `PersistentList`, writes to its backing file. An
     invalidated `PersistentList` is a potentially out-of-date read-only view
     into the file, and calling `append` or `extend` on it will corrupt the file.
+
+    If `compact` is true, maps in the file are read as records (see
+    `artisan.Record`) instead of namespaces, so lists of records with the same
+    keys share a class and don't store a dictionary per item.
+
+    Lists of flat records can also be read column-wise, via `columns`.
     '''
-    def __init__(self, file_: BufferedRandom, length: int) -> None:
+    def __init__(self,
+                 file_: BufferedRandom,
+                 length: int,
+                 compact: bool = False) -> None:
         # Read the file into a buffer.
         file_.seek(0, SEEK_END)
         buf = bytearray(file_.tell())
@@ -103,10 +126,17 @@ class PersistentList(list):
         buf[:len(header)] = header
 
         # Parse the buffer's contents as list items.
-        super().__init__(namespacify(cbor2.loads(buf)))
+        buf_reader = BytesIO(buf)
+        items = cbor2.CBORDecoder(buf_reader).decode()
+        super().__init__(namespacify(items, compact=compact))
 
-        # Store the file pointer for `extend` calls.
+        # Store the file pointer for `extend` calls, whether it needs to be
+        # copied before it's extended, and the position of the end of the last
+        # item, for refreshing.
         self._file = file_
+        self._shared = is_shared_file(file_)
+        self._end = buf_reader.tell()
+        self._compact = compact
 
     def __setitem__(self, index: object, value: object) -> None:
         raise TypeError('`PersistentList`s do not support item assignment')
@@ -121,11 +151,17 @@ class PersistentList(list):
         # Coerce the collection of items to add into a sequence.
         items = items if isinstance(items, Sequence) else list(items)
 
+        # Copy the backing file if it's shared with other artifacts.
+        if self._shared:
+            self._file = detach_file(self._file)
+            self._shared = False
+
         # Append the items, CBOR-encoded, to the backing file.
         data = b''.join(map(cbor2.dumps, dictify(items)))
         self._file.seek(0, SEEK_END)
         self._file.write(data)
         self._file.flush()
+        self._end = self._file.tell()
 
         # Update the header with the new list length.
         header = list_header(len(self) + len(items))
@@ -143,6 +179,53 @@ class PersistentList(list):
         '''
         self.extend([item])
 
+    def columns(self) -> Dict[str, np.ndarray]:
+        '''
+        Return the fields shared by every item in the backing file, as arrays.
+
+        This is equivalent to `read_cbor_columns(<backing file path>)`, except
+        that items that haven't been cached column-wise yet are taken from this
+        list, rather than decoded again, if it is up-to-date.
+        '''
+        return read_columns(
+            Path(self._file.name), self,
+            os.fstat(self._file.fileno()).st_ino, self._end)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        '''
+        Yield the list's items, including items appended to the backing file
+        after iteration starts. Iteration continues until the consumer stops.
+        '''
+        loop = asyncio.get_running_loop()
+        i = 0
+        delay = 0.001
+        while True:
+            while i < len(self):
+                yield self[i]
+                i += 1
+                delay = 0.001
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, MAX_POLL_INTERVAL)
+            await loop.run_in_executor(None, self._refresh)
+
+    def _refresh(self) -> None:
+        '''
+        Read items that have been appended to the backing file by other objects.
+        '''
+        # Read the current length from the header.
+        self._file.seek(0, SEEK_SET)
+        with locking_header(self._file, LOCK_SH):
+            length = parse_list(cast(bytes, self._file.read(128)))
+
+        # Parse and add the new items, if there are any.
+        if length > len(self):
+            self._file.seek(self._end, SEEK_SET)
+            buf_reader = BytesIO(cast(bytes, self._file.read()))
+            decoder = cbor2.CBORDecoder(buf_reader)
+            items = [decoder.decode() for _ in range(length - len(self))]
+            super().extend(namespacify(items, compact=self._compact))
+            self._end += buf_reader.tell()
+
 
 class PersistentArray(np.memmap):
     '''
@@ -179,15 +262,21 @@ class PersistentArrayImpl:
                  file_: BufferedRandom,
                  shape: Tuple[int, ...],
                  dtype: np.dtype) -> None:
+        # Map shared files read-only, so they aren't modified in place.
         self._file = file_
+        self._shared = is_shared_file(file_)
         self._memmap = np.memmap(
-            file_, dtype, 'r+',
+            file_, dtype, 'r' if self._shared else 'r+',
             data_offset(len(shape)),
             shape)
 
     def __array__(self) -> np.memmap:
         return self._memmap
 
+    def __setitem__(self, index: object, value: object) -> None:
+        self._detach()
+        self._memmap[cast(Any, index)] = value
+
     def extend(self, items: object) -> None:
         '''
         Extend the array by appending elements from `items`.
@@ -203,6 +292,9 @@ class PersistentArrayImpl:
         if item_array.shape[1:] != self._memmap.shape[1:]:
             raise ValueError('container and item shapes do not match')
 
+        # Copy the backing file if it's shared with other artifacts.
+        self._detach()
+
         # Write data.
         self._file.seek(0, SEEK_END)
         self._file.write(item_array)
@@ -227,6 +319,17 @@ class PersistentArrayImpl:
         '''
         self.extend(np.asanyarray(item, self._memmap.dtype)[None])
 
+    def _detach(self) -> None:
+        '''
+        Replace the backing file with a private, writable copy if it's shared.
+        '''
+        if self._shared:
+            self._file = detach_file(self._file)
+            self._shared = False
+            self._memmap = np.memmap(
+                self._file, self._memmap.dtype, 'r+',
+                data_offset(self._memmap.ndim), self._memmap.shape)
+
 
 class MemMapForwardingAttr:
     '''
@@ -252,7 +355,8 @@ if 'sphinx' not in sys.modules:
 
 #-- Reading --------------------------------------------------------------------
 
-def read_cbor_file(path: Annotated[Path, '.cbor']) -> Any:
+def read_cbor_file(path: Annotated[Path, '.cbor'],
+                   compact: bool = False) -> Any:
     '''
     Read a CBOR file.
 
@@ -263,20 +367,23 @@ def read_cbor_file(path: Annotated[Path, '.cbor']) -> Any:
     RFC 8746, and the shape elements and byte string length are encoded as
     8-byte unsigned integers, a `PersistentArray` will be returned.
 
-    Otherwise, a JSON-like object will be returned.
+    Otherwise, a JSON-like object will be returned. If `compact` is true, maps
+    are read as records (see `artisan.Record`) instead of namespaces.
     '''
     # Defer to other readers if the path does not correspond to a CBOR file.
     if path.suffix != '.cbor':
         raise ValueError()
 
-    # Open the specified file and read the first 128 bytes.
-    f = cast(BufferedRandom, open(path, 'rb+'))
+    # Open the specified file and read the first 128 bytes. Read-only files
+    # (including deduplicated files) are copied before they are extended.
+    try: f = cast(BufferedRandom, open(path, 'rb+'))
+    except PermissionError: f = cast(BufferedRandom, open(path, 'rb'))
     with locking_header(f, LOCK_SH):
         header = cast(bytes, f.read(128))
     f.seek(0)
 
     # Try parsing the file as a `PersistentList`.
-    try: return PersistentList(f, parse_list(header))
+    try: return PersistentList(f, parse_list(header), compact)
     except (ValueError, IndexError): pass
 
     # Try parsing the file as a `PersistentArray`.
@@ -284,7 +391,125 @@ def read_cbor_file(path: Annotated[Path, '.cbor']) -> Any:
     except (ValueError, IndexError): pass
 
     # Parse the file using `cbor2`.
-    return namespacify(cbor2.loads(f.read()))
+    return namespacify(cbor2.loads(f.read()), compact=compact)
+
+
+def read_cbor_columns(path: Annotated[Path, '.cbor']) -> Dict[str, np.ndarray]:
+    '''
+    Read the fields shared by every item in a CBOR file encoding a list of maps
+    (as written by `write_object_as_cbor` or `PersistentList.extend`), as
+    arrays.
+
+    Fields whose values can't be stored in a numeric array of a consistent shape
+    are omitted. Columns are cached in a `.{stem}.columns` directory alongside
+    the file, with the file's inode number, size, and modification time, and the
+    position of the end of the last cached item. Only items appended since the
+    previous call are decoded, and the cache is rebuilt if the file has been
+    replaced or rewritten. The returned arrays are read-only memory-mapped views
+    into the cached files.
+    '''
+    return read_columns(path)
+
+
+def read_columns(path: Path,
+                 items: Optional[Sequence[object]] = None,
+                 items_ino: int = -1,
+                 items_end: int = 0) -> Dict[str, np.ndarray]:
+    '''
+    Read a CBOR list's columns, as described in `read_cbor_columns`.
+
+    If `items` is provided, it should contain the decoded items of the list in
+    the file with inode number `items_ino`, the last of which ends at byte
+    `items_end`. Uncached items are taken from it, instead of being decoded,
+    if it's still the list in the file at `path` and it has the same length.
+    '''
+    column_dir = get_column_dir(path)
+    column_dir.mkdir(exist_ok=True)
+
+    index_path = column_dir / '_index_.json'
+    with open(path, 'rb') as f, open(index_path, 'a+') as index_file:
+        with locking_header(index_file, LOCK_EX): # type: ignore
+            # Read the list's length and the index, discarding the index if the
+            # file was replaced or rewritten.
+            stat = os.fstat(f.fileno())
+            with locking_header(f, LOCK_SH): # type: ignore
+                length = parse_list(f.read(128))
+            index_file.seek(0)
+            try: index = json.loads(index_file.read())
+            except ValueError: index = None
+            if not is_column_index_current(index, stat, length):
+                index = {'length': 0, 'fields': None, 'end': 9}
+
+            # Decode the new items (or take them from `items`) and update the
+            # columns.
+            if (items is not None and items_ino == stat.st_ino
+                    and len(items) == length):
+                rows = dictify(list(items[index['length']:]))
+                end = items_end
+            else:
+                f.seek(index['end'], SEEK_SET)
+                buf_reader = BytesIO(f.read())
+                decoder = cbor2.CBORDecoder(buf_reader)
+                rows = [decoder.decode()
+                        for _ in range(length - index['length'])]
+                end = index['end'] + buf_reader.tell()
+            fields = update_columns(
+                column_dir, index['length'], index['fields'], rows)
+
+            # Write the new index.
+            index_file.truncate(0)
+            json.dump({
+                'length': length, 'fields': fields, 'end': end,
+                'file': [stat.st_ino, stat.st_size, stat.st_mtime_ns]},
+                index_file)
+            index_file.flush()
+
+            # Map the column files while the index is locked, so they can't be
+            # replaced by a concurrent update in the meantime.
+            return {
+                f: read_column(column_dir / f'{f}.cbor')
+                for f in fields or []}
+
+
+def is_column_index_current(index: object,
+                            stat: os.stat_result,
+                            length: int) -> bool:
+    '''
+    Return whether a column index describes a prefix of the list in a file.
+
+    The file must have the same inode number, and either the same size and
+    modification time, or a greater size (since lists are only extended in
+    place, and are otherwise replaced).
+    '''
+    if not isinstance(index, dict) or 'file' not in index:
+        return False
+    ino, size, mtime_ns = index['file']
+    return (stat.st_ino == ino
+            and index['length'] <= length
+            and (stat.st_size > size
+                 or (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns)))
+
+
+def read_column(path: Path) -> np.ndarray:
+    '''
+    Return a read-only memory-mapped view into a column file.
+    '''
+    with open(path, 'rb') as f:
+        shape, dtype = parse_ndarray(f.read(128))
+    if shape[0] == 0:
+        return np.zeros(shape, dtype)
+    return np.memmap(path, dtype, 'r', data_offset(len(shape)), shape)
+
+
+def read_compact_cbor_file(path: Annotated[Path, '.cbor']) -> Any:
+    '''
+    Read a CBOR file, representing maps as compact records.
+
+    This is equivalent to `read_cbor_file(path, compact=True)`, and can replace
+    `read_cbor_file` in an artifact type's `_readers_` list to reduce the memory
+    used by large lists of records.
+    '''
+    return read_cbor_file(path, compact=True)
 
 
 def parse_list(buf: bytes) -> int:
@@ -419,6 +644,130 @@ def write_ndarray(path: Path, array: np.ndarray) -> None:
         f.flush()
 
 
+def get_ndarray_digest(array: np.ndarray) -> str:
+    '''
+    Return the hexadecimal SHA-256 digest of the file `write_ndarray` would
+    write for an array.
+    '''
+    hash_ = hashlib.sha256(ndarray_header(array.shape, array.dtype))
+    hash_.update(np.ascontiguousarray(array).data)
+    return hash_.hexdigest()
+
+
+def is_shared_file(file_: BufferedRandom) -> bool:
+    '''
+    Return whether a file is read-only, as blobs (and links to them in artifact
+    directories) are, and should therefore be copied before it's modified.
+    '''
+    return os.fstat(file_.fileno()).st_mode & 0o222 == 0
+
+
+def detach_file(file_: BufferedRandom) -> BufferedRandom:
+    '''
+    Replace the path an open file was opened via with a private, writable copy
+    of the file, and return the copy, opened for reading and writing.
+    '''
+    path = Path(file_.name)
+    temp_path = get_temp_path(path)
+    file_.seek(0, SEEK_SET)
+    with open(temp_path, 'wb') as temp_file:
+        shutil.copyfileobj(file_, temp_file)
+    temp_path.replace(path)
+    file_.close()
+    return cast(BufferedRandom, open(path, 'rb+'))
+
+
+def get_column_dir(path: Path) -> Path:
+    '''
+    Return the directory in which a `PersistentList`'s columns are cached.
+    '''
+    return path.parent / f'.{path.stem}.columns'
+
+
+def update_columns(column_dir: Path,
+                   length: int,
+                   fields: Optional[List[str]],
+                   rows: List[Any]) -> Optional[List[str]]:
+    '''
+    Extend the column files in `column_dir`, which contain `length` rows of the
+    given fields (or `None`, if no rows have been written), with the fields of
+    `rows`, and return the fields that remain representable.
+    '''
+    if len(rows) == 0:
+        return fields
+
+    # Find the fields shared by the existing and new rows.
+    if not all(isinstance(row, dict) for row in rows):
+        raise TypeError('Columns can only be read from lists of maps.')
+    new_fields = [
+        f for f in (rows[0] if fields is None else fields)
+        if isinstance(f, str) and f.isidentifier()
+        and all(f in row for row in rows)]
+
+    # Extend the column files, dropping fields that can't be extended.
+    kept_fields = []
+    for field in new_fields:
+        try:
+            values = np.asarray([row[field] for row in rows])
+            extend_column(column_dir / f'{field}.cbor', length, values)
+            kept_fields.append(field)
+        except (ValueError, TypeError, KeyError):
+            pass
+    for field in set(fields or []) - set(kept_fields):
+        (column_dir / f'{field}.cbor').unlink(missing_ok=True)
+    return kept_fields
+
+
+def extend_column(path: Path, length: int, values: np.ndarray) -> None:
+    '''
+    Append values to the first `length` rows of a column file, creating it if
+    `length` is 0, and promoting its data type if necessary.
+
+    A `ValueError` or `KeyError` is raised if the values can't be stored.
+    '''
+    if values.dtype.kind == 'b':
+        raise ValueError('Boolean columns are not supported.')
+    values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+    if length == 0:
+        tags_by_dtype[values.dtype] # Fail if the dtype is unsupported.
+        write_column(path, values)
+        return
+
+    with open(path, 'r+b') as f:
+        shape, dtype = parse_ndarray(f.read(128))
+        fail_if(shape[0] < length or shape[1:] != values.shape[1:])
+        promoted_dtype = np.result_type(dtype, values.dtype)
+        tags_by_dtype[promoted_dtype] # Fail if the dtype is unsupported.
+
+        # Append the data (discarding any rows written after `length`, e.g. by
+        # an interrupted update), then overwrite the header.
+        if promoted_dtype == dtype:
+            offset = data_offset(len(shape))
+            row_size = int(np.prod(shape[1:])) * dtype.itemsize
+            f.truncate(offset + length * row_size)
+            f.seek(0, SEEK_END)
+            f.write(np.require(values, dtype, ['C_CONTIGUOUS']).data)
+            f.flush()
+            f.seek(0, SEEK_SET)
+            f.write(ndarray_header((length + len(values), *shape[1:]), dtype))
+            f.flush()
+            return
+
+    # Rewrite the column with the promoted data type.
+    old_values = read_column(path)[:length].astype(promoted_dtype)
+    write_column(path, np.concatenate([old_values, values]))
+
+
+def write_column(path: Path, values: np.ndarray) -> None:
+    '''
+    Replace a column file, without modifying the file mapped by views returned
+    by earlier `PersistentList.columns` calls.
+    '''
+    temp_path = get_temp_path(path)
+    write_ndarray(temp_path, values)
+    temp_path.replace(path)
+
+
 def list_header(length: int) -> bytes:
     '''
     Return the CBOR header for a list.
@@ -9,11 +9,22 @@ Internal definitions:
 from __future__ import annotations
 
 import json
-from os.path import lexists
+from bisect import insort
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import fspath, getcwd, getpid, listdir
+from os.path import expanduser, isabs, join, lexists, samefile
 from pathlib import Path
+from sys import intern
+from threading import RLock
 from time import time
-from typing import Any, Dict, Iterator, MutableMapping, Optional, Set, Union
-from weakref import WeakSet, WeakValueDictionary
+from typing import (
+    Any, Dict, Iterator, List, MutableMapping,
+    Optional, Set, Tuple, Union)
+from weakref import WeakValueDictionary, finalize, ref
+
+import cbor2
+
+from ._blobs import BLOB_DIR_NAME
 
 __all__ = ['DirIndex', 'TreeIndex']
 
@@ -28,15 +39,57 @@ TIMESTAMP_PADDING = 1.0; \
     '''
 
 
-dir_indices: MutableMapping[Path, DirIndex] = WeakValueDictionary(); \
+WALKER_THREADS = 8; \
+    '''
+    The default number of threads used to list directories and read metadata
+    files when searching a directory tree for artifacts.
+    '''
+
+
+walker_pool: Optional[ThreadPoolExecutor] = None; \
+    '''
+    The thread pool shared by all artifact searches, created on first use by
+    `get_walker_pool`.
+    '''
+
+
+walker_pool_size = 0; \
+    '''
+    The number of threads in `walker_pool`.
+    '''
+
+
+index_lock = RLock(); \
+    '''
+    A lock that must be held while `DirIndex` or `TreeIndex` objects are being
+    constructed or linked into the directory tree.
+    '''
+
+
+RESOLUTION_CACHE_SIZE = 4096; \
+    '''
+    The maximum number of entries in `resolved_paths`.
+    '''
+
+
+resolved_paths: Dict[str, Path] = {}; \
+    '''
+    Resolved directory paths, by unresolved absolute path string. An entry is
+    only used while the unresolved and resolved paths still refer to the same
+    file, so replacing a symbolic link invalidates it, and the cache is cleared
+    whenever a change to a directory listing is observed.
+    '''
+
+
+dir_indices: MutableMapping[str, DirIndex] = WeakValueDictionary(); \
     '''
-    All instantiated `DirIndex` objects, by path.
+    All instantiated `DirIndex` objects, by path string.
     '''
 
 
-tree_indices: MutableMapping[Path, TreeIndex] = WeakValueDictionary(); \
+tree_indices: MutableMapping[str, TreeIndex] = WeakValueDictionary(); \
     '''
-    All instantiated `TreeIndex` objects, by path.
+    All instantiated `TreeIndex` objects, by root path string.
     '''
 
 
@@ -49,49 +102,108 @@ class DirIndex:
 
     The `DirIndex` constructor is written such that no more than one instance
     will ever exist for a given directory at a given time.
+
+    `DirIndex` objects form a trie mirroring the directory tree. A parent holds
+    weak references to its children, unless it is part of a live `TreeIndex`
+    (*i.e.* it is "pinned"), in which case it holds strong references to them.
     '''
+    __slots__ = (
+        'path', '_parent', '_children', '_pinned',
+        '_ino', '_mtime', '_entry_names',
+        '_meta_ino', '_meta_mtime', '_meta',
+        '__weakref__')
+
     path: Path; "The path to the directory."
-    parent: Optional[DirIndex]; "The parent directory's `DirIndex`."
-    children: Set[DirIndex]; "`DirIndices` for subdirectories (non-exhaustive)."
+
+    _parent: Optional[DirIndex]; (
+        'The parent directory\'s `DirIndex`, if it has been linked.')
+    _children: Optional[Dict[str, Any]]; (
+        'Subdirectory `DirIndex` objects if the index is pinned, or weak '
+        'references to them otherwise, by name (non-exhaustive).')
+    _pinned: bool; "Whether the directory is in a live `TreeIndex`."
 
     _ino: int; "The directory's inode number."
     _mtime: float; "The directory's modification timestamp."
-    _entry_paths: Dict[str, Path]; "Entry paths, by stem."
+    _entry_names: Dict[str, str]; "Entry names (with extensions), by stem."
 
     _meta_ino: int; "The `_meta_.json` file's inode number."
     _meta_mtime: float; "The `_meta_.json` file's modification timestamp."
     _meta: Union[None, Exception, Dict[str, Any]]; "Artifact metadata."
 
     def __new__(cls, path: Path) -> DirIndex:
-        path = path.expanduser().resolve()
-        try:
-            return dir_indices[path]
-        except KeyError:
-            instance: DirIndex = object.__new__(cls)
-            instance.path = path
-            instance.parent = None
-            instance.children = WeakSet() # type: ignore
-
-            if path != path.parent:
-                instance.parent = DirIndex(path.parent)
-                instance.parent.children.add(instance)
-
-            instance._ino = -1
-            instance._mtime = -1.0
-            instance._entry_paths = {}
-
-            instance._meta_ino = -1
-            instance._meta_mtime = -1.0
-            instance._meta = None
-
-            dir_indices[path] = instance
-            for parent_path in path.parents:
-                tree_index = tree_indices.get(parent_path, None)
-                if tree_index is not None:
-                    tree_index._descendants.add(instance)
-
+        # Skip path resolution if the path is already canonical.
+        path_str = expanduser(fspath(path))
+        if not isabs(path_str):
+            path_str = join(getcwd(), path_str)
+        instance = dir_indices.get(path_str, None)
+        if instance is not None:
             return instance
 
+        # Otherwise, resolve it, memoizing the result. Checking that a cached
+        # resolution is still valid takes two `stat` calls, rather than one
+        # `lstat` call per path component.
+        resolved_path = resolved_paths.get(path_str, None)
+        if resolved_path is None or not is_same_file(path_str, resolved_path):
+            resolved_path = Path(path_str).resolve()
+            if len(resolved_paths) >= RESOLUTION_CACHE_SIZE:
+                resolved_paths.clear()
+            resolved_paths[path_str] = resolved_path
+        return cls._from_resolved_path(resolved_path)
+
+    @classmethod
+    def _from_resolved_path(cls, path: Path) -> DirIndex:
+        '''
+        Return the `DirIndex` for an absolute path without symbolic links,
+        constructing it if necessary.
+
+        A new `DirIndex` is linked to its parent's `DirIndex` if the parent's
+        has already been constructed or the directory is in a live `TreeIndex`.
+        Otherwise, the parent's `DirIndex` is constructed lazily. The filesystem
+        root is never linked to a parent.
+        '''
+        with index_lock:
+            try:
+                return dir_indices[str(path)]
+            except KeyError:
+                instance: DirIndex = object.__new__(cls)
+                instance.path = path
+                instance._parent = None
+                instance._children = None
+                instance._pinned = False
+
+                instance._ino = -1
+                instance._mtime = -1.0
+                instance._entry_names = {}
+
+                instance._meta_ino = -1
+                instance._meta_mtime = -1.0
+                instance._meta = None
+
+                dir_indices[str(path)] = instance
+                if path.parent != path and (
+                        str(path.parent) in dir_indices
+                        or is_in_tree_index(str(path))):
+                    instance._link_to_parent()
+
+                return instance
+
+    @property
+    def parent(self) -> Optional[DirIndex]:
+        '''
+        The parent directory's `DirIndex`, or `None` for the filesystem root.
+        '''
+        if self._parent is None and self.path != self.path.parent:
+            self._link_to_parent()
+        return self._parent
+
+    @property
+    def children(self) -> Set[DirIndex]:
+        '''
+        `DirIndex` objects for subdirectories (non-exhaustive).
+        '''
+        with index_lock:
+            return set(self._iter_children())
+
     def get_meta(self) -> Union[None, Exception, Dict[str, Any]]:
         '''
         Return a metatata dictionary if a valid metadata exists at
@@ -106,39 +218,83 @@ class DirIndex:
         Yield all of the entry names such that a file or directory matching
         `{self.path}/{entry_name}*` exists.
         '''
-        self._refresh_entry_paths()
-        return iter(self._entry_paths)
+        self._refresh_entry_names()
+        return iter(self._entry_names)
 
     def get_entry_path(self, entry_name: str) -> Optional[Path]:
         '''
         Return the path to an entry matching `{self.path}/{entry_name}*`, if
         one exists, or `None`, otherwise.
         '''
-        path = self._entry_paths.get(entry_name, None)
-        if path is None or not lexists(path):
-            self._refresh_entry_paths()
-            path = self._entry_paths.get(entry_name, None)
-        return path
+        name = self._entry_names.get(entry_name, None)
+        if name is None or not lexists(self.path / name):
+            self._refresh_entry_names()
+            name = self._entry_names.get(entry_name, None)
+        return None if name is None else self.path / name
 
     def set_entry_path(self, entry_name: str, entry_path: Path) -> None:
         '''
         Associate the file's stem with its full path (including the extension).
         '''
-        self._entry_paths[entry_name] = entry_path
+        self._entry_names[entry_name] = intern(entry_path.name)
 
-    def get_artifacts(self) -> Iterator[DirIndex]:
+    def get_artifacts(self, max_workers: Optional[int] = None,
+                      start_after: Optional[Tuple[str, ...]] = None
+                      ) -> Iterator[DirIndex]:
         '''
         Yield `DirIndex` objects corresponding to the top-level artifacts
-        contained in this directory.
+        contained in this directory, sorted by path.
+
+        Directories are listed and metadata files are read ahead of time by the
+        shared walker pool, with at most `max_workers` (`WALKER_THREADS`, by
+        default) directories being scanned at once. The pool is grown to
+        `max_workers` threads if it's smaller. Directories containing
+        artifacts are not descended into. If `start_after` is provided, only
+        artifacts whose paths relative to this directory, as tuples of entry
+        names, sort after it are yielded, and subtrees preceding it are skipped
+        without being scanned.
+        '''
+        window = max_workers or WALKER_THREADS
+        pool = get_walker_pool(window)
+        queue: List[Tuple[Tuple[str, ...], DirIndex]] = [((), self)]
+        scans: Dict[Tuple[str, ...], Future] = {}
+        try:
+            while queue:
+                for key, dir_index in queue[:window]:
+                    if key not in scans:
+                        scans[key] = pool.submit(dir_index._scan)
+                key, _ = queue.pop(0)
+                artifact, subdir_paths = scans.pop(key).result()
+                if artifact is not None and (
+                        start_after is None or key > start_after):
+                    yield artifact
+                for path in subdir_paths:
+                    subdir_key = (*key, path.name)
+                    if (start_after is None
+                        or subdir_key > start_after
+                        or subdir_key == start_after[:len(subdir_key)]):
+                        insort(queue, (subdir_key, DirIndex(path)))
+        finally:
+            for future in scans.values():
+                future.cancel()
+
+    def _scan(self) -> Tuple[Optional[DirIndex], List[Path]]:
+        '''
+        Return `(self, [])` if this directory is an artifact, and `(None,
+        subdir_paths)` otherwise, where `subdir_paths` is the list of
+        subdirectories to search if the directory is not an artifact's
+        descendant. Blob stores are not searched.
         '''
         meta = self.get_meta()
         if isinstance(meta, dict):
-            yield self
+            return self, []
         elif meta is None:
-            self._refresh_entry_paths()
-            for path in self._entry_paths.values():
-                if path.is_dir():
-                    yield from DirIndex(path).get_artifacts()
+            self._refresh_entry_names()
+            paths = [self.path / name for name in self._entry_names.values()
+                     if name != BLOB_DIR_NAME]
+            return None, [p for p in paths if p.is_dir()]
+        else:
+            return None, []
 
     def _refresh_meta(self) -> None:
         '''
@@ -161,41 +317,94 @@ class DirIndex:
             except Exception as e:
                 self._meta = e
 
-    def _refresh_entry_paths(self) -> None:
+    def _refresh_entry_names(self) -> None:
         '''
-        Ensure that `self._entry_paths` is up-to-date.
+        Ensure that `self._entry_names` is up-to-date.
         '''
         stat = self.path.stat()
         if stat.st_ino != self._ino or stat.st_mtime > self._mtime:
+            if self._ino != -1:
+                resolved_paths.clear()
             self._ino = stat.st_ino
             self._mtime = time() - TIMESTAMP_PADDING
-            self._entry_paths = {p.stem: p for p in self.path.iterdir()}
-            for child in tuple(self.children):
-                if not child.path.is_dir():
-                    child._prune()
+            self._entry_names = {
+                get_stem(name): intern(name)
+                for name in listdir(self.path)}
+            with index_lock:
+                for child in tuple(self._iter_children()):
+                    if not child.path.is_dir():
+                        child._prune()
+
+    def _iter_children(self) -> Iterator[DirIndex]:
+        '''
+        Yield the live `DirIndex` objects in `self._children`. `index_lock`
+        must be held by the caller.
+        '''
+        for child in tuple((self._children or {}).values()):
+            child = child if self._pinned else child()
+            if child is not None:
+                yield child
 
-    def _prune(self) -> None:
+    def _link_to_parent(self) -> None:
         '''
-        Remove this `DirIndex` and its children from their parents' lists of
-        children and all `TreeIndex` objects' lists of descendants.
+        Construct the parent directory's `DirIndex`, if necessary, and add this
+        `DirIndex` to its children, unless this is the filesystem root.
         '''
-        for child in tuple(self.children):
-            child._prune()
-        if self.parent is not None:
-            self.parent.children.remove(self)
-        for parent_path in self.path.parents:
-            tree_index = tree_indices.get(parent_path, None)
-            if tree_index is not None:
-                tree_index._descendants.remove(self)
+        with index_lock:
+            if self._parent is None and self.path != self.path.parent:
+                parent = DirIndex._from_resolved_path(self.path.parent)
+                parent._link(self)
+                self._parent = parent
+
+    def _link(self, child: DirIndex) -> None:
+        '''
+        Add a newly constructed `DirIndex` to `self._children`, pinning it if
+        this directory is pinned. `index_lock` must be held by the caller.
+        '''
+        if self._children is None:
+            self._children = {}
+        if self._pinned:
+            self._children[intern(child.path.name)] = child
+            child._pin()
+        else:
+            self._children[intern(child.path.name)] = ref(child)
+
+    def _pin(self) -> None:
+        '''
+        Keep this `DirIndex` and its instantiated descendants from being
+        garbage-collected. `index_lock` must be held by the caller.
+        '''
+        if not self._pinned:
+            children = {intern(c.path.name): c for c in self._iter_children()}
+            self._pinned = True
+            self._children = children or None
+            for child in children.values():
+                child._pin()
+
+    def _unpin(self) -> None:
+        '''
+        Allow this `DirIndex` and its descendants to be garbage-collected,
+        except for those that are roots of live `TreeIndex` objects.
+        `index_lock` must be held by the caller.
+        '''
+        if self._pinned:
+            children = list(self._iter_children())
+            self._pinned = False
+            self._children = {
+                intern(c.path.name): ref(c) for c in children} or None
+            for child in children:
+                if str(child.path) not in tree_indices:
+                    child._unpin()
 
-    def _descendants(self) -> Iterator[DirIndex]:
+    def _prune(self) -> None:
         '''
-        Yield all instantiated `DirIndex` objects corresponding to the
-        directory's direct and indirect subdirectories.
+        Remove this `DirIndex` and its children from their parents' lists of
+        children. `index_lock` must be held by the caller.
         '''
-        yield self
-        for child in self.children:
-            yield from child._descendants()
+        for child in tuple(self._iter_children()):
+            child._prune()
+        if self._parent is not None and self._parent._children is not None:
+            self._parent._children.pop(self.path.name, None)
 
 
 class TreeIndex:
@@ -205,22 +414,200 @@ class TreeIndex:
     A `TreeIndex` can be constructed to keep its descendants from being
     garbage-collected. Search operations can be performed by calling methods on
     its `root` attribute.
+
+    If a snapshot file (`{root}/_index_.cbor`) exists, it is loaded when the
+    `TreeIndex` is constructed, and it is updated when the `TreeIndex` is
+    garbage-collected or the interpreter exits. Directories whose modification
+    times have not changed since the snapshot was saved are not re-read.
     '''
-    root: DirIndex; (
-        'The `DirIndex` for the root of the tree.')
-    _descendants: Set[DirIndex]; (
-        'All instantiated `DirIndex` objects '
-        'corresponding to directories in the tree.')
+    __slots__ = ('root', '__weakref__')
+
+    root: DirIndex; "The `DirIndex` for the root of the tree."
 
     def __new__(cls, path: Path) -> TreeIndex:
+        with index_lock:
+            root = DirIndex(path)
+            try:
+                return tree_indices[str(root.path)]
+            except KeyError:
+                instance = object.__new__(cls)
+                instance.root = root
+                prefix = str(root.path).rstrip('/') + '/'
+                for key, dir_index in list(dir_indices.items()):
+                    if key.startswith(prefix) and dir_index._parent is None:
+                        dir_index._link_to_parent()
+                root._pin()
+                tree_indices[str(root.path)] = instance
+                finalize(instance, release_tree, root)
+                instance._load_snapshot()
+                return instance
+
+    def save_snapshot(self) -> None:
+        '''
+        Write the state of every instantiated `DirIndex` in the tree, including
+        directory inode numbers, modification timestamps, entry names, and
+        artifact metadata, to `{self.root.path}/_index_.cbor`.
+        '''
+        write_snapshot(self.root)
+
+    def _load_snapshot(self) -> None:
+        '''
+        Initialize the tree's `DirIndex` objects from a snapshot file, if one
+        exists. Indices that have already been populated are left unchanged.
+
+        If the snapshot can't be read, or is invalid, it is ignored, and the
+        tree is scanned as if there were no snapshot.
+        '''
         try:
-            return tree_indices[path]
-        except KeyError:
-            instance = object.__new__(cls)
-            instance.root = DirIndex(path)
-            instance._descendants = set(instance.root._descendants())
-            tree_indices[path] = instance
-            return instance
+            snapshot_path = self.root.path / SNAPSHOT_NAME
+            records = validate_snapshot(cbor2.loads(snapshot_path.read_bytes()))
+        except Exception:
+            return
+
+        with index_lock:
+            for rel_path, ino, mtime, names, *meta_record in records:
+                dir_index = DirIndex._from_resolved_path(
+                    self.root.path / rel_path if rel_path else self.root.path)
+                if dir_index._ino == -1:
+                    dir_index._ino = ino
+                    dir_index._mtime = mtime
+                    dir_index._entry_names = {
+                        get_stem(name): intern(name)
+                        for name in names}
+                if dir_index._meta_ino == -1:
+                    (dir_index._meta_ino,
+                     dir_index._meta_mtime,
+                     dir_index._meta) = meta_record
+
+
+SNAPSHOT_NAME = '_index_.cbor'; \
+    '''
+    The name of the file, in the root directory of a `TreeIndex`, that stores
+    the tree's state between processes.
+    '''
+
+
+SNAPSHOT_VERSION = 1; \
+    '''
+    The version of the snapshot file format.
+    '''
+
+
+def is_same_file(path_str: str, resolved_path: Path) -> bool:
+    '''
+    Return whether a path string refers to the file at a resolved path (`False`
+    if either doesn't exist).
+    '''
+    try:
+        return samefile(path_str, resolved_path)
+    except OSError:
+        return False
+
+
+def get_walker_pool(min_size: int = WALKER_THREADS) -> ThreadPoolExecutor:
+    '''
+    Return the thread pool shared by all artifact searches, creating it if it
+    doesn't exist yet, or replacing it if it has fewer than `min_size` threads.
+
+    A replaced pool's threads exit once the searches using it have finished
+    and it has been garbage-collected.
+    '''
+    global walker_pool, walker_pool_size
+    with index_lock:
+        if walker_pool is None or walker_pool_size < min_size:
+            walker_pool_size = max(min_size, WALKER_THREADS)
+            walker_pool = ThreadPoolExecutor(
+                walker_pool_size, thread_name_prefix='artisan-walker')
+        return walker_pool
+
+
+def write_snapshot(root: DirIndex) -> None:
+    '''
+    Atomically write the state of `root` and its instantiated descendants to a
+    snapshot file in `root.path`.
+    '''
+    records = []
+    with index_lock:
+        pending = [root]
+        while pending:
+            dir_index = pending.pop()
+            pending.extend(dir_index._iter_children())
+            meta = dir_index._meta
+            valid_meta = meta is None or isinstance(meta, dict)
+            records.append([
+                str(dir_index.path)[len(str(root.path))+1:],
+                dir_index._ino,
+                dir_index._mtime,
+                list(dir_index._entry_names.values()),
+                dir_index._meta_ino if valid_meta else -1,
+                dir_index._meta_mtime if valid_meta else -1.0,
+                meta if valid_meta else None])
+
+    dst = root.path / SNAPSHOT_NAME
+    temp_path = dst.with_name(f'.{SNAPSHOT_NAME}.{getpid()}.tmp')
+    temp_path.write_bytes(cbor2.dumps(
+        {'version': SNAPSHOT_VERSION, 'dirs': records}))
+    temp_path.replace(dst)
+
+
+def validate_snapshot(snapshot: object) -> List[list]:
+    '''
+    Return the directory records in a decoded snapshot file, and raise a
+    `TypeError` or `ValueError` if the snapshot is invalid.
+    '''
+    if (not isinstance(snapshot, dict)
+        or snapshot.get('version', None) != SNAPSHOT_VERSION
+        or not isinstance(snapshot.get('dirs', None), list)):
+        raise ValueError('Unsupported snapshot format.')
+
+    for record in snapshot['dirs']:
+        if not (isinstance(record, list) and len(record) == 7):
+            raise TypeError()
+        rel_path, ino, mtime, names, meta_ino, meta_mtime, meta = record
+        if not (isinstance(rel_path, str)
+                and not rel_path.startswith('/')
+                and '..' not in rel_path.split('/')
+                and isinstance(ino, int)
+                and isinstance(mtime, (int, float))
+                and isinstance(names, list)
+                and all(isinstance(name, str) for name in names)
+                and isinstance(meta_ino, int)
+                and isinstance(meta_mtime, (int, float))):
+            raise TypeError()
+        if meta is not None:
+            validate_meta(meta)
+    return snapshot['dirs']
+
+
+def release_tree(root: DirIndex) -> None:
+    '''
+    Update the snapshot file for a garbage-collected `TreeIndex`, if it has one,
+    and unpin the descendants of its root, unless they are also in another
+    `TreeIndex`.
+    '''
+    if lexists(root.path / SNAPSHOT_NAME):
+        try: write_snapshot(root)
+        except OSError: pass
+    with index_lock:
+        if root._parent is None or not root._parent._pinned:
+            root._unpin()
+
+
+def is_in_tree_index(path_str: str) -> bool:
+    '''
+    Return whether the directory at the given resolved path is a proper
+    descendant of the root of a live `TreeIndex`.
+    '''
+    return any(path_str.startswith(key.rstrip('/') + '/')
+               for key in list(tree_indices.keys()))
+
+
+def get_stem(name: str) -> str:
+    '''
+    Return a file name without its final extension, as in `Path(name).stem`.
+    '''
+    i = name.rfind('.')
+    return name[:i] if 0 < i < len(name) - 1 else name
 
 
 def validate_meta(meta: object) -> Dict[str, Any]:
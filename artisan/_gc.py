@@ -0,0 +1,314 @@
+'''
+Garbage collection for artifact root directories.
+
+Exported definitions:
+    gc (function): Remove failed and abandoned artifacts, orphaned temporary
+        files, and unreferenced blobs from an artifact root directory.
+
+Internal definitions:
+    is_abandoned (function): Return whether an artifact's build was started by
+        a process that no longer exists, or its lease has expired.
+'''
+
+from __future__ import annotations
+
+import os, shutil, socket
+from concurrent.futures import ThreadPoolExecutor
+from os import PathLike
+from pathlib import Path
+from stat import S_ISREG
+from time import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from ._artifacts import active_root, is_lease_expired
+from ._blobs import (
+    BLOB_DIR_NAME, LOCK_EX, TEMP_NAME_PATTERN, get_link_manifest_path,
+    get_temp_path, locking_blob_store)
+from ._fs_index import WALKER_THREADS, TreeIndex
+from ._namespaces import Namespace
+
+__all__ = ['gc', 'is_abandoned']
+
+
+
+#-- Constants ------------------------------------------------------------------
+
+GC_MIN_AGE = 3600.0; \
+    '''
+    The default minimum age, in seconds since their last modification, of
+    temporary files and blobs that `gc` removes.
+    '''
+
+
+
+#-- Garbage collection ---------------------------------------------------------
+
+def gc(root: Union[PathLike, str, None] = None, *,
+       dry_run: bool = False,
+       archive: Union[PathLike, str, None] = None,
+       min_age: float = GC_MIN_AGE,
+       max_workers: Optional[int] = None) -> Namespace:
+    '''
+    Remove failed and abandoned artifacts, orphaned temporary files, and
+    unreferenced blobs from an artifact root directory.
+
+    Failed artifacts are top-level artifacts whose metadata contains a "Failure"
+    event. Abandoned artifacts are top-level artifacts whose builds were started
+    by processes on this host that no longer exist, or whose builders' leases
+    have expired (see `Artifact._lease_duration_`). Orphaned temporary files are
+    temporary files written by artisan (named like ".data.cbor.1234.tmp") in
+    artifact directories, left behind by interrupted writes. Blobs (see
+    `Artifact._deduplicate_`) are unreferenced when no other hard link to them
+    exists, no symbolic link under `root` points to them, and no symbolic link
+    listed in their link manifests (which record links created outside `root`,
+    e.g. in artifacts with explicit paths) still points to them. Temporary files
+    and blobs are only removed if they were modified at least `min_age` seconds
+    ago, so in-progress writes are not disturbed.
+
+    Artifacts are searched for, and files are removed, by pools of
+    `max_workers` threads (`WALKER_THREADS`, by default). If `archive` is
+    provided, artifacts are moved to the corresponding paths in the `archive`
+    directory (which should be outside of `root`) instead of being deleted, and
+    symbolic links to blobs in archived artifacts are replaced with copies of
+    the blobs. If `dry_run` is true, nothing is removed.
+
+    Parameters:
+        root: The directory to clean up (`active_root`, by default).
+        dry_run: Whether to report what would be removed without removing it.
+        archive: A directory to move failed and abandoned artifacts into.
+        min_age: The minimum age of temporary files and blobs to remove.
+        max_workers: The number of threads to use.
+
+    Returns:
+        A namespace with the fields `failed`, `abandoned`, `temp_files`, and
+        `blobs`, listing the paths that were (or, in a dry run, would be)
+        removed, and `reclaimable_bytes`, the total size of the files that were
+        (or would be) removed, excluding files that remain linked elsewhere.
+    '''
+    root = Path(active_root.get() if root is None else root).resolve()
+    archive = None if archive is None else Path(archive).resolve()
+    min_mtime = time() - min_age
+
+    with ThreadPoolExecutor(max_workers or WALKER_THREADS) as pool:
+        # Find failed and abandoned artifacts.
+        failed: List[Path] = []
+        abandoned: List[Path] = []
+        for dir_index in TreeIndex(root).root.get_artifacts(max_workers):
+            meta = dir_index.get_meta()
+            if not isinstance(meta, dict):
+                continue
+            events = meta['events']
+            if any(e['type'] == 'Failure' for e in events):
+                failed.append(dir_index.path)
+            elif is_abandoned(dir_index.path, events):
+                abandoned.append(dir_index.path)
+        artifacts = sorted(failed) + sorted(abandoned)
+
+        # Find orphaned temporary files and unreferenced blobs.
+        temp_files, blobs = find_garbage_files(root, set(artifacts), min_mtime)
+
+        # Measure and remove everything that was found.
+        garbage = [*artifacts, *temp_files, *blobs]
+        reclaimable_bytes = sum(pool.map(get_reclaimable_size, garbage))
+        if not dry_run:
+            list(pool.map(
+                lambda path: remove_tree(path, root, archive), artifacts))
+            list(pool.map(remove_file, temp_files))
+            blobs = remove_blobs(root / BLOB_DIR_NAME, blobs, min_mtime)
+
+    return Namespace(
+        failed = sorted(failed),
+        abandoned = sorted(abandoned),
+        temp_files = temp_files,
+        blobs = blobs,
+        reclaimable_bytes = reclaimable_bytes)
+
+
+def is_abandoned(path: Path, events: List[dict]) -> bool:
+    '''
+    Return whether an artifact's build was started by a process that no longer
+    exists, or its lease has expired, given the path to the artifact and its
+    event log.
+
+    Only builds queued or started on this host, with "Queued" or "Start" events
+    recording the process's ID, are checked for liveness.
+    '''
+    if is_lease_expired(path, events):
+        return True
+    starts = [e for e in events if e['type'] in ('Queued', 'Start')]
+    finished = any(e['type'] in ('Success', 'Failure') for e in events)
+    if finished or not starts:
+        return False
+    pid, host = starts[-1].get('pid'), starts[-1].get('host')
+    return (isinstance(pid, int)
+            and host == socket.gethostname()
+            and not is_process_alive(pid))
+
+
+def is_process_alive(pid: int) -> bool:
+    '''
+    Return whether a process with the given ID exists on this host.
+    '''
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def find_garbage_files(root: Path,
+                       excluded_dirs: Set[Path],
+                       min_mtime: float) -> Tuple[List[Path], List[Path]]:
+    '''
+    Return the temporary files in artifact directories under `root` and the
+    unreferenced blobs in its blob store that were last modified before
+    `min_mtime`, not including files in `excluded_dirs`.
+    '''
+    blob_dir = root / BLOB_DIR_NAME
+    temp_files: List[Path] = []
+    linked_blobs: Set[str] = set()
+    in_artifact: Dict[str, bool] = {}
+
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [
+            n for n in dir_names
+            if Path(dir_path, n) not in excluded_dirs
+            and Path(dir_path, n) != blob_dir]
+        in_artifact[dir_path] = (
+            in_artifact.get(os.path.dirname(dir_path), False)
+            or '_meta_.json' in file_names)
+        for name in [*dir_names, *file_names]:
+            path = Path(dir_path, name)
+            if path.is_symlink():
+                target = Path(dir_path, os.readlink(path))
+                if target.parent.resolve() == blob_dir:
+                    linked_blobs.add(target.name)
+            elif (in_artifact[dir_path]
+                  and TEMP_NAME_PATTERN.fullmatch(name)
+                  and get_mtime(path) < min_mtime):
+                temp_files.append(path)
+
+    blobs = [
+        entry for entry in sorted(blob_dir.iterdir())
+        if not entry.name.startswith('_')
+        and entry.name not in linked_blobs
+        and entry.lstat().st_nlink == 1
+        and get_mtime(entry) < min_mtime
+        and not has_external_links(entry, excluded_dirs)
+    ] if blob_dir.is_dir() else []
+
+    return sorted(temp_files), blobs
+
+
+def has_external_links(blob_path: Path, excluded_dirs: Set[Path]) -> bool:
+    '''
+    Return whether any symbolic link listed in a blob's link manifest, and not
+    in `excluded_dirs`, still points to the blob.
+    '''
+    try:
+        link_paths = get_link_manifest_path(blob_path).read_text().split('\n')
+    except FileNotFoundError:
+        return False
+    return any(
+        os.path.islink(p)
+        and Path(p).resolve() == blob_path.resolve()
+        and not any(d in Path(p).parents for d in excluded_dirs)
+        for p in link_paths if p != '')
+
+
+def get_mtime(path: Path) -> float:
+    '''
+    Return a path's modification time, without following symbolic links.
+    '''
+    return path.lstat().st_mtime
+
+
+def get_reclaimable_size(path: Path) -> int:
+    '''
+    Return the number of bytes that would be freed by removing a file or
+    directory tree, excluding files that remain linked elsewhere.
+    '''
+    return sum(
+        stat.st_size for stat in iter_file_stats(path)
+        if stat.st_nlink == 1)
+
+
+def iter_file_stats(path: Path) -> Iterator[os.stat_result]:
+    '''
+    Yield `lstat` results for a regular file, or the regular files in a
+    directory tree.
+    '''
+    paths = (
+        [os.path.join(d, n) for d, _, names in os.walk(path) for n in names]
+        if path.is_dir() and not path.is_symlink()
+        else [str(path)])
+    for path_str in paths:
+        try:
+            stat = os.lstat(path_str)
+        except FileNotFoundError:
+            continue
+        if S_ISREG(stat.st_mode):
+            yield stat
+
+
+def remove_tree(path: Path, root: Path, archive: Optional[Path]) -> None:
+    '''
+    Delete a directory tree, or move it to the corresponding path in `archive`.
+    '''
+    if archive is None:
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        dst = archive / path.relative_to(root)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(path), str(dst))
+        copy_linked_blobs(dst, root / BLOB_DIR_NAME)
+
+
+def copy_linked_blobs(path: Path, blob_dir: Path) -> None:
+    '''
+    Replace the symbolic links to blobs in `blob_dir` within a directory tree
+    with copies of the blobs, so the tree doesn't depend on the blob store.
+    '''
+    for dir_path, dir_names, file_names in os.walk(path):
+        for name in file_names:
+            link_path = Path(dir_path, name)
+            target = link_path.resolve()
+            if link_path.is_symlink() and target.parent == blob_dir.resolve():
+                temp_path = get_temp_path(link_path)
+                shutil.copyfile(target, temp_path)
+                temp_path.replace(link_path)
+
+
+def remove_file(path: Path) -> None:
+    '''
+    Delete a file, if it still exists.
+    '''
+    path.unlink(missing_ok=True)
+
+
+def remove_blobs(blob_dir: Path, blobs: List[Path], min_mtime: float
+                 ) -> List[Path]:
+    '''
+    Delete blobs and their link manifests, and return the paths of the blobs
+    that were deleted.
+
+    The blob store is locked while blobs are removed, and blobs that have been
+    linked or reused (refreshing their modification times) since they were
+    found are kept.
+    '''
+    removed: List[Path] = []
+    if not blobs:
+        return removed
+    with locking_blob_store(blob_dir, LOCK_EX):
+        for path in blobs:
+            try:
+                stat = path.lstat()
+            except FileNotFoundError:
+                continue
+            if stat.st_nlink == 1 and stat.st_mtime < min_mtime:
+                path.unlink()
+                get_link_manifest_path(path).unlink(missing_ok=True)
+                removed.append(path)
+    return removed
@@ -3,6 +3,8 @@ HTTP interfaces to Artisan contexts.
 
 Exported definitions:
     API (class): A WSGI server that provides access to an Artisan context.
+    AsyncAPI (`API` subclass): An ASGI server that provides access to an
+        Artisan context.
     WebUI (class): An HTTP responder for HTML UI requests.
     asset_builder (function decorator): <Not yet implemented>
     default_asset_builders (list): <Not yet implemented>
@@ -10,16 +12,27 @@ Exported definitions:
 
 from __future__ import annotations
 
-import json, mimetypes, traceback
+import asyncio, hashlib, json, mimetypes, re, secrets, socket, sys, time
+import traceback, zlib
 from base64 import b64decode
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from contextvars import copy_context
 from datetime import datetime
-from io import BufferedReader
+from functools import partial
+from itertools import islice
+from io import BufferedReader, BytesIO
+from os import fstat, getpid, scandir, stat_result
 from pathlib import Path
+from socketserver import ThreadingMixIn
 from tempfile import TemporaryDirectory
+from threading import BoundedSemaphore, Condition, Lock, Thread
 from typing import (
-    Callable, Collection, Dict, Iterator, List,
-    Mapping, Optional, Tuple, TypeVar, Union, cast)
-from wsgiref.simple_server import make_server
+    Any, AsyncIterator, Awaitable, Callable, Collection, Deque, Dict,
+    Iterable, Iterator, List, Mapping, Optional, Tuple, TypeVar, Union, cast)
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIServer, make_server
 
 try:
     from fcntl import LOCK_SH, LOCK_UN, lockf
@@ -28,17 +41,31 @@ except ImportError:
     locking_is_supported = False
 
 import cbor2
+import numpy as np
 
-from ._artifacts import Artifact, DynamicArtifact, build
+try:
+    import brotli # type: ignore
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard # type: ignore
+except ImportError:
+    zstandard = None
+
+from ._artifacts import (
+    LEASE_FILE_NAME, Artifact, DynamicArtifact, build, holding_lease, log,
+    run_in_thread)
+from ._cbor_io import data_offset, ndarray_header, parse_ndarray
 from ._context import Context, get_context, using_context
-from ._fs_index import DirIndex
-from ._schemas import (
-    get_spec_schema, get_spec_dict_schema,
-    get_spec_list_schema)
+from ._fs_index import DirIndex, TreeIndex, get_stem
+from ._schemas import SCHEMA_CACHE_SIZE, get_cached_schemas
 
 T = TypeVar('T')
 
-__all__ = ['API', 'WebUI', 'asset_builder', 'default_asset_builders']
+__all__ = [
+    'API', 'AsyncAPI', 'WebUI',
+    'asset_builder', 'default_asset_builders']
 
 
 
@@ -51,14 +78,21 @@ class API:
     The following request types are supported:
 
     - `GET /artifacts{/path*}`
+    - `GET /artifacts{/path*}?slice={index}`
+    - `GET /artifacts?type={type}&cursor={cursor}&limit={limit}`
     - `POST /artifacts`
+    - `POST /artifacts/_batch/get`
     - `DELETE /artifacts{/path*}`
+    - `GET /events?path={path}`
+    - `GET /status`
     - `GET /schemas/spec`
     - `GET /schemas/spec-list`
     - `GET /schemas/spec-dict`
     - `GET /ui{/path*}`
 
-    Analogous `HEAD` and `OPTIONS` requests are also supported.
+    Analogous `HEAD` and `OPTIONS` requests are also supported, as are
+    byte-range requests for files, including suffix ranges and multiple ranges
+    (which are answered with a "multipart/byteranges" body).
 
     Arguments:
         permissions: A mapping from passwords to permission sets. Permissions
@@ -71,13 +105,20 @@ class API:
         root: A path to override the active context's `root`.
         scope: A mapping to override the active context's `scope`.
         builder: A callable to override the active context's `builder`.
+        build_workers: The number of threads used to build artifacts requested
+            via `POST /artifacts`.
+        build_queue_size: The maximum number of requested builds waiting for
+            a thread. Requests made when the queue is full receive a "503
+            Service Unavailable" response.
     '''
     def __init__(self, *,
                  permissions: Optional[Mapping[str, Collection[str]]] = None,
                  ui: Optional[Callable[[dict, Callable], None]] = None,
                  root: Union[str, Path, None] = None,
                  scope: Optional[Mapping[str, type]] = None,
-                 builder: Optional[Callable[[Artifact, object], None]] = None
+                 builder: Optional[Callable[[Artifact, object], None]] = None,
+                 build_workers: int = 4,
+                 build_queue_size: int = 64
                  ) -> None:
         permissions = (
             permissions if permissions is not None
@@ -95,10 +136,13 @@ class API:
             scope = active_context.scope if scope is None else scope,
             builder = active_context.builder if builder is None else builder)
 
+        build_executor = BuildExecutor(build_workers, build_queue_size)
         with using_context(self._context):
             self._context.root.mkdir(parents=True, exist_ok=True)
             self._request_handlers: Dict[str, Callable] = {
-                '/artifacts': ArtifactAPI(),
+                '/artifacts': ArtifactAPI(build_executor=build_executor),
+                '/events': EventAPI(),
+                '/status': StatusAPI(build_executor),
                 '/schemas': SchemaAPI(),
                 '/ui': ui or WebUI()}
 
@@ -106,7 +150,34 @@ class API:
         '''
         Respond to a WSGI server request.
         '''
+        body = self._handle_request(env, responder)
+        file_wrapper = env.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            return cast(Iterator[bytes], body) # Allow `sendfile` use.
+        else:
+            return self._iter_in_context(body)
+
+    def serve(self, port: int = 8000) -> None:
+        '''
+        Start a server on the specified port.
+
+        This method uses the reference WSGI server defined in the standard
+        library, handling each request in a separate thread. Other servers,
+        which can be installed via `pip`, may be more robust and performant.
+        '''
+        wsgi_app = partial(API.__call__, self)
+        with make_server('', port, wsgi_app, # type: ignore
+                         server_class=ThreadingWSGIServer) as server:
+            server.serve_forever()
+
+    def _handle_request(self, env: dict, responder: Callable
+                        ) -> Iterable[bytes]:
+        '''
+        Check a request's permissions, and pass it to the appropriate handler.
+        '''
         method = env['REQUEST_METHOD']
+        if method == 'POST' and env['PATH_INFO'] == '/artifacts/_batch/get':
+            method = 'GET' # Batch reads only require "read" permission.
         auth = env.get('HTTP_AUTHORIZATION', '')
         password = b64decode(auth.split(' ')[-1]).decode('utf8')[1:]
         if method not in self._allowed_methods.get(password, ()):
@@ -121,16 +192,165 @@ class API:
             responder('404 Not Found', [])
             return iter(())
 
+    def _iter_in_context(self, body: Iterable[bytes]) -> Iterator[bytes]:
+        '''
+        Iterate over a response body, with `self._context` active while each
+        chunk is being generated.
+        '''
+        chunks = iter(body)
+        try:
+            while True:
+                with using_context(self._context):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close() # type: ignore
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    '''
+    A `WSGIServer` that handles each request in a separate thread.
+    '''
+    daemon_threads = True
+
+
+
+#-- `AsyncAPI` -----------------------------------------------------------------
+
+class AsyncAPI(API):
+    '''
+    An ASGI server that provides access to an Artisan context.
+
+    `AsyncAPI` supports the same requests, arguments, and permissions as `API`.
+    Requests are handled by `API`'s responders in the event loop's default
+    executor, and response bodies are streamed to the client chunk by chunk,
+    so file reads and artifact builds do not block the event loop. Event
+    streams are iterated in the event loop itself, so long-lived `/events`
+    connections don't occupy executor threads.
+    '''
+    async def __call__(self, # type: ignore
+                       scope: dict,
+                       receive: Callable[[], Awaitable[dict]],
+                       send: Callable[[dict], Awaitable[None]]) -> None:
+        '''
+        Respond to an ASGI server request.
+        '''
+        if scope['type'] == 'lifespan':
+            await serve_lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._serve_http(scope, receive, send)
+
     def serve(self, port: int = 8000) -> None:
         '''
         Start a server on the specified port.
 
-        This method uses the reference WSGI server defined in the standard
-        library. Other servers, which can be installed via `pip`, may be more
-        robust and performant.
+        Uvicorn is used if it is installed. Otherwise, the multithreaded WSGI
+        server used by `API.serve` is used.
         '''
-        with make_server('', port, self) as server: # type: ignore
-            server.serve_forever()
+        try:
+            import uvicorn # type: ignore
+        except ImportError:
+            super().serve(port)
+        else:
+            uvicorn.run(self, port=port)
+
+    async def _serve_http(self,
+                          scope: dict,
+                          receive: Callable[[], Awaitable[dict]],
+                          send: Callable[[dict], Awaitable[None]]) -> None:
+        '''
+        Respond to an HTTP request.
+        '''
+        # Read the request body.
+        req_body = bytearray()
+        while True:
+            message = await receive()
+            req_body += message.get('body', b'')
+            if not message.get('more_body', False):
+                break
+
+        # Start handling the request.
+        response_start: Dict[str, Any] = {}
+        def responder(status: str, headers: list, exc_info: object = None
+                      ) -> None:
+            response_start['status'] = int(status.split(' ')[0])
+            response_start['headers'] = [
+                (k.lower().encode('latin1'), v.encode('latin1'))
+                for k, v in headers]
+        env = wsgi_environ(scope, bytes(req_body))
+        body = await run_in_thread(self._handle_request, env, responder)
+
+        # Stream the response.
+        if hasattr(body, '__aiter__'):
+            await send({'type': 'http.response.start', **response_start})
+            async_chunks = body.__aiter__() # type: ignore
+            try:
+                async for chunk in async_chunks:
+                    await send({'type': 'http.response.body',
+                                'body': chunk, 'more_body': True})
+            finally:
+                await async_chunks.aclose()
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        chunks = self._iter_in_context(body)
+        try:
+            chunk = await run_in_thread(next, chunks, None)
+            await send({'type': 'http.response.start', **response_start})
+            while chunk is not None:
+                await send({'type': 'http.response.body',
+                            'body': chunk, 'more_body': True})
+                chunk = await run_in_thread(next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(chunks, 'close'):
+                await run_in_thread(chunks.close) # type: ignore
+
+
+async def serve_lifespan(receive: Callable[[], Awaitable[dict]],
+                         send: Callable[[dict], Awaitable[None]]) -> None:
+    '''
+    Acknowledge ASGI lifespan events.
+    '''
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def wsgi_environ(scope: dict, req_body: bytes) -> dict:
+    '''
+    Return a WSGI environment corresponding to an ASGI HTTP connection scope.
+    '''
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    env = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'CONTENT_LENGTH': str(len(req_body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(req_body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False}
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin1').upper().replace('-', '_')
+        key = key if key == 'CONTENT_TYPE' else f'HTTP_{key}'
+        value = value.decode('latin1')
+        env[key] = f'{env[key]},{value}' if key in env else value
+    return env
 
 
 
@@ -142,19 +362,42 @@ class ArtifactAPI:
 
     Supported routes:
         `GET /artifacts{/path*}`: Respond with the corresponding file or a
-            shallow representation of the corresponding directory.
+            shallow representation of the corresponding directory. If a "v"
+            parameter equal to a file's entity tag is included, and the file
+            belongs to a successfully built artifact, the response is marked
+            immutable.
+        `GET /artifacts{/path*}?slice={index}`: Respond with a region of the
+            array stored in the corresponding file, as a CBOR file.
+        `GET /artifacts?type={type}&cursor={cursor}&limit={limit}`: Respond
+            with a page of top-level artifacts, sorted by path, as a CBOR map
+            with an "artifacts" entry (mapping paths to metadata) and a
+            "cursor" entry (to pass to request the next page, or `null`). All
+            parameters are optional.
         `POST /artifacts{/path*}`: Create a new artifact from a specification. A
-            password with "write" permission is required.
+            password with "write" permission is required. The artifact is
+            built asynchronously, by `build_executor`.
+        `POST /artifacts/_batch/get`: Respond with shallow representations of
+            several artifacts, given a CBOR map with a "paths" entry and an
+            optional "fields" entry. The response maps each path to `null`, if
+            no artifact exists there, to `{"_error_": "403 Forbidden"}`, if it
+            is outside the root directory or can't be read, or to the
+            artifact's representation, with the contents of the requested
+            fields included (CBOR files as embedded data items, and other files
+            as byte strings). Fields larger than `BATCH_INLINE_SIZE` are
+            represented by their versioned URIs instead.
         `DELETE /artifacts{/path*}`: Delete the artifact at the given path. A
             password with "delete" permission is required.
 
     Analogous `HEAD` and `OPTIONS` requests are also supported.
     '''
-    def __init__(self, prefix: str = '/artifacts') -> None:
+    def __init__(self, prefix: str = '/artifacts',
+                 build_executor: Optional[BuildExecutor] = None) -> None:
         self._prefix = prefix
         self._root = get_context().root.resolve()
+        self._tree_index = TreeIndex(self._root)
+        self._build_executor = build_executor or BuildExecutor()
 
-    def __call__(self, env: dict, responder: Callable) -> Iterator[bytes]:
+    def __call__(self, env: dict, responder: Callable) -> Iterable[bytes]:
         method = env['REQUEST_METHOD']
         handler = (
             self._handle_options_request if method == 'OPTIONS' else
@@ -167,11 +410,9 @@ class ArtifactAPI:
             ('Access-Control-Allow-Origin', '*'),
             ('Cache-Control', 'no-cache')]
         try:
-            status, dynamic_headers, body, *work = handler(env)
-            responder(status, static_headers + dynamic_headers)
-            yield body
-            for work_item in work:
-                work_item()
+            status, dynamic_headers, body = handler(env)
+            if any(k == 'Cache-Control' for k, _ in dynamic_headers):
+                static_headers = static_headers[:1]
         except ValueError:
             responder('400 Bad Request', static_headers)
             return iter(())
@@ -183,7 +424,11 @@ class ArtifactAPI:
             return iter(())
         except Exception:
             responder('500 Internal Server Error', static_headers)
-            yield traceback.format_exc().encode('utf8')
+            return iter([traceback.format_exc().encode('utf8')])
+        status, dynamic_headers, body = compress_response(
+            env, status, dynamic_headers, body)
+        responder(status, static_headers + dynamic_headers)
+        return [body] if isinstance(body, bytes) else body
 
     def _handle_options_request(self, env: dict) -> tuple:
         return ('204 No Content',
@@ -193,10 +438,17 @@ class ArtifactAPI:
                 b'')
 
     def _handle_head_request(self, env: dict) -> tuple:
-        env = {**env, 'HTTP_RANGE': 'bytes=0-0'}
-        return (*self._handle_get_request(env)[:2], b'')
+        status, headers, body = self._handle_get_request(env)
+        if hasattr(body, 'close'):
+            body.close()
+        return (status, headers, b'')
 
     def _handle_get_request(self, env: dict) -> tuple:
+        query = parse_qs(env.get('QUERY_STRING', ''))
+        is_listing = any(k in query for k in ('type', 'cursor', 'limit'))
+        if env['PATH_INFO'].rstrip('/') == self._prefix and is_listing:
+            return self._handle_listing_request(env, query)
+
         path = self._get_path(env)
         if path.is_file():
             return self._handle_file_get_request(env, path)
@@ -204,26 +456,96 @@ class ArtifactAPI:
             return self._handle_dir_get_request(env, path)
 
     def _handle_file_get_request(self, env: dict, path: Path) -> tuple:
-        timestamp = get_file_timestamp(path)
-        if get_last_request_time(env) >= timestamp:
-            return ('304 Not Modified', [], b'')
-        else:
-            start, end = env.get('HTTP_RANGE', '0-').strip('bytes=').split('-')
-            start, end = int(start), (int(end) if end != '' else 2**48)
-            timestamp_str = (
-                datetime.fromtimestamp(timestamp)
-                .strftime('%a, %d %b %Y %H:%M:%S GMT'))
-            body = read_file(path, start, end)
+        stat = path.stat()
+        timestamp = get_file_timestamp(stat)
+        file_etag = get_file_etag(stat)
+        cache_policy = get_cache_policy(env, path, file_etag)
+        index_strs = parse_qs(env.get('QUERY_STRING', '')).get('slice')
+        etag = (
+            file_etag if index_strs is None
+            else get_slice_etag(file_etag, index_strs[-1]))
+        content_type = (
+            get_content_type(path) if index_strs is None
+            else 'application/cbor')
+        validators = [('ETag', etag), ('Cache-Control', cache_policy)]
+        cached_etag = get_cached_etag(env, etag, timestamp)
+        if cached_etag is not None:
+            return ('304 Not Modified',
+                    [('ETag', cached_etag), ('Cache-Control', cache_policy),
+                     *get_vary_headers(content_type)],
+                    b'')
+
+        size = stat.st_size
+        timestamp_str = (
+            datetime.fromtimestamp(timestamp)
+            .strftime('%a, %d %b %Y %H:%M:%S GMT'))
+        headers = [
+            ('Accept-Ranges', 'bytes'),
+            ('Last-Modified', timestamp_str),
+            *validators]
+        ranges = parse_byte_ranges(env.get('HTTP_RANGE', ''), size)
+
+        if index_strs is not None:
+            length, chunks = read_array_slice(path, index_strs[-1])
             return ('200 OK',
-                    [('Content-Type', get_content_type(path)),
-                     ('Content-Length', str(len(body))),
-                     ('Last-Modified', timestamp_str)],
-                    body)
+                    [('Last-Modified', timestamp_str),
+                     *validators,
+                     ('Content-Type', 'application/cbor'),
+                     ('Content-Length', str(length))],
+                    chunks)
+        elif ranges is None:
+            return ('200 OK',
+                    [*headers,
+                     ('Content-Type', content_type),
+                     ('Content-Length', str(size))],
+                    self._open_file_range(env, path, 0, size))
+        elif len(ranges) == 0:
+            return ('416 Range Not Satisfiable',
+                    [*headers, ('Content-Range', f'bytes */{size}')],
+                    b'')
+        elif len(ranges) == 1:
+            (start, end), = ranges
+            return ('206 Partial Content',
+                    [*headers,
+                     ('Content-Type', content_type),
+                     ('Content-Length', str(end - start)),
+                     ('Content-Range', f'bytes {start}-{end-1}/{size}')],
+                    self._open_file_range(env, path, start, end))
+        else:
+            boundary = secrets.token_hex(16)
+            parts = [
+                (start, end, (
+                    f'\r\n--{boundary}\r\n'
+                    f'Content-Type: {content_type}\r\n'
+                    f'Content-Range: bytes {start}-{end-1}/{size}\r\n\r\n'
+                ).encode('latin1'))
+                for start, end in ranges]
+            trailer = f'\r\n--{boundary}--\r\n'.encode('latin1')
+            length = sum(len(p) + end - start for start, end, p in parts)
+            return ('206 Partial Content',
+                    [*headers,
+                     ('Content-Type',
+                      f'multipart/byteranges; boundary={boundary}'),
+                     ('Content-Length', str(length + len(trailer)))],
+                    iter_byteranges(path, parts, trailer))
+
+    def _open_file_range(self, env: dict, path: Path, start: int, end: int
+                         ) -> Iterable[bytes]:
+        body = FileRange(path, start, end)
+        if start >= 128 and 'wsgi.file_wrapper' in env:
+            return env['wsgi.file_wrapper'](body, FILE_CHUNK_SIZE)
+        else:
+            return body
 
     def _handle_dir_get_request(self, env: dict, path: Path) -> tuple:
         timestamp = get_dir_timestamp(path)
-        if get_last_request_time(env) >= timestamp:
-            return ('304 Not Modified', [], b'')
+        etag = get_dir_etag(path)
+        cached_etag = get_cached_etag(env, etag, timestamp)
+        if cached_etag is not None:
+            return ('304 Not Modified',
+                    [('ETag', cached_etag),
+                     *get_vary_headers('application/cbor')],
+                    b'')
         else:
             timestamp_str = (
                 datetime.fromtimestamp(timestamp)
@@ -233,24 +555,132 @@ class ArtifactAPI:
             return ('200 OK',
                     [('Content-Type', 'application/cbor'),
                      ('Content-Length', str(len(body))),
-                     ('Last-Modified', timestamp_str)],
+                     ('Last-Modified', timestamp_str),
+                     ('ETag', etag)],
                     body)
 
+    def _handle_listing_request(self, env: dict, query: dict) -> tuple:
+        type_ = query.get('type', [None])[-1]
+        cursor = query.get('cursor', [''])[-1]
+        limit = int(query.get('limit', [str(LISTING_PAGE_SIZE)])[-1])
+        if limit < 1:
+            raise ValueError('`limit` must be positive.')
+
+        # Artifacts whose metadata became invalid after they were found are
+        # skipped.
+        def get_entry(dir_index: DirIndex) -> Tuple[str, object]:
+            return (dir_index.path.relative_to(self._root).as_posix(),
+                    dir_index.get_meta())
+        artifacts = self._tree_index.root.get_artifacts(
+            start_after=tuple(cursor.split('/')) if cursor else None)
+        entries = map(get_entry, artifacts)
+        page = list(islice((
+            (path, meta) for path, meta in entries
+            if isinstance(meta, dict)
+            and (type_ is None or meta['spec'].get('type') == type_)
+        ), limit + 1))
+
+        body = cbor2.dumps({
+            'artifacts': dict(page[:limit]),
+            'cursor': page[limit-1][0] if len(page) > limit else None})
+        return ('200 OK',
+                [('Content-Type', 'application/cbor'),
+                 ('Content-Length', str(len(body)))],
+                body)
+
+    def _handle_batch_get_request(self, env: dict) -> tuple:
+        req_body_size = int(env.get('CONTENT_LENGTH', '0'))
+        try:
+            req_body = cbor2.loads(env['wsgi.input'].read(req_body_size))
+        except cbor2.CBORDecodeError:
+            raise ValueError('Invalid batch request.')
+        if (not isinstance(req_body, dict)
+            or not is_string_list(req_body.get('paths'))
+            or not is_string_list(req_body.get('fields', []))):
+            raise ValueError('Invalid batch request.')
+
+        # Errors are reported per path, as they would be for `GET` requests.
+        results: Dict[str, object] = {}
+        for path_str in req_body['paths']:
+            try:
+                path = self._resolve(path_str.lstrip('/'))
+                results[path_str] = (
+                    self._get_batch_entry(path, req_body.get('fields', []))
+                    if path.is_dir() else None)
+            except ValueError:
+                results[path_str] = {'_error_': '400 Bad Request'}
+            except PermissionError:
+                results[path_str] = {'_error_': '403 Forbidden'}
+            except OSError:
+                results[path_str] = None
+
+        body = cbor2.dumps(results)
+        return ('200 OK',
+                [('Content-Type', 'application/cbor'),
+                 ('Content-Length', str(len(body)))],
+                body)
+
+    def _get_batch_entry(self, path: Path, fields: List[str]
+                         ) -> Dict[str, object]:
+        dir_index = DirIndex(path)
+        entry: Dict[str, object] = {'_meta_': dir_index.get_meta()}
+        for name in DynamicArtifact @ path:
+            entry[name] = None
+        for name in fields:
+            field_path = dir_index.get_entry_path(name)
+            if name not in entry or not field_path or not field_path.is_file():
+                continue
+            stat = field_path.stat()
+            if stat.st_size > BATCH_INLINE_SIZE:
+                rel_path = path.relative_to(self._root) / name
+                version = get_file_etag(stat)[1:-1]
+                entry[name] = (
+                    f'{self._prefix}/{rel_path.as_posix()}?v={version}')
+            elif field_path.suffix == '.cbor':
+                content = read_cbor_item(field_path)
+                entry[name] = cbor2.CBORTag(24, content) # Embedded CBOR
+            else:
+                entry[name] = read_file_range(field_path)
+        return entry
+
     def _handle_post_request(self, env: dict) -> tuple:
+        if env['PATH_INFO'] == f'{self._prefix}/_batch/get':
+            return self._handle_batch_get_request(env)
+
+        # Builds are logged as "Queued", and their leases are held, until
+        # they're run, so waiting readers and matching requests treat queued
+        # builds like running ones, and builds abandoned in the queue expire.
         work: List[Callable] = []
         original_builder = get_context().builder
         def delayed_builder(artifact: Artifact, spec: object) -> None:
-            work.append(lambda: original_builder(artifact, spec))
+            lease_duration = artifact._lease_duration_
+            log(artifact, 'Queued', pid=getpid(), host=socket.gethostname(),
+                lease_duration=lease_duration)
+            lease = ExitStack()
+            lease.enter_context(
+                holding_lease(artifact / LEASE_FILE_NAME, lease_duration))
+            def run_build() -> None:
+                with lease:
+                    original_builder(artifact, spec)
+            work.append(run_build)
 
         req_body_size = int(env.get('CONTENT_LENGTH', '0'))
         req_body = cbor2.loads(env['wsgi.input'].read(req_body_size))
-        with using_context(get_context(), builder=delayed_builder):
-            validate_path_strings(req_body)
-            artifact = build(Artifact, req_body)
+        if not self._build_executor.reserve():
+            return ('503 Service Unavailable', [('Retry-After', '1')], b'')
+        try:
+            with using_context(get_context(), builder=delayed_builder):
+                validate_path_strings(req_body)
+                artifact = build(Artifact, req_body)
+        finally:
+            if work:
+                self._build_executor.submit(*work)
+            else:
+                self._build_executor.release()
 
         uri = f'{self._prefix}/{artifact._path_.relative_to(self._root)}'
         headers = [('Content-Length', '0'), ('Location', uri)]
-        return ('201 Created', headers, b'', *work)
+        return ('201 Created', headers, b'')
 
     def _handle_delete_request(self, env: dict) -> tuple:
         with TemporaryDirectory() as dst:
@@ -263,20 +693,104 @@ class ArtifactAPI:
                 b'')
 
     def _get_path(self, env: dict) -> Path:
-        path = env['PATH_INFO'][len(self._prefix)+1:]
-        path = (self._root / path).resolve()
-        path = DirIndex(path.parent).get_entry_path(path.stem)
-        if path is None:
+        return self._resolve(env['PATH_INFO'][len(self._prefix)+1:])
+
+    def _resolve(self, path_str: str) -> Path:
+        # Resolve the parent directory via its (cached) `DirIndex`, rather than
+        # calling `Path.resolve`, and only dereference the entry itself if it's
+        # a symbolic link.
+        path = self._root / path_str
+        if path.name == '..':
+            path = DirIndex(path).path
+        entry_path = DirIndex(path.parent).get_entry_path(path.stem)
+        if entry_path is None:
             raise FileNotFoundError()
-        elif self._root not in (*path.parents, path):
+        if entry_path.is_symlink():
+            entry_path = DirIndex(entry_path).path
+        if self._root not in (*entry_path.parents, entry_path):
             raise PermissionError()
         else:
-            return path
+            return entry_path
 
 
-def get_file_timestamp(path: Path) -> float:
-    mtime = path.stat().st_mtime
-    return min(mtime, datetime.now().timestamp() - 2)
+class BuildExecutor:
+    '''
+    A thread pool for building artifacts, with a bounded queue.
+
+    A slot must be reserved (via `reserve`) before a build is submitted, and
+    is released when the build finishes.
+    '''
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 64) -> None:
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.n_queued = 0
+        self.n_running = 0
+        self._pool = ThreadPoolExecutor(max_workers, 'artisan-build')
+        self._slots = BoundedSemaphore(max_workers + max_queue_size)
+        self._lock = Lock()
+
+    def reserve(self) -> bool:
+        '''
+        Reserve a slot for a build, and return whether one was available.
+        '''
+        return self._slots.acquire(blocking=False)
+
+    def release(self) -> None:
+        '''
+        Release a reserved slot without submitting a build.
+        '''
+        self._slots.release()
+
+    def submit(self, *work_items: Callable[[], None]) -> None:
+        '''
+        Call the given functions, in order, in a worker thread, in a copy of
+        the current context, then release the reserved slot.
+        '''
+        with self._lock:
+            self.n_queued += 1
+        self._pool.submit(copy_context().run, self._run, work_items)
+
+    def get_status(self) -> Dict[str, int]:
+        '''
+        Return the pool's size and limits, and the number of queued and running
+        builds.
+        '''
+        with self._lock:
+            return dict(
+                queued = self.n_queued, running = self.n_running,
+                max_workers = self.max_workers,
+                max_queue_size = self.max_queue_size)
+
+    def _run(self, work_items: Tuple[Callable[[], None], ...]) -> None:
+        with self._lock:
+            self.n_queued -= 1
+            self.n_running += 1
+        try:
+            for work_item in work_items:
+                work_item()
+        finally:
+            with self._lock:
+                self.n_running -= 1
+            self._slots.release()
+
+
+LISTING_PAGE_SIZE = 100; \
+    '''
+    The default number of artifacts in a page of an artifact listing.
+    '''
+
+
+BATCH_INLINE_SIZE = 2**20; \
+    '''
+    The maximum size, in bytes, of a field file whose contents are included in
+    a `POST /artifacts/_batch/get` response. Larger fields are represented by
+    their URIs, with versions, so the responses to requests for them can be
+    cached.
+    '''
+
+
+def get_file_timestamp(stat: stat_result) -> float:
+    return min(stat.st_mtime, datetime.now().timestamp() - 2)
 
 
 def get_dir_timestamp(path: Path) -> float:
@@ -297,24 +811,291 @@ def get_last_request_time(env: dict) -> float:
         return 0.0
 
 
+def get_file_etag(stat: stat_result) -> str:
+    '''
+    Return a strong entity tag for a file, derived from its inode number, size,
+    and modification time.
+    '''
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def get_slice_etag(etag: str, index_str: str) -> str:
+    '''
+    Return a strong entity tag for a slice of an array file, given the file's
+    entity tag and the slice's index string.
+    '''
+    index_hash = hashlib.sha1(index_str.encode()).hexdigest()
+    return f'{etag[:-1]}-{index_hash[:16]}"'
+
+
+def get_dir_etag(path: Path) -> str:
+    '''
+    Return a strong entity tag for a directory's shallow representation,
+    derived from its `DirIndex` state and its `_meta_.json` file. Lease files
+    (see `LEASE_FILE_NAME`) are ignored.
+    '''
+    n_entries = sum(
+        1 for name in DirIndex(path).get_entry_names()
+        if name != LEASE_FILE_NAME)
+    stat = path.stat()
+    try:
+        meta_tag = get_file_etag((path / '_meta_.json').stat())[1:-1]
+    except FileNotFoundError:
+        meta_tag = '0'
+    return f'"{stat.st_ino:x}-{n_entries:x}-{stat.st_mtime_ns:x}-{meta_tag}"'
+
+
+def get_cached_etag(env: dict, etag: str, timestamp: float) -> Optional[str]:
+    '''
+    Return the entity tag to send in a "304 Not Modified" response, if a
+    request's "If-None-Match" header (or, if it is absent, its
+    "If-Modified-Since" header) indicates that the client's cached copy of a
+    resource is up-to-date, or `None` otherwise.
+
+    The entity tag returned is that of the matching cached variant (e.g. the
+    gzip-compressed variant, tagged by `compress_response`), so the client
+    keeps revalidating the representation it actually has.
+    '''
+    if 'HTTP_IF_NONE_MATCH' not in env:
+        return etag if get_last_request_time(env) >= timestamp else None
+    for cached_etag in env['HTTP_IF_NONE_MATCH'].split(','):
+        cached_etag = cached_etag.strip()
+        if cached_etag == '*':
+            return etag
+        elif cached_etag.startswith('W/'):
+            cached_etag = cached_etag[2:]
+        if strip_encoding(cached_etag) == etag:
+            return cached_etag
+    return None
+
+
+def get_cache_policy(env: dict, path: Path, etag: str) -> str:
+    '''
+    Return a "Cache-Control" header value for a file, given its entity tag.
+
+    Fields of artifacts that were built successfully are not modified, so they
+    can be cached indefinitely when the request URL identifies the file's
+    version, via a "v" query parameter equal to its entity tag (without
+    quotes). Other responses must be revalidated using the entity tag, since a
+    path can be reused for a different file (e.g. after an artifact is deleted
+    and rebuilt).
+    '''
+    version = parse_qs(env.get('QUERY_STRING', '')).get('v', [None])[-1]
+    if version != etag[1:-1]:
+        return 'no-cache'
+    meta = DirIndex(path.parent).get_meta()
+    succeeded = (
+        isinstance(meta, dict)
+        and any(e.get('type') == 'Success' for e in meta.get('events', [])))
+    return ('public, max-age=31536000, immutable'
+            if succeeded and path.stem != '_meta_' else 'no-cache')
+
+
 def get_content_type(path: Path) -> str:
     return ('application/cbor' if path.suffix == '.cbor' else
             mimetypes.types_map.get(path.suffix, 'application/octet-stream'))
 
 
-def read_file(path: Path, start: int, end: int) -> bytes:
+FILE_CHUNK_SIZE = 2**16; \
+    '''
+    The maximum number of bytes read from a file per response-body chunk.
+    '''
+
+
+class FileRange:
+    '''
+    A readable, iterable view of a byte range within a file.
+
+    The first 128 bytes of the file (which may contain a header that is
+    rewritten in place while the file is being extended) are read under a
+    shared lock when the view is created, so memory use is bounded by
+    `FILE_CHUNK_SIZE`, regardless of the size of the range. If `end` is `None`,
+    the range extends to the end of the file as of when the header was read.
+    '''
+    def __init__(self, path: Path, start: int, end: Optional[int] = None
+                 ) -> None:
+        self._file = cast(BufferedReader, open(path, 'rb'))
+        self._header = b''
+        if start < 128:
+            if locking_is_supported: lockf(self._file, LOCK_SH, 128)
+            self._header = self._file.read(128)
+            if locking_is_supported: lockf(self._file, LOCK_UN)
+        if end is None:
+            end = fstat(self._file.fileno()).st_size
+        self._header = self._header[start:end]
+        self._pos = start + len(self._header)
+        self._end = end
+        self._file.seek(self._pos)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.read(FILE_CHUNK_SIZE)
+            if chunk == b'':
+                return
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        if self._header != b'':
+            chunk, self._header = self._header, b''
+            return chunk
+        size = self._end - self._pos if size < 0 else size
+        chunk = self._file.read(min(size, self._end - self._pos))
+        self._pos += len(chunk)
+        return chunk
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_file_range(path: Path) -> bytes:
+    '''
+    Return a file's contents, reading its header under a shared lock, via
+    `FileRange`.
+    '''
+    file_range = FileRange(path, 0)
+    try:
+        return file_range.read()
+    finally:
+        file_range.close()
+
+
+def read_cbor_item(path: Path) -> bytes:
+    '''
+    Return the encoding of the data item stored in a CBOR file, excluding any
+    list items or array elements appended after its header was read.
+    '''
+    content = read_file_range(path)
+    stream = BytesIO(content)
+    try:
+        cbor2.CBORDecoder(stream).decode()
+    except cbor2.CBORDecodeError:
+        return content
+    return content[:stream.tell()]
+
+
+def is_string_list(obj: object) -> bool:
+    '''
+    Return whether an object is a list of strings.
+    '''
+    return isinstance(obj, list) and all(isinstance(v, str) for v in obj)
+
+
+MAX_BYTE_RANGES = 16; \
+    '''
+    The maximum number of ranges in a "Range" header. Headers with more ranges
+    are ignored, so the whole file is sent.
+    '''
+
+
+def parse_byte_ranges(header: str, size: int
+                      ) -> Optional[List[Tuple[int, int]]]:
+    '''
+    Parse the value of a "Range" header.
+
+    Return a sorted list of `(start, end)` pairs, with exclusive end positions,
+    for the satisfiable ranges, with overlapping and adjacent ranges merged, or
+    `None` if the header is absent, malformed, or lists more than
+    `MAX_BYTE_RANGES` ranges (in which case it should be ignored).
+    '''
+    unit, _, range_specs = header.partition('=')
+    if unit.strip() != 'bytes' or range_specs.count(',') >= MAX_BYTE_RANGES:
+        return None
+
+    ranges: List[Tuple[int, int]] = []
+    for range_spec in range_specs.split(','):
+        match = re.fullmatch(r'\s*(\d*)-(\d*)\s*', range_spec)
+        if match is None or match.group(1) == match.group(2) == '':
+            return None
+        elif match.group(1) == '':
+            start, end = max(size - int(match.group(2)), 0), size
+        elif match.group(2) == '':
+            start, end = int(match.group(1)), size
+        elif int(match.group(2)) >= int(match.group(1)):
+            start, end = int(match.group(1)), min(int(match.group(2))+1, size)
+        else:
+            return None
+        if start < end:
+            ranges.append((start, end))
+
+    merged_ranges: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged_ranges and start <= merged_ranges[-1][1]:
+            prev_start, prev_end = merged_ranges[-1]
+            merged_ranges[-1] = (prev_start, max(prev_end, end))
+        else:
+            merged_ranges.append((start, end))
+    return merged_ranges
+
+
+def iter_byteranges(path: Path, parts: List[Tuple[int, int, bytes]],
+                    trailer: bytes) -> Iterator[bytes]:
+    '''
+    Yield the chunks of a "multipart/byteranges" response body, given a list of
+    `(start, end, part_header)` triples.
+    '''
+    for start, end, part_header in parts:
+        yield part_header
+        part = FileRange(path, start, end)
+        try:
+            yield from part
+        finally:
+            part.close()
+    yield trailer
+
+
+def read_array_slice(path: Path, index_str: str
+                     ) -> Tuple[int, Iterator[bytes]]:
     '''
-    Read a file, locking the first 128 bytes while reading them.
+    Return the size of a CBOR file encoding a region of the array stored in a
+    CBOR file, and an iterator over that file's contents.
+
+    `index_str` is a comma-separated list of integers and slices, in Python's
+    syntax (e.g. "100:200,::4"). The array is memory-mapped, so only the
+    requested region is read. A `ValueError` is raised if the file does not
+    contain an array or the index is invalid.
     '''
-    buf = bytearray(min(end, path.stat().st_size) - start)
+    try:
+        index = tuple(
+            slice(*(int(s) if s.strip() else None for s in elem.split(':')))
+            if ':' in elem else int(elem)
+            for elem in index_str.split(','))
+    except TypeError:
+        raise ValueError(f'"{index_str}" is not a valid index.')
+
     with cast(BufferedReader, open(path, 'rb')) as f:
         if locking_is_supported: lockf(f, LOCK_SH, 128)
-        header = cast(bytes, f.read(128))
+        header = f.read(128)
         if locking_is_supported: lockf(f, LOCK_UN)
-        f.seek(start)
-        f.readinto(buf)
-    buf[:len(header[start:])] = header[start:]
-    return bytes(buf)
+    try:
+        shape, dtype = parse_ndarray(header)
+    except IndexError:
+        raise ValueError(f'`{path}` does not contain an array.')
+
+    try:
+        region = (
+            np.memmap(path, dtype, 'r', data_offset(len(shape)), shape)
+            if np.prod(shape) > 0 else np.empty(shape, dtype))[index]
+    except (IndexError, TypeError):
+        raise ValueError(f'"{index_str}" is not a valid index.')
+    region_header = ndarray_header(region.shape, region.dtype)
+    return len(region_header) + region.nbytes, iter_array(region_header, region)
+
+
+def iter_array(header: bytes, array: np.ndarray) -> Iterator[bytes]:
+    '''
+    Yield a header, followed by an array's data, in row-major order, in chunks
+    of approximately `FILE_CHUNK_SIZE` bytes.
+    '''
+    yield header
+    if array.ndim == 0 or array.size == 0:
+        yield np.ascontiguousarray(array).tobytes()
+    else:
+        step = max(1, FILE_CHUNK_SIZE * len(array) // array.nbytes)
+        for i in range(0, len(array), step):
+            yield np.ascontiguousarray(array[i:i+step]).tobytes()
 
 
 def validate_path_strings(obj: object) -> None:
@@ -343,6 +1124,566 @@ def validate_path_strings(obj: object) -> None:
 
 
 
+#-- Response compression -------------------------------------------------------
+
+COMPRESSION_THRESHOLD = 1024; \
+    '''
+    The minimum size, in bytes, of a response body to be compressed.
+    '''
+
+COMPRESSION_CACHE_SIZE = 2**26; \
+    '''
+    The maximum total size, in bytes, of the compressed versions of immutable
+    responses kept in memory to serve subsequent requests.
+    '''
+
+COMPRESSIBLE_CONTENT_TYPES = {
+    'application/cbor', 'application/json', 'application/schema+json',
+    'application/javascript', 'image/svg+xml', 'text/css', 'text/csv',
+    'text/html', 'text/plain'}; \
+    '''
+    The content types of responses that can be compressed.
+    '''
+
+
+class BrotliCompressor:
+    '''
+    A `brotli.Compressor` with the interface of a `zlib` compression object.
+    '''
+    def __init__(self) -> None:
+        self._compressor = brotli.Compressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+compressors: Dict[str, Callable[[], Any]] = {
+    **({'br': BrotliCompressor} if brotli is not None else {}),
+    **({'zstd': lambda: zstandard.ZstdCompressor().compressobj()}
+       if zstandard is not None else {}),
+    'gzip': lambda: zlib.compressobj(6, zlib.DEFLATED, 31),
+    'deflate': lambda: zlib.compressobj(6)}; \
+    '''
+    Compression-object factories for each supported content coding, in order
+    of preference.
+    '''
+
+compressed_bodies: OrderedDict[Tuple[str, str], bytes] = OrderedDict(); \
+    '''
+    Compressed immutable response bodies, keyed by entity tag and content
+    coding, in least-recently-used-first order.
+    '''
+
+compressed_bodies_lock = Lock(); \
+    '''
+    A lock guarding `compressed_bodies`.
+    '''
+
+
+def compress_response(env: dict, status: str, headers: list,
+                      body: Union[bytes, Iterable[bytes]]) -> tuple:
+    '''
+    Return a `(status, headers, body)` triple with the response body
+    compressed, if the client accepts a supported content coding and the
+    response is large enough to benefit from it.
+
+    The compressed versions of immutable responses with entity tags are
+    cached, so repeated downloads don't require recompression. Responses to
+    `HEAD` requests are given the headers of the corresponding `GET` responses,
+    including a "Content-Length" header if the compressed body is cached.
+    '''
+    header_dict = dict(headers)
+    content_type = header_dict.get('Content-Type', '').split(';')[0]
+    content_length = int(
+        header_dict.get('Content-Length', COMPRESSION_THRESHOLD))
+    if (content_type not in COMPRESSIBLE_CONTENT_TYPES
+        or 'Content-Encoding' in header_dict):
+        return status, headers, body
+
+    headers = [*headers, ('Vary', 'Accept-Encoding')]
+    encoding = choose_encoding(env.get('HTTP_ACCEPT_ENCODING', ''))
+    if (env['REQUEST_METHOD'] not in ('GET', 'HEAD', 'POST')
+        or not status.startswith('200')
+        or content_length < COMPRESSION_THRESHOLD
+        or encoding is None):
+        return status, headers, body
+
+    etag = header_dict.get('ETag')
+    headers = [
+        (k, f'{v[:-1]}-{encoding}"' if k == 'ETag' else v)
+        for k, v in headers if k != 'Content-Length']
+    headers.append(('Content-Encoding', encoding))
+
+    is_head = env['REQUEST_METHOD'] == 'HEAD'
+    if etag is None or 'immutable' not in header_dict.get('Cache-Control', ''):
+        return (status, headers,
+                body if is_head else iter_compressed(body, encoding))
+
+    with compressed_bodies_lock:
+        compressed_body = compressed_bodies.get((etag, encoding))
+        if compressed_body is not None:
+            compressed_bodies.move_to_end((etag, encoding))
+    if compressed_body is None:
+        if is_head:
+            return status, headers, body
+        if content_length > COMPRESSION_CACHE_SIZE // 4:
+            return status, headers, iter_compressed(body, encoding)
+        compressed_body = b''.join(iter_compressed(body, encoding))
+        with compressed_bodies_lock:
+            compressed_bodies[etag, encoding] = compressed_body
+            total_size = sum(map(len, compressed_bodies.values()))
+            while total_size > COMPRESSION_CACHE_SIZE:
+                total_size -= len(compressed_bodies.popitem(last=False)[1])
+    elif hasattr(body, 'close'):
+        body.close() # type: ignore
+    headers.append(('Content-Length', str(len(compressed_body))))
+    return status, headers, body if is_head else compressed_body
+
+
+def get_vary_headers(content_type: str) -> List[Tuple[str, str]]:
+    '''
+    Return the "Vary" header `compress_response` adds to responses with a given
+    content type, for "304 Not Modified" responses, which have no content type.
+    '''
+    return ([('Vary', 'Accept-Encoding')]
+            if content_type in COMPRESSIBLE_CONTENT_TYPES else [])
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    '''
+    Return the preferred supported content coding permitted by an
+    "Accept-Encoding" header, or `None` if no supported coding is permitted.
+    '''
+    q_values: Dict[str, float] = {}
+    for elem in accept_encoding.split(','):
+        coding, *params = [s.strip() for s in elem.split(';')]
+        q_params = [p[2:] for p in params if p.startswith('q=')]
+        try:
+            q_values[coding.lower()] = float(q_params[0]) if q_params else 1.0
+        except ValueError:
+            continue
+    ranked_codings = sorted(
+        (coding for coding in compressors
+         if q_values.get(coding, q_values.get('*', 0.0)) > 0),
+        key = lambda c: -q_values.get(c, q_values.get('*', 0.0)))
+    return ranked_codings[0] if ranked_codings else None
+
+
+def iter_compressed(body: Union[bytes, Iterable[bytes]], encoding: str
+                    ) -> Iterator[bytes]:
+    '''
+    Yield the chunks of a response body, compressed using the given content
+    coding.
+    '''
+    chunks = [body] if isinstance(body, bytes) else body
+    compressor = compressors[encoding]()
+    try:
+        for chunk in chunks:
+            compressed_chunk = compressor.compress(chunk)
+            if compressed_chunk:
+                yield compressed_chunk
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close() # type: ignore
+
+
+def strip_encoding(etag: str) -> str:
+    '''
+    Return an entity tag with any content-coding suffix added by
+    `compress_response` removed.
+    '''
+    for encoding in compressors:
+        if etag.endswith(f'-{encoding}"'):
+            return etag[:-len(encoding)-2] + '"'
+    return etag
+
+
+
+#-- Event-request-handling -----------------------------------------------------
+
+EVENT_POLL_INTERVAL = 0.25; \
+    '''
+    The time, in seconds, between checks for changes to a watched directory.
+    '''
+
+EVENT_KEEPALIVE_INTERVAL = 15.0; \
+    '''
+    The maximum time, in seconds, between messages sent to event-stream clients.
+    '''
+
+EVENT_STREAM_DURATION = 300.0; \
+    '''
+    The default and maximum lifetime, in seconds, of an event stream. Clients
+    reconnect automatically when a stream ends.
+    '''
+
+EVENT_HISTORY_SIZE = 64; \
+    '''
+    The number of recent batches of event messages a `DirWatcher` keeps for
+    streams that haven't sent them yet.
+    '''
+
+
+class EventAPI:
+    '''
+    An HTTP responder for artifact-change notification requests.
+
+    Supported routes:
+        `GET /events?path={path}[&timeout={seconds}]`: Respond with a stream of
+            server-sent events describing changes to the entries of the
+            directory at the given path, relative to the root directory. Each
+            event has the type "added", "removed", or "changed", and a JSON
+            object with a "path" field (the entry's `/artifacts` URI) as its
+            data. Entries change when files are written to, or when an
+            artifact's metadata is updated (*e.g.* when an event is logged).
+            The stream ends after `timeout` seconds (at most, and by default,
+            `EVENT_STREAM_DURATION`).
+
+    Analogous `HEAD` and `OPTIONS` requests are also supported.
+    '''
+    def __init__(self, prefix: str = '/events') -> None:
+        self._prefix = prefix
+        self._root = get_context().root.resolve()
+
+    def __call__(self, env: dict, responder: Callable) -> Iterable[bytes]:
+        method = env['REQUEST_METHOD']
+        handler = (
+            self._handle_options_request if method == 'OPTIONS' else
+            self._handle_head_request if method == 'HEAD' else
+            self._handle_get_request if method == 'GET' else
+            self._handle_405_error)
+        static_headers = [
+            ('Access-Control-Allow-Origin', '*'),
+            ('Cache-Control', 'no-cache')]
+        try:
+            status, dynamic_headers, body = handler(env)
+        except ValueError:
+            responder('400 Bad Request', static_headers)
+            return iter(())
+        except PermissionError:
+            responder('403 Forbidden', static_headers)
+            return iter(())
+        except OSError:
+            responder('404 Not Found', static_headers)
+            return iter(())
+        responder(status, static_headers + dynamic_headers)
+        return [body] if isinstance(body, bytes) else body
+
+    def _handle_options_request(self, env: dict) -> tuple:
+        return ('204 No Content',
+                [('Access-Control-Allow-Methods', '*'),
+                 ('Access-Control-Allow-Headers', '*'),
+                 ('Allow', 'OPTIONS, HEAD, GET')],
+                b'')
+
+    def _handle_head_request(self, env: dict) -> tuple:
+        self._get_path(env)
+        return ('200 OK', [('Content-Type', 'text/event-stream')], b'')
+
+    def _handle_get_request(self, env: dict) -> tuple:
+        query = parse_qs(env.get('QUERY_STRING', ''))
+        path = self._get_path(env)
+        timeout = min(
+            float(query.get('timeout', [EVENT_STREAM_DURATION])[-1]),
+            EVENT_STREAM_DURATION)
+        rel_path = path.relative_to(self._root).as_posix()
+        uri = '/artifacts' if rel_path == '.' else f'/artifacts/{rel_path}'
+        return ('200 OK',
+                [('Content-Type', 'text/event-stream')],
+                DirEventStream(path, uri, timeout))
+
+    def _handle_405_error(self, env: dict) -> tuple:
+        return ('405 Method Not Allowed',
+                [('Allow', 'OPTIONS, HEAD, GET')],
+                b'')
+
+    def _get_path(self, env: dict) -> Path:
+        query = parse_qs(env.get('QUERY_STRING', ''))
+        path_str = query.get('path', [''])[-1].lstrip('/')
+        path = (self._root / path_str).resolve()
+        if self._root not in (*path.parents, path):
+            raise PermissionError()
+        elif not path.is_dir():
+            raise FileNotFoundError()
+        else:
+            return path
+
+
+class DirEventStream:
+    '''
+    A stream of server-sent events describing changes to a directory's entries,
+    ending after `timeout` seconds or when the directory is removed.
+
+    The stream can be iterated synchronously, blocking between events, or
+    asynchronously, without blocking the event loop or occupying an executor
+    thread. Streams watching the same directory share a `DirWatcher`, so the
+    directory is polled once per interval, regardless of the number of clients.
+    '''
+    def __init__(self, path: Path, uri: str, timeout: float) -> None:
+        self._path = path
+        self._uri = uri
+        self._timeout = timeout
+
+    def __iter__(self) -> Iterator[bytes]:
+        deadline = time.monotonic() + self._timeout
+        last_message_time = time.monotonic()
+        try:
+            watcher = acquire_dir_watcher(self._path, self._uri)
+        except FileNotFoundError:
+            yield format_event('removed', self._uri)
+            return
+        try:
+            version = watcher.version
+            yield b'retry: 1000\n\n'
+            while time.monotonic() < deadline:
+                version, data, removed = watcher.wait(version, max(0.0, min(
+                    deadline - time.monotonic(),
+                    last_message_time + EVENT_KEEPALIVE_INTERVAL
+                    - time.monotonic())))
+                data = data or self._get_keepalive(last_message_time)
+                if data:
+                    last_message_time = time.monotonic()
+                    yield data
+                if removed:
+                    return
+        finally:
+            release_dir_watcher(watcher)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        deadline = time.monotonic() + self._timeout
+        last_message_time = time.monotonic()
+        try:
+            watcher = acquire_dir_watcher(self._path, self._uri)
+        except FileNotFoundError:
+            yield format_event('removed', self._uri)
+            return
+        try:
+            version = watcher.version
+            yield b'retry: 1000\n\n'
+            while time.monotonic() < deadline:
+                await asyncio.sleep(max(0.0, min(
+                    EVENT_POLL_INTERVAL, deadline - time.monotonic())))
+                version, data, removed = watcher.get_messages(version)
+                data = data or self._get_keepalive(last_message_time)
+                if data:
+                    last_message_time = time.monotonic()
+                    yield data
+                if removed:
+                    return
+        finally:
+            release_dir_watcher(watcher)
+
+    def _get_keepalive(self, last_message_time: float) -> bytes:
+        elapsed = time.monotonic() - last_message_time
+        is_due = elapsed >= EVENT_KEEPALIVE_INTERVAL
+        return b': keepalive\n\n' if is_due else b''
+
+
+class DirWatcher:
+    '''
+    A background thread that polls a directory's entries for changes, shared by
+    every event stream watching the directory.
+
+    Each batch of event messages published by the watcher increments its
+    `version`, and the most recent `EVENT_HISTORY_SIZE` batches are kept, so
+    each stream can send the batches published since it last checked. The
+    thread stops when no streams are using the watcher, or when the directory
+    is removed.
+    '''
+    def __init__(self, path: Path, uri: str) -> None:
+        self.path = path
+        self.uri = uri
+        self.version = 0
+        self.removed = False
+        self.n_streams = 0
+        self._signature = get_dir_signature(path)
+        self._batches: Deque[bytes] = deque(maxlen=EVENT_HISTORY_SIZE)
+        self._changed = Condition()
+        Thread(target=self._run, daemon=True).start()
+
+    def get_messages(self, version: int) -> Tuple[int, bytes, bool]:
+        '''
+        Return the watcher's current version, the messages published since
+        `version`, and whether the directory has been removed.
+        '''
+        with self._changed:
+            n_new = min(self.version - version, len(self._batches))
+            batches = list(self._batches)[len(self._batches)-n_new:]
+            return self.version, b''.join(batches), self.removed
+
+    def wait(self, version: int, timeout: float) -> Tuple[int, bytes, bool]:
+        '''
+        Wait until messages are published after `version`, or until `timeout`
+        seconds have elapsed, then return the result of `get_messages`.
+        '''
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.get_messages(version)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(EVENT_POLL_INTERVAL)
+            with dir_watchers_lock:
+                if self.n_streams == 0:
+                    dir_watchers.pop((self.path, self.uri), None)
+                    return
+            try:
+                signature = get_dir_signature(self.path)
+            except FileNotFoundError:
+                with dir_watchers_lock:
+                    dir_watchers.pop((self.path, self.uri), None)
+                self._publish(format_event('removed', self.uri), removed=True)
+                return
+
+            prev_signature, self._signature = self._signature, signature
+            messages = [
+                *(format_event('added', f'{self.uri}/{name}')
+                  for name in signature.keys() - prev_signature.keys()),
+                *(format_event('removed', f'{self.uri}/{name}')
+                  for name in prev_signature.keys() - signature.keys()),
+                *(format_event('changed', f'{self.uri}/{name}')
+                  for name in signature.keys() & prev_signature.keys()
+                  if signature[name] != prev_signature[name])]
+            if messages:
+                self._publish(b''.join(messages))
+
+    def _publish(self, data: bytes, removed: bool = False) -> None:
+        with self._changed:
+            self._batches.append(data)
+            self.version += 1
+            self.removed = removed
+            self._changed.notify_all()
+
+
+dir_watchers: Dict[Tuple[Path, str], DirWatcher] = {}; \
+    '''
+    The active `DirWatcher`s, keyed by path and URI.
+    '''
+
+dir_watchers_lock = Lock(); \
+    '''
+    A lock guarding `dir_watchers` and their stream counts.
+    '''
+
+
+def acquire_dir_watcher(path: Path, uri: str) -> DirWatcher:
+    '''
+    Return the `DirWatcher` for a directory, starting one if necessary, and
+    register a stream as using it.
+    '''
+    with dir_watchers_lock:
+        watcher = dir_watchers.get((path, uri))
+        if watcher is None:
+            watcher = dir_watchers[path, uri] = DirWatcher(path, uri)
+        watcher.n_streams += 1
+        return watcher
+
+
+def release_dir_watcher(watcher: DirWatcher) -> None:
+    '''
+    Unregister a stream from a `DirWatcher`.
+    '''
+    with dir_watchers_lock:
+        watcher.n_streams -= 1
+
+
+def get_dir_signature(path: Path) -> Dict[str, tuple]:
+    '''
+    Return a mapping from the entries in a directory (by stem) to values that
+    change when those entries are modified.
+
+    Files are represented by their size and modification time, and
+    subdirectories are represented by their `_meta_.json` file's size and
+    modification time, which change when build events are logged. Lease files
+    (see `LEASE_FILE_NAME`), which builders touch periodically, are ignored.
+    '''
+    signature: Dict[str, tuple] = {}
+    with scandir(path) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or entry.name == LEASE_FILE_NAME:
+                continue
+            try:
+                stat = (
+                    Path(entry.path, '_meta_.json').stat()
+                    if entry.is_dir() else entry.stat())
+                signature[get_stem(entry.name)] = (
+                    stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                signature[get_stem(entry.name)] = ()
+    return signature
+
+
+def format_event(type_: str, uri: str) -> bytes:
+    '''
+    Return a server-sent event message.
+    '''
+    data = json.dumps({'path': uri})
+    return f'event: {type_}\ndata: {data}\n\n'.encode('utf8')
+
+
+
+#-- Status-request-handling ----------------------------------------------------
+
+class StatusAPI:
+    '''
+    An HTTP responder for server status requests.
+
+    Supported routes:
+        `GET /status`: Respond with a JSON object with a "builds" field
+            containing the number of queued and running builds ("queued" and
+            "running") and the build pool's limits ("max_workers" and
+            "max_queue_size").
+
+    Analogous `HEAD` and `OPTIONS` requests are also supported.
+    '''
+    def __init__(self, build_executor: BuildExecutor) -> None:
+        self._build_executor = build_executor
+
+    def __call__(self, env: dict, responder: Callable) -> Iterator[bytes]:
+        method = env['REQUEST_METHOD']
+        handler = (
+            self._handle_options_request if method == 'OPTIONS' else
+            self._handle_head_request if method == 'HEAD' else
+            self._handle_get_request if method == 'GET' else
+            self._handle_405_error)
+        static_headers = [
+            ('Access-Control-Allow-Origin', '*'),
+            ('Cache-Control', 'no-cache')]
+        status, dynamic_headers, body = handler(env)
+        responder(status, static_headers + dynamic_headers)
+        yield body
+
+    def _handle_options_request(self, env: dict) -> tuple:
+        return ('204 No Content',
+                [('Access-Control-Allow-Methods', '*'),
+                 ('Access-Control-Allow-Headers', '*'),
+                 ('Allow', 'OPTIONS, HEAD, GET')],
+                b'')
+
+    def _handle_head_request(self, env: dict) -> tuple:
+        return (*self._handle_get_request(env)[:2], b'')
+
+    def _handle_get_request(self, env: dict) -> tuple:
+        if env['PATH_INFO'].rstrip('/') != '/status':
+            return ('404 Not Found', [], b'')
+        status = {'builds': self._build_executor.get_status()}
+        body = json.dumps(status).encode('utf8')
+        return ('200 OK',
+                [('Content-Type', 'application/json'),
+                 ('Content-Length', str(len(body)))],
+                body)
+
+    def _handle_405_error(self, env: dict) -> tuple:
+        return ('405 Method Not Allowed',
+                [('Allow', 'OPTIONS, HEAD, GET')],
+                b'')
+
+
+
 #-- Schema-request-handling ----------------------------------------------------
 
 class SchemaAPI:
@@ -354,14 +1695,15 @@ class SchemaAPI:
         `GET /schemas/spec-list`: Returns `get_spec_list_schema()`.
         `GET /schemas/spec-dict`: Returns `get_spec_dict_schema()`.
 
+    Schemas are encoded as JSON, or as CBOR if the request's "Accept" header
+    includes "application/cbor". Encoded schemas and their entity tags are
+    computed once per root directory and scope.
+
     Analogous `HEAD` and `OPTIONS` requests are also supported.
     '''
     def __init__(self) -> None:
-        encode = lambda x: json.dumps(x, indent=2).encode('utf8')
-        self._schemas = {
-            '/schemas/spec': encode(get_spec_schema()),
-            '/schemas/spec-list': encode(get_spec_list_schema()),
-            '/schemas/spec-dict': encode(get_spec_dict_schema())}
+        self._encoded_schemas: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = Lock()
 
     def __call__(self, env: dict, responder: Callable) -> Iterator[bytes]:
         method = env['REQUEST_METHOD']
@@ -373,9 +1715,10 @@ class SchemaAPI:
         static_headers = [
             ('Access-Control-Allow-Origin', '*'),
             ('Cache-Control', 'no-cache')]
-        status, dynamic_headers, body = handler(env)
+        status, dynamic_headers, body = compress_response(
+            env, *handler(env))
         responder(status, static_headers + dynamic_headers)
-        yield body
+        yield from ([body] if isinstance(body, bytes) else body)
 
     def _handle_options_request(self, env: dict) -> tuple:
         return ('204 No Content',
@@ -388,20 +1731,62 @@ class SchemaAPI:
         return (*self._handle_get_request(env)[:2], b'')
 
     def _handle_get_request(self, env: dict) -> tuple:
+        media_type = (
+            'application/cbor'
+            if 'application/cbor' in env.get('HTTP_ACCEPT', '')
+            else 'application/schema+json')
         try:
-            schema = self._schemas[env['PATH_INFO']]
-            return ('200 OK',
-                    [('Content-Type', 'application/schema+json'),
-                     ('Content-Length', str(len(schema)))],
-                    schema)
+            schema_name = env['PATH_INFO'][len('/schemas/'):]
+            body, etag = self._get_encoded_schemas()[schema_name, media_type]
         except KeyError:
             return ('404 Not Found', [], b'')
 
+        headers = [('ETag', etag), ('Vary', 'Accept')]
+        cached_etag = get_cached_etag(env, etag, float('inf'))
+        if cached_etag is not None:
+            return ('304 Not Modified',
+                    [('ETag', cached_etag), ('Vary', 'Accept'),
+                     *get_vary_headers(media_type)],
+                    b'')
+        else:
+            return ('200 OK',
+                    [*headers,
+                     ('Content-Type', media_type),
+                     ('Content-Length', str(len(body)))],
+                    body)
+
     def _handle_405_error(self, env: dict) -> tuple:
         return ('405 Method Not Allowed',
                 [('Allow', 'OPTIONS, HEAD, GET')],
                 b'')
 
+    def _get_encoded_schemas(self) -> dict:
+        '''
+        Return a mapping from `(schema_name, media_type)` pairs to `(body,
+        etag)` pairs, for the active root directory and scope.
+        '''
+        key, schemas = get_cached_schemas()
+        with self._lock:
+            encoded_schemas = self._encoded_schemas.get(key)
+            if encoded_schemas is not None:
+                self._encoded_schemas.move_to_end(key)
+                return encoded_schemas
+
+        encoded_schemas = {}
+        for name, schema in schemas.items():
+            for media_type, body in [
+                    ('application/schema+json',
+                     json.dumps(schema, indent=2).encode('utf8')),
+                    ('application/cbor', cbor2.dumps(schema))]:
+                etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+                encoded_schemas[name, media_type] = (body, etag)
+
+        with self._lock:
+            self._encoded_schemas[key] = encoded_schemas
+            while len(self._encoded_schemas) > SCHEMA_CACHE_SIZE:
+                self._encoded_schemas.popitem(last=False)
+        return encoded_schemas
+
 
 
 #-- UI-request-handling --------------------------------------------------------
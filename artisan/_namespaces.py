@@ -4,20 +4,30 @@ General-purpose namespaces and JSON compatibility.
 Exported definitions:
     Namespace (`SimpleNamespace` subclass):
         A `SimpleNamespace` that prints readably.
+    Record (class):
+        A compact, namespace-like record with a fixed set of fields.
 
 Internal definitions:
+    get_record_type (function):
+        Return the `Record` subclass with the given fields.
+    get_node_kinds (function):
+        Return the ways instances of a type are converted.
     dictify (function):
         Deeply convert namespaces in an object to dictionaries.
     namespacify (function):
         Deeply convert mappings in an object to namespaces.
 '''
 
+from functools import lru_cache
 from os import PathLike
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Any, Callable, List, Mapping, Optional, Sequence
+from typing import (
+    Any, Callable, Dict, Iterable, List, Mapping, MutableMapping,
+    Optional, Sequence, Set, Tuple, Union)
+from weakref import WeakKeyDictionary
 
-__all__ = ['Namespace', 'dictify', 'namespacify']
+__all__ = ['Namespace', 'Record', 'dictify', 'namespacify']
 
 
 
@@ -32,8 +42,132 @@ class Namespace(SimpleNamespace):
 
 
 
+#-- `Record` -------------------------------------------------------------------
+
+class Record:
+    '''
+    A compact, namespace-like record with a fixed set of fields.
+
+    Records are created by `namespacify` in compact mode. Mappings with the same
+    keys are converted to instances of the same `Record` subclass, which stores
+    fields in slots instead of a per-instance dictionary. Records compare equal
+    to namespaces and records with the same fields, and print like namespaces.
+
+    Parameters:
+        values: The value of each field, in order.
+    '''
+    __slots__ = ()
+    __hash__ = None # type: ignore
+    _fields_: Tuple[str, ...] = ()
+
+    def __init__(self, *values: object) -> None:
+        for field, value in zip(self._fields_, values):
+            object.__setattr__(self, field, value)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Record, SimpleNamespace)):
+            return get_fields(self) == get_fields(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return indented_repr(self, 0, 0)
+
+    def __reduce__(self) -> tuple:
+        return make_record, (self._fields_, self._values_())
+
+    def _values_(self) -> tuple:
+        return tuple(getattr(self, f) for f in self._fields_)
+
+
+RECORD_TYPE_CACHE_SIZE = 2**10; \
+    '''
+    The maximum number of distinct `Record` subclasses to keep for reuse.
+    '''
+
+
+@lru_cache(maxsize=RECORD_TYPE_CACHE_SIZE)
+def get_record_type(fields: Tuple[object, ...]) -> Optional[type]:
+    '''
+    Return the `Record` subclass with the given fields, or `None` if the fields
+    can't be represented as slots (because they are not identifiers, or are
+    private).
+    '''
+    if not all(isinstance(f, str) and f.isidentifier() and f[:1] != '_'
+               for f in fields):
+        return None
+    return type('Record', (Record,), {
+        '__slots__': fields, '__module__': __name__,
+        '__qualname__': 'Record', '_fields_': fields})
+
+
+def make_record(fields: Tuple[str, ...], values: Tuple[object, ...]) -> Record:
+    '''
+    Construct a record with the given fields, e.g. when unpickling.
+    '''
+    return get_record_type(fields)(*values) # type: ignore
+
+
+def get_fields(obj: Union[Record, SimpleNamespace]) -> Dict[str, object]:
+    '''
+    Return a dictionary containing the fields of a record or namespace.
+    '''
+    if isinstance(obj, Record):
+        return dict(zip(obj._fields_, obj._values_()))
+    else:
+        return vars(obj)
+
+
+
 #-- `Namespace` <-> JSON-like object conversion --------------------------------
 
+LEAF_TYPES = frozenset({type(None), bool, int, float, str, bytes}); \
+    '''
+    Types whose instances are returned unchanged by `dictify` and `namespacify`,
+    checked by exact type before any `isinstance` checks.
+    '''
+
+LEAF, PATH, TYPE, STRING, SEQUENCE, MAPPING, RECORD, OBJECT = range(8)
+
+BUILTIN_CONTAINER_KINDS: Dict[type, int] = {
+    list: SEQUENCE, tuple: SEQUENCE, dict: MAPPING}; \
+    '''
+    The conversion kinds of built-in containers, checked by exact type before
+    `get_node_kinds` is called.
+    '''
+
+node_kinds: MutableMapping[type, Tuple[int, ...]] = WeakKeyDictionary()
+
+
+def get_node_kinds(type_: type) -> Tuple[int, ...]:
+    '''
+    Return the ways instances of a type are converted, as a tuple of
+    `LEAF`/`PATH`/`TYPE`/`STRING`/`SEQUENCE`/`MAPPING`/`RECORD`/`OBJECT`
+    values.
+
+    The tuple contains `dictify`'s treatment with neither, only a path encoder,
+    only a type encoder, and both a path encoder and a type encoder, followed by
+    `namespacify`'s treatment. Results are cached per type, so the `Sequence`
+    and `Mapping` ABC checks are only performed once per type.
+    '''
+    kinds = node_kinds.get(type_)
+    if kinds is None:
+        base_kind = (
+            LEAF if issubclass(type_, tuple(LEAF_TYPES))
+            else SEQUENCE if issubclass(type_, Sequence)
+            else MAPPING if issubclass(type_, Mapping)
+            else RECORD if issubclass(type_, Record)
+            else OBJECT)
+        path_kind = PATH if issubclass(type_, PathLike) else base_kind
+        type_kind = TYPE if issubclass(type_, type) else base_kind
+        kinds = node_kinds[type_] = (
+            base_kind, path_kind, type_kind,
+            path_kind if path_kind == PATH else type_kind,
+            STRING if issubclass(type_, str)
+            else LEAF if base_kind in (RECORD, OBJECT)
+            else base_kind)
+    return kinds
+
+
 def dictify(obj: object,
             path_encoder: Optional[Callable[[PathLike], str]] = None,
             type_encoder: Optional[Callable[[type], str]] = None
@@ -44,48 +178,151 @@ def dictify(obj: object,
     If a path encoder is provided, it is used to convert path-like objects to
     strings. Private attributes (attributes whose names start with "_") are
     ignored. If a type encoder is provided, it is used to convert types to
-    strings.
+    strings. A `ValueError` is raised if the object contains itself.
     '''
-    if isinstance(obj, PathLike) and path_encoder:
-        return path_encoder(obj)
-    elif isinstance(obj, type) and type_encoder:
-        return type_encoder(obj)
-    elif isinstance(obj, (type(None), bool, int, float, str, bytes)):
-        return obj
-    elif isinstance(obj, Sequence):
-        return [dictify(v, path_encoder, type_encoder) for v in obj]
-    elif isinstance(obj, Mapping):
-        return {k: dictify(v, path_encoder, type_encoder)
-                for k, v in obj.items()}
-    elif hasattr(obj, '__dict__'):
-        return {k: dictify(v, path_encoder, type_encoder)
-                for k, v in vars(obj).items()
-                if not k.startswith('_')}
-    else:
+    if type(obj) in LEAF_TYPES:
         return obj
 
+    # Convert nodes iteratively, writing each result into its parent.
+    mode = bool(path_encoder) + 2 * bool(type_encoder)
+    root: List[Any] = [None]
+    stack: List[Tuple[Any, Any, Any]] = [(root, 0, obj)]
+    in_progress: Set[int] = set()
+    items: Iterable[Tuple[Any, Any]]
+
+    while stack:
+        dst, key, node = stack.pop()
+        if dst is None:
+            in_progress.remove(node)
+            continue
+
+        kind = BUILTIN_CONTAINER_KINDS.get(type(node))
+        if kind is None:
+            kind = get_node_kinds(type(node))[mode]
+
+        if kind == SEQUENCE:
+            items = enumerate(node)
+            dst[key] = dst = [None] * len(node)
+        elif kind == MAPPING:
+            items = node.items()
+            dst[key] = dst = {}
+        elif kind == RECORD:
+            items = zip(node._fields_, node._values_())
+            dst[key] = dst = {}
+        elif kind == OBJECT and hasattr(node, '__dict__'):
+            items = (
+                (k, v) for k, v in vars(node).items()
+                if not k.startswith('_'))
+            dst[key] = dst = {}
+        elif kind == PATH:
+            dst[key] = path_encoder(node) # type: ignore
+            continue
+        elif kind == TYPE:
+            dst[key] = type_encoder(node) # type: ignore
+            continue
+        else:
+            dst[key] = node
+            continue
+
+        enter_container(node, stack, in_progress)
+        for k, v in items:
+            dst[k] = v
+            if type(v) not in LEAF_TYPES:
+                stack.append((dst, k, v))
+
+    return root[0]
+
 
 def namespacify(obj: object,
-                path_decoder: Optional[Callable[[str], PathLike]] = None
+                path_decoder: Optional[Callable[[str], PathLike]] = None,
+                compact: bool = False
                 ) -> Any:
     '''
     Deeply convert mappings in an object to namespaces.
 
     If a path decoder is provided, it is used to convert strings starting with
-    "@/" to path-like objects.
+    "@/" to path-like objects. If `compact` is true, mappings are converted to
+    records (see `Record`) instead, when their keys permit it. A `ValueError` is
+    raised if the object contains itself.
     '''
-    if isinstance(obj, str) and obj.startswith('@/') and path_decoder:
-        return path_decoder(obj)
-    elif isinstance(obj, (type(None), bool, int, float, str, bytes)):
-        return obj
-    elif isinstance(obj, Sequence):
-        return [namespacify(v, path_decoder) for v in obj]
-    elif isinstance(obj, Mapping):
-        return Namespace(**{
-            k: namespacify(v, path_decoder)
-            for k, v in obj.items()})
-    else:
-        return obj
+    # Convert nodes iteratively, writing each result into its parent.
+    root: List[Any] = [None]
+    stack: List[Tuple[Any, Any, Any]] = [(root, 0, obj)]
+    in_progress: Set[int] = set()
+    items: Iterable[Tuple[Any, Any]]
+
+    while stack:
+        dst, key, node = stack.pop()
+        if dst is None:
+            in_progress.remove(node)
+            continue
+        elif type(node) is PendingRecord:
+            dst[key] = node.type(*node.fields.values())
+            continue
+
+        kind = BUILTIN_CONTAINER_KINDS.get(type(node))
+        if kind is None:
+            kind = get_node_kinds(type(node))[4]
+
+        if kind == SEQUENCE:
+            items = enumerate(node)
+            dst[key] = dst = [None] * len(node)
+        elif kind == MAPPING:
+            items = node.items()
+            record_type = get_record_type(tuple(node)) if compact else None
+            if record_type is None:
+                namespace = dst[key] = Namespace()
+                dst = namespace.__dict__
+            else:
+                # Construct the record after its fields are converted.
+                pending = PendingRecord(record_type)
+                stack.append((dst, key, pending))
+                dst = pending.fields
+        elif kind == STRING and node.startswith('@/') and path_decoder:
+            dst[key] = path_decoder(node)
+            continue
+        else:
+            dst[key] = node
+            continue
+
+        enter_container(node, stack, in_progress)
+        for k, v in items:
+            if kind == MAPPING and type(k) is not str:
+                raise TypeError('Namespace keys must be strings.')
+            dst[k] = v
+            if (type(v) not in LEAF_TYPES
+                or type(v) is str and v.startswith('@/') and path_decoder):
+                stack.append((dst, k, v))
+
+    return root[0]
+
+
+def enter_container(obj: object,
+                    stack: List[Tuple[Any, Any, Any]],
+                    in_progress: Set[int]) -> None:
+    '''
+    Mark a container as being converted by `dictify` or `namespacify`, until a
+    marker pushed onto the conversion stack (below its items) is popped.
+
+    A `ValueError` is raised if the container is already being converted, i.e.
+    if it contains itself.
+    '''
+    if id(obj) in in_progress:
+        raise ValueError('Objects that contain themselves can\'t be converted.')
+    in_progress.add(id(obj))
+    stack.append((None, None, id(obj)))
+
+
+
+class PendingRecord:
+    '''
+    A record whose fields are being converted by `namespacify`.
+    '''
+    __slots__ = ('type', 'fields')
+
+    def __init__(self, type_: type) -> None:
+        self.type = type_
+        self.fields: Dict[str, object] = {}
 
 
 
@@ -108,13 +345,13 @@ def indented_repr(obj: object, curr_col: int, indent: int) -> str:
                 indented_repr(elem, indent + 2, indent + 2)
                 for elem in obj)
             + '\n' + ' ' * indent + ']')
-    elif isinstance(obj, Namespace):
+    elif isinstance(obj, (Namespace, Record)):
         return (
             f'{obj.__class__.__qualname__}(\n'
             + ' ' * (indent + 2)
             + (',\n' + ' ' * (indent + 2)).join(
                 f'{k} = {indented_repr(v, indent + 5 + len(k), indent + 2)}'
-                for k, v in vars(obj).items())
+                for k, v in get_fields(obj).items())
             + '\n' + ' ' * indent + ')')
     else:
         return repr(obj)
@@ -126,12 +363,12 @@ def single_line_repr(obj: object) -> str:
     '''
     if isinstance(obj, list):
         return '[' + ', '.join(map(single_line_repr, obj)) + ']'
-    elif isinstance(obj, Namespace):
+    elif isinstance(obj, (Namespace, Record)):
         return (
             f'{obj.__class__.__qualname__}('
             + ', '.join(
                 f'{k}={single_line_repr(v)}'
-                for k, v in vars(obj).items())
+                for k, v in get_fields(obj).items())
             + ')')
     else:
         return repr(obj).replace('\n', ' ')
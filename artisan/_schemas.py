@@ -8,24 +8,39 @@ Exported definitions:
         Return a JSON Schema describing lists of artifact specifications.
     get_spec_dict_schema (function):
         Return a JSON Schema describing artifact specification dictionaries.
+    cache_spec_annotations (function):
+        Record the literal annotations in modules' class definitions in
+        sidecar files, so they can be used without parsing source code.
+
+Internal definitions:
+    get_cached_schemas (function): Return the schemas for the active root
+        directory and scope, computing them if they have not been cached.
 '''
 
-import ast
+import ast, hashlib, json, os, sys
+from collections import OrderedDict
+from copy import deepcopy
 from functools import lru_cache
-from inspect import getsource, cleandoc
+from importlib import import_module
+from inspect import cleandoc, getsource
 from os import PathLike
 from pathlib import Path
 from textwrap import dedent
+from threading import Lock
+from types import ModuleType
 from typing import (
-    Any, DefaultDict, Dict, Iterator, List, Mapping, Optional,
-    Tuple, Union, cast, get_args, get_origin, get_type_hints)
+    Any, DefaultDict, Dict, Iterator, List, Mapping, MutableMapping,
+    Optional, Tuple, Union, get_args, get_origin, get_type_hints)
+from weakref import WeakKeyDictionary
 from typing_extensions import Literal
 
 from ._artifacts import Artifact, active_root
 from ._namespaces import dictify
-from ._targets import active_scope
+from ._targets import TargetTypeRegistry, active_scope, get_type_names
 
-__all__ = ['get_spec_dict_schema', 'get_spec_list_schema', 'get_spec_schema']
+__all__ = [
+    'cache_spec_annotations', 'get_spec_dict_schema',
+    'get_spec_list_schema', 'get_spec_schema']
 
 
 
@@ -38,7 +53,106 @@ def get_spec_schema() -> dict:
     The schema will contain a definition corresponding to the `Spec` type of
     every entry in the active scope.
     '''
+    return deepcopy(get_cached_schemas()[1]['spec'])
+
+
+def get_spec_list_schema() -> dict:
+    '''
+    Return a JSON Schema describing lists of artifact specifications.
+
+    The schema will contain a definition corresponding to the `Spec` type of
+    every entry in the active scope.
+    '''
+    return deepcopy(get_cached_schemas()[1]['spec-list'])
+
+
+def get_spec_dict_schema() -> dict:
+    '''
+    Return a JSON Schema describing artifact specification dictionaries.
+
+    Objects whose entries are artifact specifications will be valid against the
+    schema. The schema will contain a definition corresponding to the `Spec`
+    type of every entry in the active scope.
+    '''
+    return deepcopy(get_cached_schemas()[1]['spec-dict'])
+
+
+
+#-- Schema caching -------------------------------------------------------------
+
+SCHEMA_CACHE_SIZE = 16; \
+    '''
+    The maximum number of (root directory, scope) combinations for which
+    schemas are cached.
+    '''
+
+schema_cache: 'OrderedDict[tuple, Dict[str, dict]]' = OrderedDict(); \
+    '''
+    Schemas by name ("spec", "spec-list", or "spec-dict"), keyed by root
+    directory and scope, in least-recently-used-first order.
+    '''
+
+schema_cache_lock = Lock(); \
+    '''
+    A lock guarding `schema_cache`.
+    '''
+
+
+def get_cached_schemas() -> Tuple[tuple, Dict[str, dict]]:
+    '''
+    Return a key identifying the active root directory and scope, and the
+    schemas for them, by name ("spec", "spec-list", or "spec-dict").
+
+    Schemas are computed the first time they are requested for a given root
+    directory and scope. The global target type registry is identified by its
+    version, and other scopes are identified by their items. The registry's
+    version is included in every key, since defining or deleting a target type
+    can change other types' schemas (by adding or removing subclasses). The
+    returned schemas are shared, and must not be modified.
+    '''
     scope = active_scope.get()
+    key = (
+        str(active_root.get().resolve()),
+        TargetTypeRegistry._get_version(),
+        None if isinstance(scope, TargetTypeRegistry)
+        else tuple(scope.items()))
+
+    with schema_cache_lock:
+        schemas = schema_cache.get(key)
+        if schemas is not None:
+            schema_cache.move_to_end(key)
+            return key, schemas
+
+    spec_schema = spec_schema_from_scope(scope)
+    schemas = {
+        'spec': spec_schema,
+        'spec-list': {
+            '$schema': spec_schema['$schema'],
+            '$defs': spec_schema['$defs'],
+            'type': 'array',
+            'items': {'oneOf': spec_schema['oneOf']}},
+        'spec-dict': {
+            '$schema': spec_schema['$schema'],
+            '$defs': spec_schema['$defs'],
+            'type': 'object',
+            'properties': {'$schema': {'type': 'string'}},
+            'additionalProperties': {'oneOf': spec_schema['oneOf']}}}
+
+    with schema_cache_lock:
+        schema_cache[key] = schemas
+        while len(schema_cache) > SCHEMA_CACHE_SIZE:
+            schema_cache.popitem(last=False)
+    return key, schemas
+
+
+
+#-- Schema construction --------------------------------------------------------
+
+def spec_schema_from_scope(scope: Mapping[str, type]) -> dict:
+    '''
+    Return a JSON Schema describing valid specifications for the artifact
+    types in a scope.
+    '''
     def_index = {
         **{
             getattr(type_, 'Spec'): name
@@ -75,36 +189,6 @@ def get_spec_schema() -> dict:
     }
 
 
-def get_spec_list_schema() -> dict:
-    '''
-    Return a JSON Schema describing lists of artifact specifications.
-
-    The schema will contain a definition corresponding to the `Spec` type of
-    every entry in the active scope.
-    '''
-    spec_schema = get_spec_schema()
-    return {'$schema': spec_schema['$schema'],
-            '$defs': spec_schema['$defs'],
-            'type': 'array',
-            'items': {'oneOf': spec_schema['oneOf']}}
-
-
-def get_spec_dict_schema() -> dict:
-    '''
-    Return a JSON Schema describing artifact specification dictionaries.
-
-    Objects whose entries are artifact specifications will be valid against the
-    schema. The schema will contain a definition corresponding to the `Spec`
-    type of every entry in the active scope.
-    '''
-    spec_schema = get_spec_schema()
-    return {'$schema': spec_schema['$schema'],
-            '$defs': spec_schema['$defs'],
-            'type': 'object',
-            'properties': {'$schema': {'type': 'string'}},
-            'additionalProperties': {'oneOf': spec_schema['oneOf']}}
-
-
 def spec_schema_from_type(type_: type,
                           scope: Mapping[str, type],
                           def_index: Mapping[type, str]) -> dict:
@@ -281,72 +365,206 @@ def type_annotations(type_: type) -> Iterator[Tuple[str, type]]:
                 yield field, ann
 
 
-@lru_cache(maxsize=None)
 def literal_annotations(type_: type,
                         name: Optional[str] = None
                         ) -> List[Tuple[str, object]]:
     '''
-    Yield (target, annotation) pairs for the literal annotations in a class
+    Return (target, annotation) pairs for the literal annotations in a class
     definition.
 
     If `name` is a string, use the definition of the inner class with that name.
+    Results are memoized in `literal_annotation_cache`.
     '''
-    leaf_def = parse_class_def(type_, name)
-    type_ = type_ if name is None else getattr(type_, name, type('', (), {}))
-    class_defs = [*map(parse_class_def, reversed(type_.mro()[1:])), leaf_def]
-    result: List[Tuple[str, object]] = []
+    try:
+        return literal_annotation_cache[type_][name]
+    except KeyError:
+        pass
+
+    leaf_qualname = type_.__qualname__ + ('' if name is None else f'.{name}')
+    leaf_anns = module_literal_annotations(type_.__module__).get(leaf_qualname)
+    leaf_type = (
+        type_ if name is None else getattr(type_, name, type('', (), {})))
+    result = [
+        *(ann
+          for t in reversed(leaf_type.mro()[1:])
+          for ann in module_literal_annotations(t.__module__)
+                     .get(t.__qualname__, [])),
+        *(leaf_anns or [])]
+
+    literal_annotation_cache.setdefault(type_, {})[name] = result
+    return result
+
+
+literal_annotation_cache: MutableMapping[
+    type, Dict[Optional[str], List[Tuple[str, object]]]
+] = WeakKeyDictionary(); \
+    '''
+    The results of `literal_annotations`, by class and inner-class name. Keys
+    are weak references, so the cache doesn't keep classes alive.
+    '''
+
+
+SIDECAR_NAME = '_spec_annotations_.json'; \
+    '''
+    The name of the files in which `cache_spec_annotations` records literal
+    annotations, alongside the corresponding modules.
+    '''
+
+
+def cache_spec_annotations(*modules: Union[ModuleType, str]) -> None:
+    '''
+    Record the literal annotations in modules' class definitions in sidecar
+    files, so they can be used without parsing source code.
+
+    Schema generation uses literal annotations (*e.g.* strings following
+    attribute declarations in `Spec` classes) as property descriptions. By
+    default, they are extracted from source code, which is slow for large
+    modules and impossible in deployments that don't include source code (like
+    some frozen applications). This function can be called at build time to
+    record a module's literal annotations in a "_spec_annotations_.json" file
+    in the module's directory. Records are keyed by a hash of the module's
+    source code, and are used instead of the source code when they are up to
+    date, or when the source code is unavailable. Modules without files are
+    skipped.
+    '''
+    for module in modules:
+        if isinstance(module, str):
+            module = import_module(module)
+        source = get_module_source(module)
+        if source is None:
+            raise ValueError(f'The source code of `{module}` is unavailable.')
+        if module.__file__ is None:
+            continue
+        sidecar_path = Path(module.__file__).parent / SIDECAR_NAME
+        records = read_sidecar(sidecar_path)
+        annotations = extract_literal_annotations(source)
+        records[module.__name__] = {
+            'source_hash': hashlib.sha256(source.encode()).hexdigest(),
+            'annotations': {
+                qualname: [[field, repr(ann)] for field, ann in anns]
+                for qualname, anns in annotations.items()
+                if len(anns) > 0}}
+        temp_path = sidecar_path.with_name(f'.{SIDECAR_NAME}.{os.getpid()}')
+        temp_path.write_text(json.dumps(records, indent=2, sort_keys=True))
+        temp_path.replace(sidecar_path)
+        module_literal_annotations.cache_clear()
+        literal_annotation_cache.clear()
+
+
+@lru_cache(maxsize=None)
+def module_literal_annotations(module_name: str
+                               ) -> Dict[str, List[Tuple[str, object]]]:
+    '''
+    Return a mapping from the qualified names of the classes defined in a
+    module to the literal annotations in their bodies.
 
-    for class_def in class_defs:
-        curr_field: Optional[str] = None
-
-        for stmt in class_def.body:
-            # Yield the statment's value if it's a post-assignment literal.
-            if (isinstance(stmt, ast.Expr)
-                and curr_field is not None
-                and not curr_field.startswith('_')):
-                try:
-                    result.append((curr_field, ast.literal_eval(stmt.value)))
-                except ValueError:
-                    pass
-
-            # Compute the current field.
-            if (isinstance(stmt, ast.Assign)
-                and len(stmt.targets) == 1
-                and isinstance(stmt.targets[0], ast.Name)):
-                curr_field = stmt.targets[0].id
-
-            elif (isinstance(stmt, ast.AnnAssign)
-                and isinstance(stmt.target, ast.Name)):
-                curr_field = stmt.target.id
+    Up-to-date records written by `cache_spec_annotations` are used when they
+    exist, and records of any age are used when the module's source code is
+    unavailable. Otherwise, the source code is parsed.
+    '''
+    module = sys.modules.get(module_name)
+    source = None if module is None else get_module_source(module)
+    file_name = getattr(module, '__file__', None)
+    record = (
+        {} if file_name is None
+        else read_sidecar(Path(file_name).parent / SIDECAR_NAME)
+             .get(module_name, {}))
+
+    if source is not None and record.get('source_hash') != (
+            hashlib.sha256(source.encode()).hexdigest()):
+        return extract_literal_annotations(source)
+    else:
+        return {
+            qualname: [(field, ast.literal_eval(ann)) for field, ann in anns]
+            for qualname, anns in record.get('annotations', {}).items()}
 
+
+def extract_literal_annotations(source: str
+                                ) -> Dict[str, List[Tuple[str, object]]]:
+    '''
+    Parse a module's source code and return a mapping from the qualified names
+    of the classes it defines to the literal annotations in their bodies.
+
+    If a class is defined more than once, its last definition is used, as it is
+    the one bound at runtime.
+    '''
+    result: Dict[str, List[Tuple[str, object]]] = {}
+
+    def visit(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.ClassDef):
+                qualname = prefix + child.name
+                result[qualname] = class_literal_annotations(child)
+                visit(child, qualname + '.')
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                visit(child, prefix + child.name + '.<locals>.')
+            elif isinstance(child, ast.Lambda):
+                visit(child, prefix + '<lambda>.<locals>.')
             else:
-                curr_field = None
+                visit(child, prefix)
 
+    try:
+        visit(ast.parse(source), '')
+    except SyntaxError:
+        pass
     return result
 
 
-@lru_cache(maxsize=None)
-def parse_class_def(type_: type, name: Optional[str] = None) -> ast.ClassDef:
+def class_literal_annotations(class_def: ast.ClassDef
+                              ) -> List[Tuple[str, object]]:
+    '''
+    Return (target, annotation) pairs for the literal annotations in the body
+    of a class definition.
     '''
-    Locate, parse, and return the given class' definition.
+    result: List[Tuple[str, object]] = []
+    curr_field: Optional[str] = None
+
+    for stmt in class_def.body:
+        # Record the statment's value if it's a post-assignment literal.
+        if (isinstance(stmt, ast.Expr)
+            and curr_field is not None
+            and not curr_field.startswith('_')):
+            try:
+                result.append((curr_field, ast.literal_eval(stmt.value)))
+            except ValueError:
+                pass
+
+        # Compute the current field.
+        if (isinstance(stmt, ast.Assign)
+            and len(stmt.targets) == 1
+            and isinstance(stmt.targets[0], ast.Name)):
+            curr_field = stmt.targets[0].id
+
+        elif (isinstance(stmt, ast.AnnAssign)
+            and isinstance(stmt.target, ast.Name)):
+            curr_field = stmt.target.id
+
+        else:
+            curr_field = None
 
-    If `name` is a string, return the definition of the inner class with that
-    name.
+    return result
+
+
+def get_module_source(module: ModuleType) -> Optional[str]:
+    '''
+    Return a module's source code, or `None` if it is unavailable.
     '''
     try:
-        mod_def = cast(ast.Module, ast.parse(dedent(getsource(type_))))
-        cls_def = cast(ast.ClassDef, mod_def.body[0])
+        return getsource(module)
     except (OSError, TypeError):
-        cls_def = ast.ClassDef('', (), (), [], [])
+        return None
 
-    if name is None:
-        return cls_def
-    else:
-        for stmt in cls_def.body:
-            if isinstance(stmt, ast.ClassDef) and stmt.name == name:
-                return stmt
-        else:
-            return ast.ClassDef('', (), (), [], [])
+
+def read_sidecar(path: Path) -> Dict[str, Any]:
+    '''
+    Return the records in a literal-annotation sidecar file, or an empty
+    dictionary if it does not exist or is invalid.
+    '''
+    try:
+        records = json.loads(path.read_text())
+        return records if isinstance(records, dict) else {}
+    except (OSError, ValueError):
+        return {}
 
 
 
@@ -376,7 +594,6 @@ def get_type_name(type_: type) -> str:
     used. If it has no names, a `ValueError` is raised.
     '''
     try:
-        scope = active_scope.get()
-        return min(k for k, v in scope.items() if v is type_)
-    except ValueError:
+        return get_type_names(active_scope.get())[type_]
+    except (KeyError, TypeError):
         raise ValueError(f'{type_} is not in the current Artisan scope.')
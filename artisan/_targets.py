@@ -10,23 +10,28 @@ Internal definitions:
     TargetType (metaclass): `Target`'s metaclass.
     active_scope (context variable): The mapping used to resolve type names in
         specifications during target instantiation.
+    ScopeIndex (class): A reverse index of a user-supplied target scope.
+    get_type_names (function): Return a mapping from types to their
+        lexicographically first names in a target scope.
 '''
 
 from __future__ import annotations
 
 from abc import ABCMeta
+from collections import OrderedDict
 from contextvars import ContextVar
 from copy import copy
-from functools import lru_cache
-from itertools import groupby
+from threading import Lock, RLock
 from typing import (
-    ClassVar, Dict, Iterator, Optional,
-    Mapping, Tuple, Type, TypeVar)
+    ClassVar, Dict, Iterator, List,
+    Mapping, Set, Tuple, Type, TypeVar)
 from typing_extensions import Protocol
-from weakref import WeakValueDictionary, finalize
+from weakref import (
+    ReferenceType, WeakKeyDictionary, WeakValueDictionary, finalize, ref)
 T = TypeVar('T')
 
-__all__ = ['Target', 'TargetType', 'active_scope']
+__all__ = [
+    'Target', 'TargetType', 'active_scope', 'ScopeIndex', 'get_type_names']
 
 
 
@@ -71,16 +76,26 @@ class TargetType(ABCMeta):
         return refined_cls, (refined_spec, *other_args[1:])
 
 
-@lru_cache(maxsize=None)
+spec_defaults: WeakKeyDictionary[type, Dict[str, object]] = (
+    WeakKeyDictionary())
+
+
 def get_spec_defaults(cls: type) -> Dict[str, object]:
     '''
     Return the default specification attributes for a type.
+
+    Results are cached weakly, so that deleted target types can be removed from
+    the target type registry.
     '''
-    spec_type = getattr(cls, 'Spec', None)
-    return {k: getattr(spec_type, k)
+    defaults = spec_defaults.get(cls)
+    if defaults is None:
+        spec_type = getattr(cls, 'Spec', None)
+        defaults = spec_defaults[cls] = {
+            k: getattr(spec_type, k)
             for k in dir(spec_type)
             if not k.startswith('_')
             and not callable(getattr(spec_type, k))}
+    return defaults
 
 
 
@@ -126,8 +141,7 @@ class Target(metaclass=TargetType):
             cls.Spec = Spec # type: ignore
 
         # Keep the target type registry in sync.
-        TargetTypeRegistry._invalidate()
-        finalize(cls, TargetTypeRegistry._invalidate)
+        TargetTypeRegistry._add(cls)
 
     def __new__(cls: Type[T], *args: object, **kwargs: object) -> T:
         return object.__new__(cls)
@@ -145,9 +159,21 @@ class TargetTypeRegistry(Mapping[str, Type[Target]]):
     `artisan` module.
 
     The key for a target type `T` is `T.__qualname__` if its name is unique and
-    `f'{T.__qualname__} ({T.__module__})'` otherwise.
+    `f'{T.__qualname__} ({T.__module__})'` otherwise. A type redefined in the
+    same module (*e.g.* by re-running a notebook cell) shadows its earlier
+    definitions, even if they haven't been garbage-collected yet.
+
+    The registry is maintained incrementally: types are added as they are
+    defined, and removed (via a queue of pending removals, since finalizers can
+    run at arbitrary points) the next time the registry is accessed. Only the
+    keys of types sharing the added or removed type's qualified name change.
     '''
-    _cache: ClassVar[Optional[Mapping[str, Type[Target]]]] = None
+    _cache: ClassVar[Mapping[str, Type[Target]]] = WeakValueDictionary()
+    _names: ClassVar[Mapping[type, str]] = WeakKeyDictionary()
+    _groups: ClassVar[Dict[str, List[ReferenceType]]] = {}
+    _pending_removals: ClassVar[List[Tuple[str, str]]] = []
+    _lock: ClassVar[RLock] = RLock()
+    _version: ClassVar[int] = 0
 
     def __len__(self) -> int:
         return self._get_content().__len__()
@@ -161,28 +187,74 @@ class TargetTypeRegistry(Mapping[str, Type[Target]]):
     def __getitem__(self, key: str) -> Type[Target]:
         return self._get_content().__getitem__(key)
 
+    @classmethod
+    def snapshot(cls) -> Dict[str, Type[Target]]:
+        '''
+        Return the registry's current content as a dictionary.
+
+        Snapshots can be pickled (target types are pickled by reference) and
+        used as the scope in worker processes.
+        '''
+        return dict(cls._get_content())
+
     @classmethod
     def _get_content(cls) -> Mapping[str, Type[Target]]:
-        if cls._cache is None:
-            types_by_name = [
-                (name, list(group)) for name, group in
-                groupby(cls._values(), lambda t: t.__qualname__)]
-            cls._cache = WeakValueDictionary({
-                name + (len(group) > 1) * f' ({type_.__module__})': type_
-                for name, group in types_by_name
-                for type_ in group})
+        if cls._pending_removals:
+            cls._process_removals()
         return cls._cache
 
     @classmethod
-    def _invalidate(cls) -> None:
-        cls._cache = None
+    def _get_names(cls) -> Mapping[type, str]:
+        if cls._pending_removals:
+            cls._process_removals()
+        return cls._names
 
     @classmethod
-    def _values(cls, base: Type[Target] = Target) -> Iterator[Type[Target]]:
-        if not base.__module__.startswith('artisan'):
-            yield base
-        for subtype in base.__subclasses__():
-            yield from cls._values(subtype)
+    def _get_version(cls) -> int:
+        if cls._pending_removals:
+            cls._process_removals()
+        return cls._version
+
+    @classmethod
+    def _add(cls, type_: Type[Target]) -> None:
+        if type_.__module__.startswith('artisan'):
+            return
+        qualname, module = type_.__qualname__, type_.__module__
+        with cls._lock:
+            cls._groups.setdefault(qualname, []).append(ref(type_))
+            cls._regroup(qualname, {module})
+        finalize(type_, cls._pending_removals.append, (qualname, module))
+
+    @classmethod
+    def _process_removals(cls) -> None:
+        with cls._lock:
+            while cls._pending_removals:
+                qualname, module = cls._pending_removals.pop()
+                cls._regroup(qualname, {module})
+
+    @classmethod
+    def _regroup(cls, qualname: str, stale_modules: Set[str]) -> None:
+        '''
+        Recompute the keys of the types named `qualname`.
+        '''
+        live_refs = [r for r in cls._groups.get(qualname, [])
+                     if r() is not None]
+        group = [r() for r in live_refs]
+        latest = {t.__module__: t for t in group} # Later definitions win.
+        modules = stale_modules | set(latest)
+        for key in [qualname, *(f'{qualname} ({m})' for m in modules)]:
+            cls._cache.pop(key, None) # type: ignore
+        for type_ in group:
+            cls._names.pop(type_, None) # type: ignore
+        for type_ in latest.values():
+            name = qualname + (len(latest) > 1) * f' ({type_.__module__})'
+            cls._cache[name] = type_ # type: ignore
+            cls._names[type_] = name # type: ignore
+        if live_refs:
+            cls._groups[qualname] = live_refs
+        else:
+            cls._groups.pop(qualname, None)
+        cls._version += 1
 
 
 active_scope: ContextVar[Mapping[str, type]] = (
@@ -191,3 +263,69 @@ active_scope: ContextVar[Mapping[str, type]] = (
     The mapping used to resolve type names in specifications during target
     instantiation.
     '''
+
+
+
+#-- Reverse scope lookup -------------------------------------------------------
+
+SCOPE_INDEX_CACHE_SIZE = 16; \
+    '''
+    The maximum number of user-supplied scopes to keep reverse indices for.
+    '''
+
+scope_indices: OrderedDict[int, ScopeIndex] = OrderedDict()
+scope_indices_lock = Lock()
+
+
+class ScopeIndex(Mapping[type, str]):
+    '''
+    A reverse index of a user-supplied target scope.
+
+    The index maps each type to its lexicographically first name. Scopes can be
+    mutated after they are indexed, so each lookup compares the scope against a
+    snapshot taken when the index was built, and rebuilds the index if they
+    differ.
+    '''
+    def __init__(self, scope: Mapping[str, type]) -> None:
+        self.scope = scope
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return self._names.__len__()
+
+    def __iter__(self) -> Iterator[type]:
+        return self._names.__iter__()
+
+    def __getitem__(self, type_: type) -> str:
+        if self.scope != self._snapshot:
+            self._rebuild()
+        return self._names[type_]
+
+    def _rebuild(self) -> None:
+        snapshot = dict(self.scope)
+        names: Dict[type, str] = {}
+        for name, type_ in snapshot.items():
+            try:
+                if type_ not in names or name < names[type_]:
+                    names[type_] = name
+            except TypeError: # Unhashable values can't be target types.
+                pass
+        self._names = names
+        self._snapshot = snapshot
+
+
+def get_type_names(scope: Mapping[str, type]) -> Mapping[type, str]:
+    '''
+    Return a mapping from types to their lexicographically first names in a
+    target scope.
+    '''
+    if isinstance(scope, TargetTypeRegistry):
+        return TargetTypeRegistry._get_names()
+    with scope_indices_lock:
+        index = scope_indices.get(id(scope))
+        if index is None or index.scope is not scope:
+            index = scope_indices[id(scope)] = ScopeIndex(scope)
+        scope_indices.move_to_end(id(scope))
+        while len(scope_indices) > SCOPE_INDEX_CACHE_SIZE:
+            scope_indices.popitem(last=False)
+    return index
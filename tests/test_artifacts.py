@@ -1,21 +1,29 @@
-import json, gc, pickle, shutil
+import asyncio, errno, json, gc, os, pickle, shutil
 from glob import glob
 from pathlib import Path
 from tempfile import NamedTemporaryFile, TemporaryDirectory
-from typing import Any, Callable, Dict, List, NamedTuple, Type, Union
+from time import sleep
+from typing import (
+    Any, Callable, Dict, List, NamedTuple, Tuple, Type, Union)
 from typing_extensions import Protocol
 
+import numpy as np
 import pytest
 from hypothesis import given
 from hypothesis.strategies import (
     SearchStrategy, binary, builds,
     lists, one_of, sampled_from)
+from numpy.testing import assert_equal
 
 from artisan import (
     Artifact, DynamicArtifact, Namespace as Ns,
-    ProxyArtifactField, recover)
+    PersistentList, ProxyArtifactField, abuild, recover)
+from artisan import _artifacts
+from artisan._blobs import link_blob
 from artisan._targets import active_scope
-from artisan._artifacts import active_builder, active_root, default_builder
+from artisan._artifacts import (
+    active_builder, active_root, default_builder, encode_path,
+    encode_path_from, is_lease_expired, write_json_atomically)
 
 
 #-- File operations ------------------------------------------------------------
@@ -253,6 +261,33 @@ def test_artifact_creation_and_search() -> None:
             active_scope.reset(scope_token)
 
 
+def test_path_encoding(tmp_path: Path) -> None:
+    '''
+    Test that paths in specifications are encoded relative to the active root
+    directory, and that encodings are memoized per root directory.
+    '''
+    class PathHolder(Artifact):
+        class Spec(Protocol):
+            src: Path
+
+    (tmp_path / 'a' / 'b').mkdir(parents=True)
+    root_token = active_root.set(tmp_path / 'a')
+    scope_token = active_scope.set(dict(PathHolder=PathHolder))
+    try:
+        encode_path_from.cache_clear()
+        artifact = PathHolder(Ns(src=tmp_path / 'data.txt'))
+        assert artifact._path_ == tmp_path / 'a' / 'PathHolder_0000'
+        match = PathHolder(Ns(src=tmp_path / 'data.txt'))
+        assert match._path_ == artifact._path_
+        assert encode_path_from.cache_info().hits >= 1
+        assert encode_path(tmp_path / 'data.txt') == '@/../data.txt'
+        active_root.set(tmp_path / 'a' / 'b')
+        assert encode_path(tmp_path / 'data.txt') == '@/../../data.txt'
+    finally:
+        active_root.reset(root_token)
+        active_scope.reset(scope_token)
+
+
 def test_access_modes() -> None:
     '''
     Test using artifacts in "read-sync", "read-async", and "write" mode.
@@ -296,6 +331,130 @@ def test_access_modes() -> None:
         assert isinstance(w_artifact.y, ProxyArtifactField)
 
 
+def test_deduplication(tmp_path: Path) -> None:
+    '''
+    Test that artifact types with `_deduplicate_ = True` store large files in
+    the root directory's blob store.
+    '''
+    class Dedup(Artifact):
+        _deduplicate_ = True
+
+        class Spec(Protocol):
+            seed: int
+
+        def __init__(self, spec: Spec) -> None:
+            self.array = np.arange(2**14, dtype='f8')
+            self.small = np.arange(4)
+            self.list = [Ns(i=i, s='x' * 100) for i in range(1000)]
+
+    root_token = active_root.set(tmp_path)
+    scope_token = active_scope.set(dict(Dedup=Dedup))
+    try:
+        a = Dedup(Ns(seed=0))
+        b = Dedup(Ns(seed=1))
+        assert Dedup(Ns(seed=0))._path_ == a._path_
+        assert len(list((tmp_path / '_blobs_').glob('[!_]*'))) == 2
+        for name in ['array.cbor', 'list.cbor']:
+            stat_a = (a._path_ / name).stat()
+            assert stat_a.st_ino == (b._path_ / name).stat().st_ino
+            assert stat_a.st_nlink == 3
+        assert (a._path_ / 'small.cbor').stat().st_nlink == 1
+        assert_equal(b.array, np.arange(2**14))
+
+        a_writable = recover(Dedup, a._path_, 'write')
+        a_writable.array[0] = 42.0
+        assert a.array[0] == 42.0 and b.array[0] == 0.0
+        a_writable.small[0] = 7
+        assert a.small[0] == 7
+        with pytest.raises(ValueError):
+            b.array[1:] += 1.0
+        a_writable.array.extend([1.0, 2.0])
+        a_writable.list.append(Ns(i=-1, s=''))
+        assert len(a.array) == 2**14 + 2 and len(b.array) == 2**14
+        assert len(a.list) == 1001 and len(b.list) == 1000
+        assert (a._path_ / 'array.cbor').stat().st_nlink == 1
+    finally:
+        active_root.reset(root_token)
+        active_scope.reset(scope_token)
+
+
+def test_blob_link_errors(tmp_path: Path, monkeypatch: Any) -> None:
+    '''
+    Test that blobs are symbolically linked only when hard links aren't
+    supported, and that other linking errors are raised.
+    '''
+    blob_path = tmp_path / '_blobs_' / 'blob'
+    blob_path.parent.mkdir()
+    blob_path.write_bytes(b'abc')
+
+    def raise_error(errno_: int) -> Callable[[object, object], None]:
+        def link(src: object, dst: object) -> None:
+            raise OSError(errno_, 'Linking failed.')
+        return link
+
+    monkeypatch.setattr(os, 'link', raise_error(errno.EXDEV))
+    link_blob(blob_path, tmp_path / 'a.bin')
+    assert (tmp_path / 'a.bin').resolve() == blob_path
+
+    monkeypatch.setattr(os, 'link', raise_error(errno.EIO))
+    with pytest.raises(OSError):
+        link_blob(blob_path, tmp_path / 'b.bin')
+    assert not (tmp_path / 'b.bin').exists()
+
+
+def test_build_leases(tmp_path: Path, monkeypatch: Any) -> None:
+    '''
+    Test that builders renew their leases on artifacts while building them,
+    without modifying their metadata files, and that builds whose leases have
+    expired are treated as failed.
+    '''
+    class Leased(Artifact):
+        _lease_duration_ = 0.5
+
+        class Spec(Protocol):
+            seed: int
+
+        def __init__(self, spec: Spec) -> None:
+            meta_mtime = (self / '_meta_.json').stat().st_mtime_ns
+            sleep(1.0)
+            meta = json.loads((self / '_meta_.json').read_text())
+            self.lease_expired = is_lease_expired(self._path_, meta['events'])
+            self.meta_touched = (
+                (self / '_meta_.json').stat().st_mtime_ns != meta_mtime)
+
+    # Record whether the lease is held when each event is logged.
+    logged_events: List[Tuple[str, bool]] = []
+    def log(artifact: Artifact, type: str, **kwargs: object) -> None:
+        logged_events.append((type, (artifact / '_lease_').exists()))
+        original_log(artifact, type, **kwargs)
+    original_log = _artifacts.log
+    monkeypatch.setattr(_artifacts, 'log', log)
+
+    root_token = active_root.set(tmp_path)
+    scope_token = active_scope.set(dict(Leased=Leased))
+    try:
+        a = Leased(Ns(seed=0))
+        assert a.lease_expired == False
+        assert a.meta_touched == False
+        assert not (a / '_lease_').exists()
+        assert logged_events[-1] == ('Success', True)
+        assert Leased(Ns(seed=0))._path_ == a._path_
+
+        # Simulate a builder that died after starting.
+        meta = json.loads((a / '_meta_.json').read_text())
+        meta['events'] = meta['events'][:1]
+        write_json_atomically(a / '_meta_.json', meta)
+        stale = recover(Leased, a._path_)
+        assert stale._is_building()
+        sleep(0.6)
+        assert not stale._is_building()
+        assert stale.lease_expired == False
+        assert Leased(Ns(seed=0))._path_ != a._path_
+    finally:
+        active_root.reset(root_token)
+        active_scope.reset(scope_token)
+
+
 def test_custom_readers_and_writers() -> None:
     '''
     Test overriding `<cls>._readers_` and `<cls>._writers_`.
@@ -409,3 +568,36 @@ def test_proxy_fields() -> None:
 
         artifact.y.z.extend([2, 4, 6])
         assert artifact.y.z == [2, 4, 6]
+
+
+def test_async_access() -> None:
+    '''
+    Test `abuild`, `Artifact._aget_`, `Artifact._wait_done_`, and asynchronous
+    iteration over persistent lists.
+    '''
+    class TestArtifact(Artifact):
+        def __init__(self, spec: object) -> None:
+            self.x = 'ex'
+            self.log = [0, 1]
+
+    async def follow(log: PersistentList, n_items: int) -> list:
+        items = []
+        async for item in log:
+            items.append(item)
+            if len(items) == n_items:
+                return items
+        return items
+
+    async def run_test(root: str) -> None:
+        artifact = await abuild(TestArtifact, Ns(_path_=f'{root}/artifact'))
+        await artifact._wait_done_()
+        assert await artifact._aget_('x') == 'ex'
+
+        writer = recover(Artifact, f'{root}/artifact', 'write')
+        follower = asyncio.ensure_future(follow(artifact.log, 4))
+        await asyncio.sleep(0.01)
+        writer.log.extend([2, 3])
+        assert await asyncio.wait_for(follower, 5) == [0, 1, 2, 3]
+
+    with TemporaryDirectory() as root:
+        asyncio.run(run_test(root))
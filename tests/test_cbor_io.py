@@ -1,6 +1,7 @@
+import os
 from pathlib import Path
 from string import ascii_letters
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 from typing import List, Tuple
 from typing_extensions import Literal
 
@@ -13,8 +14,9 @@ from numpy import ndarray as Array
 from numpy.testing import assert_equal
 
 from artisan import (
-    Namespace, PersistentArray, PersistentList,
-    read_cbor_file, write_object_as_cbor)
+    Namespace, PersistentArray, PersistentList, Record,
+    read_cbor_columns, read_cbor_file, read_compact_cbor_file,
+    write_object_as_cbor)
 
 
 
@@ -117,6 +119,83 @@ def test_persistent_lists(head: list, tail: List[Tuple[str, list]]) -> None:
             assert_equal(persistent_list, standard_list)
 
 
+def test_compact_persistent_lists() -> None:
+    '''
+    Test reading lists of maps as compact records.
+    '''
+    with NamedTemporaryFile(suffix='.cbor') as f:
+        items = [Namespace(x=i, y=[Namespace(z=str(i))]) for i in range(3)]
+        write_object_as_cbor(Path(f.name), items)
+        persistent_list = read_compact_cbor_file(Path(f.name))
+        assert isinstance(persistent_list, PersistentList)
+        assert all(isinstance(item, Record) for item in persistent_list)
+        assert len({type(item) for item in persistent_list}) == 1
+        assert not hasattr(persistent_list[0], '__dict__')
+        assert persistent_list == items
+
+        persistent_list.append(persistent_list[0])
+        read_cbor_file(Path(f.name)).append(Namespace(x=3, y=[]))
+        persistent_list._refresh()
+        assert persistent_list == [*items, items[0], Namespace(x=3, y=[])]
+        assert isinstance(persistent_list[-1], Record)
+        assert read_cbor_file(Path(f.name)) == persistent_list
+
+
+def test_persistent_list_columns() -> None:
+    '''
+    Test reading lists of records column-wise via `PersistentList.columns` and
+    `read_cbor_columns`.
+    '''
+    with TemporaryDirectory() as root:
+        path = Path(root) / 'log.cbor'
+        items = [Namespace(step=i, loss=1 / (i + 1), tag='a') for i in range(4)]
+        write_object_as_cbor(path, items)
+        persistent_list = read_cbor_file(path)
+        columns = persistent_list.columns()
+        assert sorted(columns) == ['loss', 'step']
+        assert_equal(columns['step'], np.arange(4))
+        assert_equal(columns['loss'], 1 / np.arange(1, 5))
+        assert (Path(root) / '.log.columns').is_dir()
+
+        persistent_list.extend([Namespace(step=4, loss=0.0, tag='b')])
+        read_cbor_file(path).append(Namespace(step=4.5, loss=0.0))
+        columns = persistent_list.columns()
+        assert sorted(columns) == ['loss', 'step']
+        assert columns['step'].dtype == np.float64
+        assert_equal(columns['step'], [0, 1, 2, 3, 4, 4.5])
+        assert_equal(columns['loss'][-2:], [0, 0])
+
+        # Replacing the file invalidates the cache, even if its length is
+        # unchanged.
+        temp_path = Path(root) / 'log.cbor.tmp'
+        write_object_as_cbor(temp_path, [Namespace(step=-i) for i in range(6)])
+        temp_path.replace(path)
+        assert_equal(read_cbor_columns(path)['step'], -np.arange(6))
+
+        # Cached rows aren't decoded again.
+        read_cbor_file(path).append(Namespace(step=-6))
+        stat = path.stat()
+        with open(path, 'r+b') as f:
+            f.seek(9)
+            f.write(b'\xff')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert_equal(read_cbor_columns(path)['step'], -np.arange(7))
+
+        # Up-to-date lists provide their uncached items, so they aren't decoded
+        # from the file.
+        write_object_as_cbor(temp_path, [Namespace(step=-i) for i in range(7)])
+        temp_path.replace(path)
+        persistent_list = read_cbor_file(path)
+        assert_equal(persistent_list.columns()['step'], -np.arange(7))
+        persistent_list.append(Namespace(step=-7))
+        stat = path.stat()
+        with open(path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b'\xff')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert_equal(persistent_list.columns()['step'], -np.arange(8))
+
+
 @given(lists(integers(0, 8), min_size=2, max_size=4), array_shapes(), dtypes())
 def test_persistent_arrays(array_lengths: List[int],
                            elem_shape: List[int],
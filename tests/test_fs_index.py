@@ -1,9 +1,13 @@
-import json, gc, shutil
+import json, gc, os, shutil
 from pathlib import Path
-from typing import Set
+from threading import Barrier
+from typing import Any, List, Set
 from weakref import finalize
 
-from artisan._fs_index import DirIndex, TreeIndex
+import cbor2
+
+from artisan import _fs_index
+from artisan._fs_index import DirIndex, TreeIndex, dir_indices
 
 
 def test_dir_indices(tmp_path: Path) -> None:
@@ -105,3 +109,199 @@ def test_tree_indices(tmp_path: Path) -> None:
 
     del c_index; gc.collect()
     assert collected_index_names == {'a', 'b', 'c'}
+
+
+def test_parallel_artifact_search(tmp_path: Path) -> None:
+    '''
+    Test that `DirIndex.get_artifacts` finds the same artifacts, in path order,
+    regardless of the number of worker threads, without descending into
+    artifacts.
+    '''
+    expected = set()
+    for i in range(4):
+        for j in range(4):
+            (tmp_path / f'{i}/{j}/k').mkdir(parents=True)
+            if j % 2 == 0:
+                (tmp_path / f'{i}/{j}/_meta_.json').write_text(
+                    '{"spec": {}, "events": []}')
+                (tmp_path / f'{i}/{j}/k/_meta_.json').write_text(
+                    '{"spec": {}, "events": []}')
+                expected.add(tmp_path / f'{i}/{j}')
+            else:
+                (tmp_path / f'{i}/{j}/k/_meta_.json').write_text(
+                    '{"spec": {}, "events": []}')
+                expected.add(tmp_path / f'{i}/{j}/k')
+
+    root_index = DirIndex(tmp_path)
+    for max_workers in (1, 2, 16):
+        found = root_index.get_artifacts(max_workers)
+        assert [d.path for d in found] == sorted(expected)
+        found = root_index.get_artifacts(max_workers, start_after=('1', '2'))
+        assert [d.path for d in found] == sorted(
+            p for p in expected if p > tmp_path / '1/2')
+
+
+def test_walker_pool_sizing(tmp_path: Path, monkeypatch: Any) -> None:
+    '''
+    Test that `DirIndex.get_artifacts` scans `max_workers` directories at once,
+    even if `max_workers` exceeds `WALKER_THREADS`.
+    '''
+    n_workers = 2 * _fs_index.WALKER_THREADS
+    for i in range(n_workers):
+        (tmp_path / f'{i:02}').mkdir()
+        (tmp_path / f'{i:02}/_meta_.json').write_text(
+            '{"spec": {}, "events": []}')
+
+    barrier = Barrier(n_workers, timeout=10)
+    scan = DirIndex._scan
+    def scan_concurrently(self: DirIndex) -> Any:
+        if self.path != tmp_path:
+            barrier.wait()
+        return scan(self)
+    monkeypatch.setattr(DirIndex, '_scan', scan_concurrently)
+
+    found = DirIndex(tmp_path).get_artifacts(n_workers)
+    assert len(list(found)) == n_workers
+
+
+def test_nested_tree_indices(tmp_path: Path) -> None:
+    '''
+    Test that a `TreeIndex` keeps its descendants alive after an enclosing
+    `TreeIndex` is garbage-collected.
+    '''
+    (tmp_path / 'a/b/c').mkdir(parents=True)
+    (tmp_path / 'd').mkdir()
+
+    collected_index_names: Set[str] = set()
+    def finalize_dir_index(name: str) -> None:
+        collected_index_names.add(name)
+
+    outer_tree_index = TreeIndex(tmp_path)
+    inner_tree_index = TreeIndex(tmp_path / 'a/b')
+    for name in ['a', 'a/b', 'a/b/c', 'd']:
+        finalize(DirIndex(tmp_path / name), finalize_dir_index, name)
+    assert not hasattr(DirIndex(tmp_path), '__dict__')
+
+    gc.collect()
+    assert collected_index_names == set()
+
+    del outer_tree_index; gc.collect()
+    assert collected_index_names == {'d'}
+    assert DirIndex(tmp_path / 'a/b/c') in inner_tree_index.root.children
+
+    del inner_tree_index; gc.collect()
+    assert collected_index_names == {'a', 'a/b', 'a/b/c', 'd'}
+
+
+def test_tree_index_snapshots(tmp_path: Path, monkeypatch: Any) -> None:
+    '''
+    Test that `TreeIndex` snapshots restore directory listings and metadata,
+    that directories modified after a snapshot is saved are re-read, and that
+    unmodified directories are not.
+    '''
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a/_meta_.json').write_text('{"spec": {}, "events": []}')
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'b/x.txt').write_text('[x text]')
+    for path in [tmp_path / 'a', tmp_path / 'b', tmp_path]:
+        os.utime(path, (0, 0))
+
+    tree_index = TreeIndex(tmp_path)
+    assert set(tree_index.root.get_artifacts()) == {DirIndex(tmp_path / 'a')}
+    assert set(DirIndex(tmp_path / 'a').get_entry_names()) == {'_meta_'}
+    assert set(DirIndex(tmp_path / 'b').get_entry_names()) == {'x'}
+    tree_index.save_snapshot()
+    assert (tmp_path / '_index_.cbor').is_file()
+
+    del tree_index; gc.collect()
+    (tmp_path / 'b/y.txt').write_text('[y text]')
+    (tmp_path / 'a/_meta_.json').write_text('{"spec": {"k": 0}, "events": []}')
+
+    listed_paths: List[str] = []
+    def listdir(path: str) -> List[str]:
+        listed_paths.append(str(path))
+        return os.listdir(path)
+    monkeypatch.setattr(_fs_index, 'listdir', listdir)
+
+    tree_index = TreeIndex(tmp_path)
+    a_index = DirIndex(tmp_path / 'a')
+    b_index = DirIndex(tmp_path / 'b')
+    assert a_index._meta_ino != -1
+    assert b_index._ino != -1
+    assert a_index.get_meta() == {'spec': {'k': 0}, 'events': []}
+    assert set(b_index.get_entry_names()) == {'x', 'y'}
+    assert set(a_index.get_entry_names()) == {'_meta_'}
+    assert set(tree_index.root.get_entry_names()) == {'_index_', 'a', 'b'}
+    assert sorted(listed_paths) == [str(tmp_path), str(tmp_path / 'b')]
+
+
+def test_invalid_tree_index_snapshots(tmp_path: Path) -> None:
+    '''
+    Test that unreadable or invalid `TreeIndex` snapshots are ignored.
+    '''
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a/_meta_.json').write_text('{"spec": {}, "events": []}')
+    ino = (tmp_path / 'a').stat().st_ino
+    meta_ino = (tmp_path / 'a/_meta_.json').stat().st_ino
+    record = ['a', ino, 2e9, ['_meta_'], meta_ino, 2e9, None]
+    snapshots = [
+        b'\xff\x00',
+        cbor2.dumps([]),
+        cbor2.dumps({'version': 1, 'dirs': [record[:6]]}),
+        cbor2.dumps({'version': 1, 'dirs': [
+            [*record[:3], '_meta_', *record[4:]]]}),
+        cbor2.dumps({'version': 1, 'dirs': [[*record[:6], {'spec': {}}]]}),
+        cbor2.dumps({'version': 1, 'dirs': [['../a', *record[1:]]]})]
+
+    for snapshot in snapshots:
+        gc.collect()
+        (tmp_path / '_index_.cbor').write_bytes(snapshot)
+        tree_index = TreeIndex(tmp_path)
+        a_index = DirIndex(tmp_path / 'a')
+        assert set(tree_index.root.get_artifacts()) == {a_index}
+        assert a_index.get_meta() == {'spec': {}, 'events': []}
+        del tree_index, a_index
+
+
+def test_dir_index_lookup(tmp_path: Path, monkeypatch: Any) -> None:
+    '''
+    Test that `DirIndex` objects can be looked up via relative and symbolic-link
+    paths, that ancestors' indices are constructed lazily, and that the
+    filesystem root's index has no parent.
+    '''
+    (tmp_path / 'a/b/c').mkdir(parents=True)
+    (tmp_path / 'link').symlink_to(tmp_path / 'a/b')
+    monkeypatch.chdir(tmp_path / 'a')
+
+    c_index = DirIndex(tmp_path / 'a/b/c')
+    assert str(tmp_path / 'a/b') not in dir_indices
+    assert DirIndex(Path('b/c')) is c_index
+    assert DirIndex(tmp_path / 'link/c') is c_index
+
+    b_index = c_index.parent
+    assert b_index is not None
+    assert b_index.path == tmp_path / 'a/b'
+    assert set(b_index.children) == {c_index}
+    assert DirIndex(tmp_path / 'link') is b_index
+
+    fs_root_index = b_index
+    while fs_root_index.parent is not None:
+        fs_root_index = fs_root_index.parent
+    assert fs_root_index is DirIndex(Path('/'))
+    assert fs_root_index not in fs_root_index.children
+    assert TreeIndex(Path('/')).root.parent is None
+
+
+def test_dir_index_symlink_replacement(tmp_path: Path) -> None:
+    '''
+    Test that `DirIndex` lookups via a symbolic link follow the link after it's
+    replaced.
+    '''
+    (tmp_path / 'run5').mkdir()
+    (tmp_path / 'run6').mkdir()
+    (tmp_path / 'latest').symlink_to(tmp_path / 'run5')
+    assert DirIndex(tmp_path / 'latest').path == tmp_path / 'run5'
+
+    (tmp_path / 'latest.tmp').symlink_to(tmp_path / 'run6')
+    (tmp_path / 'latest.tmp').replace(tmp_path / 'latest')
+    assert DirIndex(tmp_path / 'latest').path == tmp_path / 'run6'
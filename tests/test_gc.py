@@ -0,0 +1,150 @@
+import errno, json, os, time
+from pathlib import Path
+from types import SimpleNamespace as Ns
+from typing import Any
+
+import numpy as np
+from typing_extensions import Protocol
+
+from artisan import Artifact, gc, using_context
+from artisan._gc import remove_blobs
+
+
+class Sample(Artifact):
+    _deduplicate_ = True
+
+    class Spec(Protocol):
+        fail: bool
+
+    def __init__(self, spec: Spec) -> None:
+        self.data = np.arange(2**14, dtype='f8') + spec.fail
+        if spec.fail:
+            raise RuntimeError()
+
+
+def make_stub(path: Path, pid: int, **start_info: object) -> None:
+    '''
+    Create an artifact whose build was started by the given process.
+    '''
+    path.mkdir()
+    (path / '_meta_.json').write_text(json.dumps({
+        'spec': {'type': 'Sample', 'fail': False},
+        'events': [{'type': 'Start', 'timestamp': '2020-01-01T00:00:00',
+                    'pid': pid, 'host': os.uname().nodename, **start_info}]}))
+
+
+def test_gc(tmp_path: Path) -> None:
+    '''
+    Test finding and removing failed artifacts, abandoned artifacts, orphaned
+    temporary files, and unreferenced blobs.
+    '''
+    root, archive = tmp_path / 'root', tmp_path / 'archive'
+    root.mkdir()
+    with using_context(root=root, scope={'Sample': Sample}):
+        ok = Sample(Ns(fail=False))
+        try:
+            Sample(Ns(fail=True))
+        except RuntimeError:
+            pass
+    failed = root / 'Sample_0001'
+    make_stub(root / 'abandoned', pid=2**22 + 1)
+    make_stub(root / 'running', pid=os.getpid())
+    make_stub(root / 'expired', pid=os.getpid(), lease_duration=60.0)
+    os.utime(root / 'expired' / '_meta_.json', (0, 0))
+    for path in [ok._path_ / '.x.cbor.1.tmp', ok._path_ / '.new.cbor.1.tmp',
+                 ok._path_ / 'notes.tmp', root / '.x.cbor.1.tmp']:
+        path.write_bytes(b'0' * 10)
+        if 'new' not in path.name:
+            os.utime(path, (0, 0))
+    for blob in (root / '_blobs_').glob('[!_]*'):
+        os.utime(blob, (0, 0))
+
+    report = gc(root, dry_run=True)
+    assert report.failed == [failed]
+    assert report.abandoned == [root / 'abandoned', root / 'expired']
+    assert report.temp_files == [ok._path_ / '.x.cbor.1.tmp']
+    assert report.blobs == []
+    assert report.reclaimable_bytes == 10 + sum(
+        p.stat().st_size
+        for p in [*failed.iterdir(), root / 'abandoned' / '_meta_.json',
+                  root / 'expired' / '_meta_.json']
+        if p.stat().st_nlink == 1)
+    assert failed.exists()
+
+    report = gc(root, archive=archive)
+    assert not failed.exists() and (archive / 'Sample_0001').exists()
+    assert not (root / 'abandoned').exists()
+    assert not (root / 'expired').exists()
+    assert (root / 'running').exists()
+    assert not (ok._path_ / '.x.cbor.1.tmp').exists()
+    assert (ok._path_ / '.new.cbor.1.tmp').exists()
+    assert (ok._path_ / 'notes.tmp').exists()
+    assert (root / '.x.cbor.1.tmp').exists()
+
+    # The failed artifact's blob is now only referenced from the archive.
+    (archive / 'Sample_0001' / 'data.cbor').unlink()
+    report = gc(root)
+    assert len(report.blobs) == 1
+    assert len(list((root / '_blobs_').glob('[!_]*'))) == 1
+    assert (ok._path_ / 'data.cbor').stat().st_nlink == 2
+
+
+def test_gc_with_symbolic_links(tmp_path: Path, monkeypatch: Any) -> None:
+    '''
+    Test that blobs linked via symbolic links outside of the root directory are
+    kept, and that archived artifacts get copies of the blobs they link to.
+    '''
+    def link(src: object, dst: object) -> None:
+        raise OSError(errno.EXDEV, 'Hard links are not supported.')
+
+    monkeypatch.setattr(os, 'link', link)
+    root, archive = tmp_path / 'root', tmp_path / 'archive'
+    root.mkdir()
+    with using_context(root=root, scope={'Sample': Sample}):
+        ok = Sample(Ns(fail=False))
+        external = Sample(Ns(fail=False, _path_=tmp_path / 'external'))
+        try:
+            Sample(Ns(fail=True))
+        except RuntimeError:
+            pass
+    failed = root / 'Sample_0001'
+    assert (ok._path_ / 'data.cbor').is_symlink()
+    assert (external._path_ / 'data.cbor').is_symlink()
+    blobs = list((root / '_blobs_').glob('[!_]*'))
+    for blob in blobs:
+        os.utime(blob, (0, 0))
+
+    (ok._path_ / 'data.cbor').unlink()
+    report = gc(root, archive=archive)
+    assert report.failed == [failed]
+    assert len(report.blobs) == 1
+    assert (external._path_ / 'data.cbor').read_bytes()
+    archived_data = archive / 'Sample_0001' / 'data.cbor'
+    assert not archived_data.is_symlink()
+    assert len(archived_data.read_bytes()) > 2**17
+
+    (external._path_ / 'data.cbor').unlink()
+    report = gc(root)
+    assert len(report.blobs) == 1
+    assert list((root / '_blobs_').glob('[!_]*')) == []
+    assert list((root / '_blobs_' / '_links_').iterdir()) == []
+
+
+def test_gc_with_reused_blobs(tmp_path: Path) -> None:
+    '''
+    Test that blobs reused after `gc` finds them are not removed.
+    '''
+    with using_context(root=tmp_path, scope={'Sample': Sample}):
+        ok = Sample(Ns(fail=False))
+        (ok._path_ / 'data.cbor').unlink()
+        blob, = (tmp_path / '_blobs_').glob('[!_]*')
+        os.utime(blob, (0, 0))
+        found = gc(tmp_path, dry_run=True).blobs
+        assert found == [blob]
+
+        # Reusing the blob refreshes its modification time.
+        copy = Sample(Ns(fail=False, _path_=tmp_path / 'copy'))
+        (copy._path_ / 'data.cbor').unlink()
+        assert blob.stat().st_mtime > time.time() - 60
+        assert remove_blobs(tmp_path / '_blobs_', found, time.time() - 60) == []
+        assert blob.exists()
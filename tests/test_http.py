@@ -1,17 +1,25 @@
-import json
+import asyncio, json, time, zlib
 from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
 from os import listdir
 from pathlib import Path
-from typing import Optional
+from threading import Event, Thread
+from typing import Any, List, Optional, Tuple
 from typing_extensions import Protocol
+from wsgiref.util import FileWrapper
 
 import cbor2
+import numpy as np
 from webtest import TestApp as Client
 
 from artisan import (
-    API, Artifact, Context, Namespace,
+    API, Artifact, AsyncAPI, Context, Namespace,
     get_spec_schema, get_spec_dict_schema,
     get_spec_list_schema, using_context)
+from artisan import _http
+from artisan._artifacts import default_builder
+from artisan._cbor_io import read_cbor_file, write_object_as_cbor
+from artisan._http import EVENT_STREAM_DURATION, dir_watchers
 
 
 
@@ -53,6 +61,18 @@ def sample_context(root: Path) -> Context:
 
 
 
+def wait_for_build(path: str) -> Artifact:
+    '''
+    Wait for a build requested via the API to finish, and return the artifact.
+    '''
+    artifact = Artifact @ path
+    while not any(e.type in ('Success', 'Failure')
+                  for e in artifact._meta_.events):
+        time.sleep(0.01)
+    return artifact
+
+
+
 #-- Tests ----------------------------------------------------------------------
 
 def test_schema_requests(tmp_path: Path) -> None:
@@ -65,6 +85,12 @@ def test_schema_requests(tmp_path: Path) -> None:
         assert get('/schemas/spec-list').json == get_spec_list_schema()
         assert get('/schemas/spec-dict').json == get_spec_dict_schema()
 
+        res = get('/schemas/spec', headers={'Accept': 'application/cbor'})
+        assert cbor2.loads(res.body) == get_spec_schema()
+        etag = get('/schemas/spec').headers['ETag']
+        get('/schemas/spec', headers={'If-None-Match': etag}, status=304)
+        assert res.headers['ETag'] != etag
+
 
 def test_artifact_get_requests(tmp_path: Path) -> None:
     '''
@@ -97,13 +123,13 @@ def test_artifact_post_requests(tmp_path: Path) -> None:
         z_spec = cbor2.dumps(dict(type='Leaf1', arg=2, _path_='@/z'))
         z_res = post('/artifacts', z_spec, status=201)
         assert z_res.location == '/artifacts/z'
-        assert (Artifact @ '@/z')._meta_.spec.type == 'Leaf1'
+        assert wait_for_build('@/z')._meta_.spec.type == 'Leaf1'
         assert (Artifact @ '@/z')._meta_.events[-1].type == 'Success'
 
         anon_spec = cbor2.dumps(dict(type='Leaf2', arg=3.0))
         anon_res = post('/artifacts', anon_spec, status=201)
         anon_path = anon_res.location.replace('/artifacts', '@/')
-        anon_meta = (Artifact @ anon_path)._meta_
+        anon_meta = wait_for_build(anon_path)._meta_
         assert anon_meta.spec.type == 'Leaf2'
         assert anon_meta.events[-1].type == 'Success'
 
@@ -154,3 +180,439 @@ def test_permissions(tmp_path: Path) -> None:
         delete('/artifacts/x', headers=headers['bob'], status=401)
         delete('/artifacts/x', headers=headers['carl'], status=204)
 
+
+
+def test_asgi_requests(tmp_path: Path) -> None:
+    '''
+    Test requests made through the ASGI interface.
+    '''
+    async def request(api: AsyncAPI, method: str, path: str, body: bytes = b''
+                      ) -> Tuple[int, dict, bytes]:
+        scope = dict(type='http', method=method, path=path, headers=[])
+        received = [dict(type='http.request', body=body[:5], more_body=True),
+                    dict(type='http.request', body=body[5:])]
+        sent: List[dict] = []
+        async def receive() -> dict: return received.pop(0)
+        async def send(message: dict) -> None: sent.append(message)
+        await api(scope, receive, send)
+        assert sent[0]['type'] == 'http.response.start'
+        assert not sent[-1].get('more_body', False)
+        return (sent[0]['status'], dict(sent[0]['headers']),
+                b''.join(m['body'] for m in sent[1:]))
+
+    with using_context(sample_context(tmp_path)):
+        api = AsyncAPI()
+        status, _, x_a_res = asyncio.run(request(api, 'GET', '/artifacts/x/a'))
+        assert status == 200
+        assert x_a_res == (tmp_path / 'x/a.cbor').read_bytes()
+
+        z_spec = cbor2.dumps(dict(type='Leaf1', arg=2, _path_='@/z'))
+        status, headers, _ = asyncio.run(
+            request(api, 'POST', '/artifacts', z_spec))
+        assert status == 201
+        assert headers[b'location'] == b'/artifacts/z'
+        assert wait_for_build('@/z')._meta_.events[-1].type == 'Success'
+
+        status, _, _ = asyncio.run(request(api, 'GET', '/nonexistent'))
+        assert status == 404
+
+
+def test_streamed_file_requests(tmp_path: Path) -> None:
+    '''
+    Test that large files are streamed in bounded chunks.
+    '''
+    with using_context(sample_context(tmp_path)):
+        content = bytes(range(256)) * 4096
+        (tmp_path / 'x/c.bin').write_bytes(content)
+        app = API()
+        env = dict(REQUEST_METHOD='GET', PATH_INFO='/artifacts/x/c')
+        chunks = list(app(env, lambda status, headers: None))
+        assert b''.join(chunks) == content
+        assert max(map(len, chunks)) < len(content)
+
+        for extra_environ in [{}, {'wsgi.file_wrapper': FileWrapper}]:
+            get = Client(app, extra_environ=extra_environ).get
+            assert get('/artifacts/x/c').body == content
+            res = get('/artifacts/x/c', headers={'Range': 'bytes=1000-'})
+            assert res.body == content[1000:]
+
+
+def test_range_requests(tmp_path: Path) -> None:
+    '''
+    Test file requests with a "Range" header.
+    '''
+    with using_context(sample_context(tmp_path)):
+        content = bytes(range(256)) * 4
+        (tmp_path / 'x/c.bin').write_bytes(content)
+        client = Client(API())
+        def get(range_: str, status: int = 206) -> Any:
+            return client.get('/artifacts/x/c', headers={'Range': range_},
+                              status=status)
+
+        res = client.get('/artifacts/x/c', status=200)
+        assert res.headers['Accept-Ranges'] == 'bytes'
+        assert res.body == content
+
+        res = get('bytes=100-199')
+        assert res.headers['Content-Range'] == 'bytes 100-199/1024'
+        assert res.body == content[100:200]
+        assert get('bytes=-24').body == content[-24:]
+        assert get('bytes=1000-').body == content[1000:]
+        assert get('bytes=1000-5000').body == content[1000:]
+        assert get('bytes=2000-', status=416).headers['Content-Range'] \
+            == 'bytes */1024'
+        assert get('bytes=5-2', status=200).body == content
+
+        res = get('bytes=0-9, 500-509, -4')
+        boundary = res.content_type_params['boundary']
+        parts = res.body.split(f'--{boundary}'.encode())
+        assert len(res.body) == int(res.headers['Content-Length'])
+        assert res.content_type == 'multipart/byteranges'
+        assert parts[-1] == b'--\r\n'
+        for part, (start, end) in zip(parts[1:-1], [(0, 10), (500, 510),
+                                                      (1020, 1024)]):
+            part_header, part_body = part.split(b'\r\n\r\n')
+            assert f'bytes {start}-{end-1}/1024'.encode() in part_header
+            assert part_body == content[start:end] + b'\r\n'
+
+        # Overlapping and adjacent ranges are merged.
+        res = get('bytes=500-509, 0-9, 5-19, 20-29')
+        boundary = res.content_type_params['boundary']
+        parts = res.body.split(f'--{boundary}'.encode())
+        assert len(parts) == 4
+        assert b'bytes 0-29/1024' in parts[1]
+        assert b'bytes 500-509/1024' in parts[2]
+        res = get('bytes=0-99, 50-149')
+        assert res.headers['Content-Range'] == 'bytes 0-149/1024'
+        assert res.body == content[:150]
+
+        # Headers with too many ranges are ignored.
+        many_ranges = ', '.join(f'{2*i}-{2*i}' for i in range(100))
+        assert get(f'bytes={many_ranges}', status=200).body == content
+
+        res = client.head('/artifacts/x/c', status=200)
+        assert res.headers['Content-Length'] == '1024'
+
+
+def test_array_slice_requests(tmp_path: Path) -> None:
+    '''
+    Test requests in the form `GET /artifacts{/path*}?slice={index}`.
+    '''
+    with using_context(sample_context(tmp_path)):
+        array = np.arange(300 * 4 * 5, dtype='f4').reshape(300, 4, 5)
+        write_object_as_cbor(tmp_path / 'x/c.cbor', array)
+        get = Client(API()).get
+
+        for index_str, index in [
+                ('100:200,::2', np.s_[100:200, ::2]),
+                ('-1', np.s_[-1]),
+                ('::-7, 1, 2:', np.s_[::-7, 1, 2:]),
+                ('0,0,0', np.s_[0, 0, 0]),
+                ('5:5', np.s_[5:5])]:
+            res = get(f'/artifacts/x/c?slice={index_str}')
+            (tmp_path / 'res.cbor').write_bytes(res.body)
+            res_array = read_cbor_file(tmp_path / 'res.cbor')
+            assert np.array_equal(res_array, array[index])
+            assert len(res.body) == int(res.headers['Content-Length'])
+
+        # Slices are revalidated using their own entity tags.
+        res = get('/artifacts/x/c?slice=-1')
+        file_etag = get('/artifacts/x/c').headers['ETag']
+        assert res.headers['ETag'] != file_etag
+        headers = {'If-None-Match': res.headers['ETag']}
+        get('/artifacts/x/c?slice=-1', headers=headers, status=304)
+        get('/artifacts/x/c?slice=0', headers=headers, status=200)
+        get('/artifacts/x/c?slice=-1', status=200,
+            headers={'If-None-Match': file_etag})
+
+        get('/artifacts/x/c?slice=1:2:3:4', status=400)
+        get('/artifacts/x/c?slice=a', status=400)
+        get('/artifacts/x/c?slice=0,0,0,0', status=400)
+        get('/artifacts/x/a?slice=0', status=400)
+
+
+def test_conditional_requests(tmp_path: Path) -> None:
+    '''
+    Test entity tags, "If-None-Match" headers, and caching policies.
+    '''
+    with using_context(sample_context(tmp_path)):
+        get = Client(API()).get
+
+        x_res = get('/artifacts/x', status=200)
+        x_a_res = get('/artifacts/x/a', status=200)
+        x_meta_res = get('/artifacts/x/_meta_', status=200)
+        assert x_a_res.headers['Cache-Control'] == 'no-cache'
+        assert x_meta_res.headers['Cache-Control'] == 'no-cache'
+        assert x_res.headers['Cache-Control'] == 'no-cache'
+
+        # Only versioned URLs are cached indefinitely.
+        version = x_a_res.headers['ETag'][1:-1]
+        res = get(f'/artifacts/x/a?v={version}', status=200)
+        assert 'immutable' in res.headers['Cache-Control']
+        res = get('/artifacts/x/a?v=0', status=200)
+        assert res.headers['Cache-Control'] == 'no-cache'
+        version = x_meta_res.headers['ETag'][1:-1]
+        res = get(f'/artifacts/x/_meta_?v={version}', status=200)
+        assert res.headers['Cache-Control'] == 'no-cache'
+
+        for res, url in [(x_res, '/artifacts/x'), (x_a_res, '/artifacts/x/a')]:
+            etag = res.headers['ETag']
+            get(url, headers={'If-None-Match': etag}, status=304)
+            get(url, headers={'If-None-Match': f'"0", {etag}'}, status=304)
+            get(url, headers={'If-None-Match': '"0"'}, status=200)
+
+        (tmp_path / 'x/c.bin').write_bytes(b'abc')
+        get('/artifacts/x', headers={'If-None-Match': x_res.headers['ETag']},
+            status=200)
+
+
+def test_event_requests(tmp_path: Path) -> None:
+    '''
+    Test requests in the form `GET /events?path={path}`.
+    '''
+    with using_context(sample_context(tmp_path)):
+        api = API()
+        env = dict(REQUEST_METHOD='GET', PATH_INFO='/events',
+                   QUERY_STRING='path=x&timeout=3')
+        stream = iter(api(env, lambda status, headers: None))
+        assert next(stream) == b'retry: 1000\n\n'
+        other_stream = iter(api(env, lambda status, headers: None))
+        assert next(other_stream) == b'retry: 1000\n\n'
+        watcher, = dir_watchers.values()
+        assert watcher.n_streams == 2
+
+        def modify_artifact() -> None:
+            time.sleep(0.5)
+            (tmp_path / 'x/c.bin').write_bytes(b'abc')
+            (tmp_path / 'x/b.cbor').unlink()
+            with open(tmp_path / 'x/a.cbor', 'ab') as f:
+                f.write(b'\0')
+        other_chunks: List[bytes] = []
+        threads = [Thread(target=modify_artifact),
+                   Thread(target=lambda: other_chunks.extend(other_stream))]
+        for thread in threads:
+            thread.start()
+        events = b''.join(stream).decode().strip().split('\n\n')
+        for thread in threads:
+            thread.join()
+        other_events = b''.join(other_chunks).decode().strip().split('\n\n')
+
+        assert sorted(events) == sorted(other_events) == [
+            'event: added\ndata: {"path": "/artifacts/x/c"}',
+            'event: changed\ndata: {"path": "/artifacts/x/a"}',
+            'event: removed\ndata: {"path": "/artifacts/x/b"}']
+        time.sleep(0.5)
+        assert dir_watchers == {}
+
+        for query, timeout in [('', EVENT_STREAM_DURATION),
+                               ('&timeout=inf', EVENT_STREAM_DURATION),
+                               ('&timeout=1', 1.0)]:
+            env['QUERY_STRING'] = f'path=x{query}'
+            _, _, body = api._request_handlers['/events'] \
+                ._handle_get_request(env)
+            assert body._timeout == timeout
+        get = Client(api).get
+        get('/events?path=nonexistent', status=404)
+        get('/events?path=../..', status=403)
+
+
+def test_asgi_event_requests(tmp_path: Path) -> None:
+    '''
+    Test that event streams served through the ASGI interface don't occupy
+    executor threads.
+    '''
+    async def request(api: AsyncAPI, path: str, query: bytes = b'') -> bytes:
+        scope = dict(type='http', method='GET', path=path,
+                     query_string=query, headers=[])
+        sent: List[dict] = []
+        async def receive() -> dict: return dict(type='http.request')
+        async def send(message: dict) -> None: sent.append(message)
+        await api(scope, receive, send)
+        return b''.join(m['body'] for m in sent[1:])
+
+    async def run_requests(api: AsyncAPI) -> Tuple[float, List[bytes]]:
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(2))
+        streams = [
+            asyncio.ensure_future(request(api, '/events', b'path=x&timeout=2'))
+            for _ in range(4)]
+        await asyncio.sleep(0.5)
+        start_time = time.monotonic()
+        await request(api, '/status')
+        status_time = time.monotonic() - start_time
+        (tmp_path / 'x/c.bin').write_bytes(b'abc')
+        return status_time, await asyncio.gather(*streams)
+
+    with using_context(sample_context(tmp_path)):
+        status_time, bodies = asyncio.run(run_requests(AsyncAPI()))
+        assert status_time < 0.5
+        assert bodies == 4 * [
+            b'retry: 1000\n\n'
+            b'event: added\ndata: {"path": "/artifacts/x/c"}\n\n']
+
+
+def test_batch_requests(tmp_path: Path, monkeypatch: Any) -> None:
+    '''
+    Test artifact listings and requests in the form
+    `POST /artifacts/_batch/get`.
+    '''
+    permissions = {'': ('read',)}
+    with using_context(sample_context(tmp_path)):
+        for i in range(5):
+            Artifact(Namespace(_path_=f'@/z/{i}', type='Leaf1', arg=i))
+        client = Client(API(permissions=permissions))
+
+        res = client.get('/artifacts?limit=3')
+        page = cbor2.loads(res.body)
+        assert list(page['artifacts']) == ['x', 'y', 'z/0']
+        assert page['artifacts']['x']['spec']['type'] == 'Leaf1'
+        res = client.get(f'/artifacts?limit=3&cursor={page["cursor"]}')
+        page = cbor2.loads(res.body)
+        assert list(page['artifacts']) == ['z/1', 'z/2', 'z/3']
+        res = client.get(f'/artifacts?limit=3&cursor={page["cursor"]}')
+        z4_meta = json.loads((tmp_path / 'z/4/_meta_.json').read_text())
+        assert cbor2.loads(res.body) == dict(
+            artifacts={'z/4': z4_meta}, cursor=None)
+        res = client.get('/artifacts?type=Leaf2')
+        assert list(cbor2.loads(res.body)['artifacts']) == ['y']
+        client.get('/artifacts?limit=0', status=400)
+
+        req_body = cbor2.dumps(dict(paths=['x', 'z/4', 'w'], fields=['a']))
+        res = client.post('/artifacts/_batch/get', req_body, status=200)
+        entries = cbor2.loads(res.body)
+        assert entries['w'] is None
+        assert entries['x']['_meta_']['spec']['type'] == 'Leaf1'
+        assert entries['x']['b'] is None
+        assert cbor2.loads(entries['x']['a'].value) is False
+        assert cbor2.loads(entries['z/4']['a'].value) is True
+        client.post('/artifacts', req_body, status=401)
+        client.post('/artifacts/_batch/get', b'', status=400)
+
+        # Paths outside the root directory only fail their own entries.
+        req_body = cbor2.dumps(dict(paths=['x', '..'], fields=['a']))
+        res = client.post('/artifacts/_batch/get', req_body, status=200)
+        entries = cbor2.loads(res.body)
+        assert entries['..'] == {'_error_': '403 Forbidden'}
+        assert cbor2.loads(entries['x']['a'].value) is False
+        req_body = cbor2.dumps(dict(paths=['x', 'x/a/b'], fields=['a']))
+        res = client.post('/artifacts/_batch/get', req_body, status=200)
+        entries = cbor2.loads(res.body)
+        assert entries['x/a/b'] is None
+        assert cbor2.loads(entries['x']['a'].value) is False
+
+        # Paths and field names must be strings.
+        for req in [dict(paths=[['x']]), dict(paths=['x'], fields=[0])]:
+            client.post('/artifacts/_batch/get', cbor2.dumps(req), status=400)
+
+        # Items appended after a list's header was written aren't included.
+        (tmp_path / 'x/c.cbor').write_bytes(
+            cbor2.dumps([1]) + cbor2.dumps(2))
+        req_body = cbor2.dumps(dict(paths=['x'], fields=['c']))
+        res = client.post('/artifacts/_batch/get', req_body, status=200)
+        assert cbor2.loads(res.body)['x']['c'].value == cbor2.dumps([1])
+
+        # Large fields are represented by their URIs.
+        monkeypatch.setattr(_http, 'BATCH_INLINE_SIZE', 0)
+        req_body = cbor2.dumps(dict(paths=['z/4'], fields=['a']))
+        res = client.post('/artifacts/_batch/get', req_body, status=200)
+        uri = cbor2.loads(res.body)['z/4']['a']
+        assert uri.startswith('/artifacts/z/4/a?v=')
+        res = client.get(uri, status=200)
+        assert 'immutable' in res.headers['Cache-Control']
+
+
+def test_compressed_requests(tmp_path: Path) -> None:
+    '''
+    Test response compression.
+    '''
+    def get(api: API, path: str, method: str = 'GET', **headers: str
+            ) -> Tuple[str, dict, bytes]:
+        path, _, query = path.partition('?')
+        env = dict(REQUEST_METHOD=method, PATH_INFO=path, QUERY_STRING=query,
+                   **{f'HTTP_{k.upper()}': v for k, v in headers.items()})
+        res_start: list = []
+        body = b''.join(api(env, lambda *args: res_start.extend(args)))
+        return res_start[0], dict(res_start[1]), body
+
+    with using_context(sample_context(tmp_path)):
+        write_object_as_cbor(
+            tmp_path / 'x/c.cbor',
+            [dict(index=i, label='abc') for i in range(1000)])
+        content = (tmp_path / 'x/c.cbor').read_bytes()
+        api = API()
+        _, headers, _ = get(api, '/artifacts/x/c')
+        c_url = f'/artifacts/x/c?v={headers["ETag"][1:-1]}'
+
+        for encoding, decompress in [
+                ('gzip', lambda b: zlib.decompress(b, 31)),
+                ('deflate', zlib.decompress)]:
+            for _ in range(2): # To test caching
+                status, headers, body = get(
+                    api, c_url, accept_encoding=f'{encoding}, br;q=0')
+                assert headers['Content-Encoding'] == encoding
+                assert headers['Vary'] == 'Accept-Encoding'
+                assert headers['ETag'].endswith(f'-{encoding}"')
+                assert int(headers['Content-Length']) == len(body)
+                assert len(body) < len(content)
+                assert decompress(body) == content
+            status, headers_304, _ = get(
+                api, c_url, accept_encoding=encoding,
+                if_none_match=headers['ETag'])
+            assert status == '304 Not Modified'
+            assert headers_304['ETag'] == headers['ETag']
+            assert headers_304['Vary'] == 'Accept-Encoding'
+
+        # `HEAD` responses have the headers of the `GET` responses.
+        for url in [c_url, '/artifacts/x/c', '/artifacts/x']:
+            _, get_headers, _ = get(api, url, accept_encoding='gzip')
+            _, head_headers, body = get(
+                api, url, method='HEAD', accept_encoding='gzip')
+            assert head_headers == get_headers
+            assert body == b''
+
+        for accept_encoding in ['identity', 'gzip;q=0', '']:
+            _, headers, body = get(api, '/artifacts/x/c',
+                                   accept_encoding=accept_encoding)
+            assert 'Content-Encoding' not in headers
+            assert body == content
+
+        _, headers, _ = get(api, '/artifacts/x/a', accept_encoding='gzip')
+        assert 'Content-Encoding' not in headers
+
+
+def test_bounded_builds(tmp_path: Path) -> None:
+    '''
+    Test that POST-triggered builds are queued in a bounded worker pool.
+    '''
+    release_builds = Event()
+    def blocking_builder(artifact: Artifact, spec: object) -> None:
+        release_builds.wait()
+        default_builder(artifact, spec)
+
+    with using_context(sample_context(tmp_path)):
+        client = Client(API(builder=blocking_builder,
+                            build_workers=1, build_queue_size=1))
+        specs = [cbor2.dumps(dict(type='Leaf1', arg=i, _path_=f'@/z{i}'))
+                 for i in range(3)]
+
+        client.post('/artifacts', specs[0], status=201)
+        client.post('/artifacts', specs[1], status=201)
+        res = client.post('/artifacts', specs[2], status=503)
+        assert res.headers['Retry-After'] == '1'
+        status = client.get('/status').json['builds']
+        assert status['queued'] + status['running'] == 2
+        assert status['max_workers'] == status['max_queue_size'] == 1
+        queued_meta = json.loads((tmp_path / 'z1/_meta_.json').read_text())
+        assert [e['type'] for e in queued_meta['events']] == ['Queued']
+        assert (tmp_path / 'z1/_lease_').exists()
+
+        release_builds.set()
+        wait_for_build('@/z0'), wait_for_build('@/z1')
+        built_meta = json.loads((tmp_path / 'z1/_meta_.json').read_text())
+        assert ([e['type'] for e in built_meta['events']]
+                == ['Queued', 'Start', 'Success'])
+        while client.get('/status').json['builds']['running'] > 0:
+            time.sleep(0.01)
+        assert not (tmp_path / 'z1/_lease_').exists()
+        client.post('/artifacts', specs[2], status=201)
+        assert wait_for_build('@/z2')._meta_.events[-1].type == 'Success'
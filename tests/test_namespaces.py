@@ -1,8 +1,11 @@
+import pickle, sys
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from typing import Any
 
-from artisan import Namespace
+import pytest
+
+from artisan import Namespace, Record
 from artisan._namespaces import namespacify, dictify
 
 
@@ -143,3 +146,67 @@ def test_artifact_encoding(tmp_path: Path) -> None:
     assert namespacify('@/x/y.ext', decode_path) == path
     assert namespacify(['@/x/y.ext'], decode_path) == [path]
     assert namespacify({'a': '@/x/y.ext'}, decode_path) == Namespace(a=path)
+
+
+def test_json_compatibility_with_deep_nesting() -> None:
+    '''
+    Test that `dictify` and `namespacify` handle objects nested more deeply than
+    the recursion limit.
+    '''
+    depth = 2 * sys.getrecursionlimit()
+    dict_: Any = {'leaf': (0, '1')}
+    for _ in range(depth):
+        dict_ = {'child': [dict_]}
+
+    ns = namespacify(dict_)
+    for _ in range(depth):
+        ns = ns.child[0]
+    assert ns == Namespace(leaf=[0, '1'])
+
+    dict_ = dictify(namespacify(dict_))
+    for _ in range(depth):
+        dict_ = dict_['child'][0]
+    assert dict_ == {'leaf': [0, '1']}
+
+
+def test_cyclic_objects() -> None:
+    '''
+    Test that `dictify` and `namespacify` reject objects that contain
+    themselves, but accept objects that contain the same object more than once.
+    '''
+    list_: Any = []
+    list_.append(list_)
+    dict_: Any = {'a': [{}]}
+    dict_['a'][0]['b'] = dict_
+    ns = Namespace(a=1)
+    ns.b = Namespace(c=[ns])
+    for obj in [list_, dict_, ns]:
+        with pytest.raises(ValueError):
+            dictify(obj)
+    for obj in [list_, dict_]:
+        for compact in [False, True]:
+            with pytest.raises(ValueError):
+                namespacify(obj, compact=compact)
+
+    shared = {'x': [1, 2]}
+    assert dictify([shared, Namespace(y=shared)]) == [shared, {'y': shared}]
+    assert namespacify([shared, shared]) == 2 * [Namespace(x=[1, 2])]
+
+
+def test_compact_records() -> None:
+    '''
+    Test converting mappings to records with `namespacify`.
+    '''
+    dict_ = {'a': [{'b': 0, 'c': 1}, {'b': 2, 'c': 3}], 'd': {'1': 4}}
+    ns = namespacify(dict_)
+    rec = namespacify(dict_, compact=True)
+
+    assert isinstance(rec, Record)
+    assert isinstance(rec.a[0], Record)
+    assert type(rec.a[0]) is type(rec.a[1])
+    assert isinstance(rec.d, Namespace) # "1" isn't an identifier.
+    assert rec == ns and ns == rec
+    assert repr(rec) == (
+        'Record(a=[Record(b=0, c=1), Record(b=2, c=3)], d=Namespace(1=4))')
+    assert dictify(rec) == dict_
+    assert pickle.loads(pickle.dumps(rec)) == rec
@@ -1,9 +1,17 @@
+import gc, linecache, sys
+from importlib import import_module
+from pathlib import Path
+from textwrap import dedent
 from typing import List, Optional, Union
 from typing_extensions import Literal, Protocol
+from weakref import ref
 
 from artisan import (
-    Artifact, DynamicArtifact, Namespace, Target,
+    Artifact, DynamicArtifact, Namespace, Target, cache_spec_annotations,
     get_spec_dict_schema, get_spec_list_schema, get_spec_schema, using_context)
+from artisan._schemas import (
+    literal_annotation_cache, literal_annotations, module_literal_annotations,
+    schema_cache)
 
 
 
@@ -707,3 +715,87 @@ def ndarray_schema() -> dict:
             {'cborType': 'bstr'}
         ]
     }
+
+
+def test_schema_caching() -> None:
+    '''
+    Test that schemas are cached per scope, and invalidated when target types
+    are defined.
+    '''
+    class Branch_v5(Artifact): pass
+    class Leaf1_v5(Branch_v5): pass
+
+    with using_context(scope=dict(Branch=Branch_v5, Leaf1=Leaf1_v5)):
+        schema = get_spec_schema()
+        assert get_spec_schema() == schema
+        assert get_spec_schema() is not schema
+        schema['$defs'].clear()
+        assert get_spec_schema()['$defs'] != {}
+        assert 'Leaf1' in get_spec_list_schema()['$defs']
+        assert 'Leaf1' in get_spec_dict_schema()['$defs']
+
+        assert 'oneOf' not in get_spec_schema()['$defs']['Leaf1']
+        class Leaf2_v5(Leaf1_v5): pass
+        assert 'oneOf' in get_spec_schema()['$defs']['Leaf1']
+
+    with using_context(scope=dict(Leaf1=Leaf1_v5)):
+        assert list(get_spec_schema()['$defs']) == [
+            'Leaf1', '__PathString::Leaf1']
+
+
+def test_literal_annotation_caching() -> None:
+    '''
+    Test that memoized literal annotations don't keep classes alive.
+    '''
+    class Leaf_v43(Artifact):
+        class Spec(Protocol):
+            x: int; '''[x description]'''
+
+    anns = literal_annotations(Leaf_v43, 'Spec')
+    assert anns == [('x', '[x description]')]
+    assert literal_annotations(Leaf_v43, 'Spec') is anns
+    leaf_ref = ref(Leaf_v43)
+    del Leaf_v43
+    gc.collect()
+    assert leaf_ref() is None
+
+
+def test_spec_annotation_caching(tmp_path: Path) -> None:
+    '''
+    Test that literal annotations recorded by `cache_spec_annotations` are used
+    when source code is unavailable, and that they describe the last definition
+    of each class.
+    '''
+    (tmp_path / 'spec_module_v6.py').write_text(dedent('''
+        from artisan import Artifact
+
+        class Leaf_v6(Artifact):
+            class Spec:
+                x: int = 0; '[outdated x description]'
+
+        class Leaf_v6(Artifact):
+            class Spec:
+                x: int = 0; '[x description]'
+    '''))
+    sys.path.insert(0, str(tmp_path))
+    try:
+        module = import_module('spec_module_v6')
+        cache_spec_annotations('spec_module_v6')
+        assert (tmp_path / '_spec_annotations_.json').is_file()
+
+        def get_x_schema() -> dict:
+            linecache.clearcache()
+            schema_cache.clear()
+            literal_annotation_cache.clear()
+            module_literal_annotations.cache_clear()
+            with using_context(scope=dict(Leaf=module.Leaf_v6)):
+                return get_spec_schema()['$defs']['Leaf']['properties']['x']
+
+        assert get_x_schema()['description'] == '[x description]'
+        (tmp_path / 'spec_module_v6.py').unlink()
+        assert get_x_schema()['description'] == '[x description]'
+        (tmp_path / '_spec_annotations_.json').unlink()
+        assert 'description' not in get_x_schema()
+    finally:
+        sys.path.remove(str(tmp_path))
+        sys.modules.pop('spec_module_v6', None)
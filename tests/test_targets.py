@@ -1,9 +1,10 @@
+import gc
 from types import SimpleNamespace as Ns
 from typing import Type
 from typing_extensions import Protocol
 
 from artisan import Target
-from artisan._targets import active_scope
+from artisan._targets import TargetTypeRegistry, active_scope, get_type_names
 
 
 def test_spec_class_generation() -> None:
@@ -56,6 +57,38 @@ def test_default_scope() -> None:
     assert active_scope.get()['ChildB (y)'] == ChildB_y
 
 
+def test_incremental_registry_updates() -> None:
+    '''
+    Test that defining and deleting target types updates only the affected
+    entries of the default target scope.
+    '''
+    scope = active_scope.get()
+    Solo: Type[Target] = type('Solo_v43', (Target,), {})
+    Dup_x: Type[Target] = type('Dup_v43', (Target,), {'__module__': 'x'})
+    assert scope['Dup_v43'] is Dup_x
+    Dup_y: Type[Target] = type('Dup_v43', (Target,), {'__module__': 'y'})
+    assert 'Dup_v43' not in scope
+    assert scope['Dup_v43 (x)'] is Dup_x
+    assert scope['Dup_v43 (y)'] is Dup_y
+
+    del Dup_x
+    gc.collect()
+    assert scope['Dup_v43'] is Dup_y
+    assert 'Dup_v43 (x)' not in scope
+    assert 'Dup_v43 (y)' not in scope
+    assert scope['Solo_v43'] is Solo
+
+    snapshot = TargetTypeRegistry.snapshot()
+    assert type(snapshot) is dict
+    assert snapshot == dict(scope)
+
+    # Redefinitions in the same module shadow earlier definitions.
+    Solo_2: Type[Target] = type('Solo_v43', (Target,), {})
+    assert scope['Solo_v43'] is Solo_2
+    assert get_type_names(scope)[Solo_2] == 'Solo_v43'
+    assert Solo not in get_type_names(scope)
+
+
 def test_subclass_forwarding_with_custom_scopes() -> None:
     '''
     Test target type name rebinding.
@@ -72,6 +105,35 @@ def test_subclass_forwarding_with_custom_scopes() -> None:
         active_scope.reset(token)
 
 
+def test_reverse_type_name_lookup() -> None:
+    '''
+    Test that type names are looked up via indices that track scope changes.
+    '''
+    ChildA: Type[Target] = type('Solo_v42', (Target,), {})
+    ChildB_x: Type[Target] = type('Dup_v42', (Target,), {'__module__': 'x'})
+    assert get_type_names(active_scope.get())[ChildA] == 'Solo_v42'
+    assert get_type_names(active_scope.get())[ChildB_x] == 'Dup_v42'
+    ChildB_y: Type[Target] = type('Dup_v42', (Target,), {'__module__': 'y'})
+    assert get_type_names(active_scope.get())[ChildB_x] == 'Dup_v42 (x)'
+    assert get_type_names(active_scope.get())[ChildB_y] == 'Dup_v42 (y)'
+
+    scope = dict(B=ChildA, C=ChildB_x)
+    assert get_type_names(scope)[ChildA] == 'B'
+    scope['A'] = ChildA
+    assert get_type_names(scope)[ChildA] == 'A'
+    del scope['A'], scope['B']
+    scope['D'] = ChildA
+    assert get_type_names(scope)[ChildA] == 'D'
+    assert ChildB_y not in get_type_names(scope)
+
+    scope = dict(B=ChildA, C=ChildB_x)
+    assert get_type_names(scope)[ChildA] == 'B'
+    del scope['C']
+    scope['A'] = ChildA
+    assert get_type_names(scope)[ChildA] == 'A'
+    assert ChildB_x not in get_type_names(scope)
+
+
 def test_default_spec_attrs() -> None:
     '''
     Test filling in `spec` attributes based on `Spec` class fields.